@@ -4,17 +4,23 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 from config import config
+from src.results import read_results
 
 
-def run(csv_path, save_path=None):
+def run(results_path=None, save_path=None):
     """ Analyse the grid search results
 
     Args:
-        csv_path (str): Path to the csv file with grid search results
+        results_path (str): Path to the grid search results, a CSV file or a Parquet directory.
+            Defaults to the results of the last grid search with the format of the config.
         save_path (str): Path to the folder where the figures will be saved
     """
-    # Read the csv
-    df = pd.read_csv(csv_path)
+    if results_path is None:
+        results_format = config['grid_search']['results_format']
+        results_path = f'{config["results_dir"]}/{config["data"]["type"]}/grid-search/grid-search-results.{results_format}'
+
+    # Read the results
+    df = read_results(results_path)
 
     # Define the parameter to optimize
     target_metric = "returns"
@@ -28,7 +34,7 @@ def run(csv_path, save_path=None):
 
     # Correlation heatmap
     plt.figure(figsize=(10, 6))
-    sns.heatmap(df.corr(), annot=True, cmap="coolwarm", fmt=".2f")
+    sns.heatmap(df.corr(numeric_only=True), annot=True, cmap="coolwarm", fmt=".2f")
     plt.title("Correlation Heatmap of Parameters and Result")
     plt.savefig(f'{save_path}/heatmap.png') if save_path else plt.show()
     plt.close()
@@ -76,9 +82,9 @@ def run(csv_path, save_path=None):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Analyse the grid search and plot the results.")
 
-    parser.add_argument("--csv_path", help="Path to the csv file with grid search results", required=True)
+    parser.add_argument("--results_path", "--csv_path", dest="results_path", help="Path to the grid search results (CSV file or Parquet directory)", required=True)
     parser.add_argument("--save_path", help="Path to the folder where the figures will be saved", required=True)
 
     args = parser.parse_args()
 
-    run(args.csv_path, args.save_path)
\ No newline at end of file
+    run(args.results_path, args.save_path)
\ No newline at end of file
@@ -1,4 +1,8 @@
 import argparse
+import time
+from config import config
+from src.forecast import load_forecaster
+from src.instrument import Instrumentation, format_report
 from src.simulation import estimate_returns
 
 
@@ -11,14 +15,29 @@ def parse_args():
     parser.add_argument("--init_cash", help="Initial amount of cash in portfolio", required=True)
     parser.add_argument("--init_crypto", help="Initial amount of crypto in portfolio", required=True)
 
-    parser.add_argument("--fee", help="The fixed fee for each transaction", required=True)
+    parser.add_argument("--fee", help="The fixed fee for each transaction (the selling fee if --buy_fee is given)", required=True)
+    parser.add_argument("--buy_fee", help="The fixed fee for buying, defaults to --fee")
 
     parser.add_argument("--min_expected_returns", help="The minimum returns that can are expected from a position in order to buy it", required=True)
     parser.add_argument("--stop_loss", help="The percentage of loss (compared to the entry price) that triggers the sell of a position (negative float)", required=True)
+    parser.add_argument("--take_profit", type=float, default=None, help="The percentage of returns (compared to the entry price) that triggers the sell of a position")
+    parser.add_argument("--max_exposure", type=float, default=None, help="The maximum fraction of the portfolio value held in crypto")
+
+    parser.add_argument("--intrabar", action="store_true", help="Fill the stop losses and take profits inside the bars, from their high and low prices")
+    parser.add_argument("--slippage", type=float, default=0.0, help="The fraction of the price lost when a stop loss fills inside a bar")
+
+    parser.add_argument("--forecaster", default="oracle", help="Forecasting model of the policy: oracle (the true future prices) or the import path of a Forecaster subclass, e.g. mymodels:LstmForecaster")
+
+    parser.add_argument("--engine", choices=["pandas", "numpy", "kernel"], default="pandas", help="Backtest engine (numpy is faster and gives the same results, kernel is compiled with Numba)")
+    parser.add_argument("--resolution", default=None, help="Resolution of the bars, e.g. 5m, 1h or 1d (default from the config)")
 
     parser.add_argument("--verbose", action="store_true", help="Enable verbose mode")
     parser.add_argument("--plot_results", action="store_true", help="Whether to plot the results of the simulation")
 
+    parser.add_argument("--instrument", action="store_true", help="Time the hot paths of the backtest (per-phase wall time, calls, steps/sec) and save a report in the results directory")
+    parser.add_argument("--profile", action="store_true", help="Also profile every function with cProfile (implies --instrument)")
+    parser.add_argument("--trace_memory", action="store_true", help="Also trace the memory allocated by every phase with tracemalloc (implies --instrument)")
+
     return parser.parse_args()
 
 def run(*kargs, **kwargs):
@@ -34,20 +53,31 @@ if __name__ == '__main__':
 
     args = parse_args()
 
-    fee = float(args.fee)  # TODO: Separate the fee in a MAKER_FEE and a TAKER_FEE for selling and buying
+    fee = float(args.fee)
+    buy_fee = float(args.buy_fee) if args.buy_fee is not None else None
     init_cash = float(args.init_cash)
     init_crypto = float(args.init_crypto)
     min_expected_returns = float(args.min_expected_returns)
-    stop_loss = float(args.stop_loss)  # TODO: Also implement a take-profit and exposure control
-    predict_len = int(args.predict_len)  # TODO: Add a true forecasting model
+    stop_loss = float(args.stop_loss)
+    predict_len = int(args.predict_len)
+    forecaster = load_forecaster(args.forecaster)
 
-    print(f'Model prediction capacity: {predict_len} timesteps in the future')
+    print(f'Model prediction capacity: {predict_len} timesteps in the future, forecaster: {args.forecaster}')
     print(f'Initial cash amount in portfolio: {init_cash}$')
     print(f'Initial crypto amount in portfolio: {init_crypto}')
     print(f'Minimum expected returns to enter a position: {min_expected_returns}$')
     print(f'Stop loss: {stop_loss}% of the initial cash used to enter a position')
+    if args.take_profit is not None:
+        print(f'Take profit: {args.take_profit}% of the initial cash used to enter a position')
+    if args.max_exposure is not None:
+        print(f'Maximum exposure: {args.max_exposure} of the portfolio value')
     print(f'Estimating returns...')
 
+    # Instrument the backtest only if asked, the code running unchanged otherwise
+    instrumentation = None
+    if args.instrument or args.profile or args.trace_memory:
+        instrumentation = Instrumentation(profile=args.profile, trace_memory=args.trace_memory).start()
+
     results = estimate_returns(predict_len=predict_len,
                                init_cash=init_cash,
                                init_crypto=init_crypto,
@@ -56,4 +86,18 @@ if __name__ == '__main__':
                                stop_loss=stop_loss,
                                verbose=args.verbose,
                                short_verbose=False,
-                               plot_results=args.plot_results)
\ No newline at end of file
+                               plot_results=args.plot_results,
+                               engine=args.engine,
+                               buy_fee=buy_fee,
+                               resolution=args.resolution,
+                               take_profit=args.take_profit,
+                               max_exposure=args.max_exposure,
+                               intrabar=args.intrabar,
+                               slippage=args.slippage,
+                               forecaster=forecaster)
+
+    if instrumentation is not None:
+        instrumentation.stop()
+        save_path = f'{config["results_dir"]}/{config["data"]["type"]}/profiles/backtest-{args.engine}-{time.strftime("%Y%m%d-%H%M%S")}.json'
+        print(format_report(instrumentation.save(save_path)))
+        print(f'Instrumentation report saved to {save_path}')
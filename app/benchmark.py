@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import time
+from config import config
+from src.benchmark import compare, load_results, run_suite, save_results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the imports, and the simulation, the grid search and the data loading over seeded synthetic data, and compare against a baseline.")
+
+    # Define arguments
+    parser.add_argument("--sizes", nargs="+", type=int, default=None, help="Numbers of bars (default from the config)")
+    parser.add_argument("--predict_len_list", nargs="+", type=int, default=None, help="Prediction lengths (default from the config)")
+    parser.add_argument("--engines", nargs="+", choices=["pandas", "numpy", "kernel"], default=None, help="Backtest engines (default from the config)")
+    parser.add_argument("--quick", action="store_true", help="Only benchmark 1000 bars with a prediction length of 10, e.g. in CI")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+
+    parser.add_argument("--baseline", default=None, help="Path of the baseline results (default from the config)")
+    parser.add_argument("--threshold", type=float, default=None, help="Relative slowdown reported as a regression (default from the config)")
+    parser.add_argument("--save_baseline", action="store_true", help="Save the results as the new baseline")
+
+    return parser.parse_args()
+
+
+def run(sizes=None, predict_len_list=None, engines=None, seed=0, baseline=None, threshold=None, save_baseline=False):
+    """ Run the benchmark suite (imports, simulation, grid search, loading), save its results as JSON and compare them
+    against the baseline.
+    Missing settings are read from config['benchmark']. Runs offline, on seeded synthetic data only.
+
+    Args:
+        sizes (list): numbers of bars of the synthetic data
+        predict_len_list (list): prediction lengths of the simulations and grid searches
+        engines (list): backtest engines of the simulations
+        seed (int): seed of the synthetic data
+        baseline (str): path of the baseline results
+        threshold (float): relative slowdown (or memory increase) reported as a regression
+        save_baseline (bool): whether to save the results as the new baseline
+
+    Returns:
+        list: the regressions against the baseline, empty if there is no baseline
+    """
+    settings = config['benchmark']
+    sizes = sizes or settings['sizes']
+    predict_len_list = predict_len_list or settings['predict_len_list']
+    engines = engines or settings['engines']
+    baseline = baseline or settings['baseline']
+    threshold = threshold if threshold is not None else settings['threshold']
+
+    print(f'Benchmarking {sizes} bars, prediction lengths {predict_len_list}, engines {engines}')
+    results = run_suite(sizes, predict_len_list, engines=engines, pandas_max_bars=settings['pandas_max_bars'],
+                        n_combinations=settings['n_combinations'], seed=seed, import_modules=settings['import_modules'])
+
+    # Save the results
+    save_path = f'{config["results_dir"]}/benchmarks/benchmark-{time.strftime("%Y%m%d-%H%M%S")}.json'
+    save_results(results, save_path)
+    print(f'Benchmark results saved to {save_path}')
+
+    # Compare against the baseline
+    regressions = []
+    if os.path.exists(baseline):
+        regressions = compare(results, load_results(baseline), threshold)
+        for regression in regressions:
+            print(f'Regression: {regression["benchmark"]} {regression["metric"]} {regression["baseline"]:.4g} -> '
+                  f'{regression["current"]:.4g} ({100 * regression["change"]:.1f}%)')
+        print(f'{len(regressions)} regressions beyond {100 * threshold:.0f}% against {baseline}')
+    else:
+        print(f'No baseline at {baseline}, use --save_baseline to create one')
+
+    if save_baseline:
+        save_results(results, baseline)
+        print(f'Baseline saved to {baseline}')
+
+    return regressions
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    regressions = run(sizes=[1000] if args.quick else args.sizes,
+                      predict_len_list=[10] if args.quick else args.predict_len_list,
+                      engines=args.engines,
+                      seed=args.seed,
+                      baseline=args.baseline,
+                      threshold=args.threshold,
+                      save_baseline=args.save_baseline)
+    sys.exit(1 if regressions else 0)
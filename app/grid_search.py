@@ -1,16 +1,18 @@
 import argparse
+import contextlib
+import math
+import os
 from pathlib import Path
 
-from src.simulation import estimate_returns
+from src.cache import load_dataset, window_id
+from src.instrument import Instrumentation, format_report
+from src.results import ResultStore, RESULT_FORMATS
+from src.search import (GridSearchExecutor, PARAMETERS, STRATEGIES, ExhaustiveSearch, RandomSearch, SuccessiveHalving,
+                        TPESearch, param_key)
 from config import config
-import itertools
-import pandas as pd
-from joblib import Parallel, delayed
-from multiprocessing import Queue, Process
-import os
 
 def parse_args():
-    parser = argparse.ArgumentParser(description="Estimate returns for multiple sets of initial parameters comprised in a search space. Parallelized. Saves the results as a CSV.")
+    parser = argparse.ArgumentParser(description="Estimate returns for multiple sets of initial parameters comprised in a search space. Parallelized. Saves the results as a CSV or Parquet store.")
 
     # Define arguments
     parser.add_argument("--predict_len_list", nargs="+", help="List of: Length of the predicted data (how far in the future we can predict prices)", required=True)
@@ -22,95 +24,197 @@ def parse_args():
     parser.add_argument("--min_expected_returns_list", nargs="+", help="List of: The minimum returns that can are expected from a position in order to buy it", required=True)
     parser.add_argument("--stop_loss_list", nargs="+", help="List of: The percentage of loss (compared to the entry price) that triggers the sell of a position (negative float)", required=True)
 
-    parser.add_argument("--verbose", action="store_true", help="Enable short verbose mode")
-    parser.add_argument("--plot_results", action="store_true", help="Whether to plot the results of the grid search")
+    parser.add_argument("--n_jobs", type=int, default=-1, help="Number of worker processes (-1 for all the CPUs, 1 to run in this process)")
+    parser.add_argument("--chunksize", type=int, default=None, help="Number of parameter combinations sent to a worker at once")
+    parser.add_argument("--engine", choices=["pandas", "numpy", "kernel"], default="numpy", help="Backtest engine")
+    parser.add_argument("--resolution", default=None, help="Resolution of the bars, e.g. 1h for a coarse sweep (default from the config)")
+    parser.add_argument("--no_batch", action="store_true", help="Simulate every combination on its own instead of batching those sharing a prediction length")
+    parser.add_argument("--intrabar", action="store_true", help="Fill the stop losses inside the bars, from their high and low prices (e.g. for accurate stops on hourly bars). Disables batching")
+    parser.add_argument("--slippage", type=float, default=0.0, help="The fraction of the price lost when a stop loss fills inside a bar")
 
-    return parser.parse_args()
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default=None, help="Search strategy: the whole grid, a random sample of it, successive halving (screening on shorter windows) or TPE (model-based) (default from the config)")
+    parser.add_argument("--n_samples", type=int, default=None, help="Number of combinations sampled by the random, halving and TPE strategies (default from the config)")
+    parser.add_argument("--eta", type=int, default=None, help="Reduction factor of every rung of successive halving (default from the config)")
+    parser.add_argument("--min_bars", type=int, default=None, help="Minimum number of bars of the shortest window of successive halving (default from the config)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the sampling strategies (default from the config)")
 
+    parser.add_argument("--restart", action="store_true", help="Start a new results file instead of resuming the last search")
+    parser.add_argument("--results_format", choices=list(RESULT_FORMATS.values()), default=None, help="Format of the results file (default from the config)")
 
-def run(*kargs, **kwargs):
-    pass
+    parser.add_argument("--instrument", action="store_true", help="Time the hot paths of the search (the backtests with --n_jobs 1 only, the result writing) and save a report in the results directory")
+    parser.add_argument("--profile", action="store_true", help="Also profile every function of this process with cProfile (implies --instrument)")
 
+    parser.add_argument("--verbose", action="store_true", help="Enable short verbose mode")
+    parser.add_argument("--plot_results", action="store_true", help="Whether to plot the results of the grid search")
+
+    return parser.parse_args()
 
-if __name__ == '__main__':
-    args = parse_args()
 
-    predict_len_list = [int(predict_len) for predict_len in args.predict_len_list]
-    init_cash_list = [float(init_cash) for init_cash in args.init_cash_list]
-    init_crypto_list = [float(init_crypto) for init_crypto in args.init_crypto_list]
-    fee_list = [float(fee) for fee in args.fee_list]
-    min_expected_returns_list = [float(min_expected_returns) for min_expected_returns in args.min_expected_returns_list]
-    stop_loss_list = [float(stop_loss) for stop_loss in args.stop_loss_list]
-    verbose_list = [False]
-    short_verbose_list = [args.verbose]
-    plot_results_list = [False]
+def run(predict_len_list=None, init_cash_list=None, init_crypto_list=None, fee_list=None,
+        min_expected_returns_list=None, stop_loss_list=None, n_jobs=None, chunksize=None, engine='numpy', batch=None,
+        restart=False, results_format=None, resolution=None, intrabar=False, slippage=0.0, strategy=None, n_samples=None,
+        eta=None, min_bars=None, seed=None, instrumentation=None, verbose=False):
+    """ Run a search over a process pool and save the results as a CSV or Parquet store.
+    The strategy picks the combinations of the grid evaluated: all of them, a random sample, the best ones of
+    successive screenings on the last bars of the window (successive halving), or those proposed by a model of the
+    returns (TPE). Only the evaluations on the full dataset window are saved.
+    Missing search lists, n_jobs, batch, results_format and strategy settings are read from config['grid_search'].
+    Resumable: the combinations already in the results file, for the same dataset window, are skipped.
+
+    Args:
+        predict_len_list (list): lengths of the predicted data
+        init_cash_list (list): initial amounts of cash
+        init_crypto_list (list): initial amounts of crypto
+        fee_list (list): fees at each transaction
+        min_expected_returns_list (list): minimum expected returns to buy a position
+        stop_loss_list (list): loss percentages that trigger the sell of a position
+        n_jobs (int): number of worker processes, -1 for all the CPUs
+        chunksize (int): number of parameter combinations sent to a worker at once
+        engine (str): the backtest engine, 'pandas', 'numpy' or 'kernel', when not batching
+        batch (bool): whether to simulate the combinations sharing a prediction length together, in one pass over the data
+        restart (bool): whether to start a new results file instead of resuming the last one
+        results_format (str): the format of the results, 'csv' or 'parquet'
+        resolution (str): the resolution of the bars ('5m', '1h', '1d', ...), defaults to the configured one
+        intrabar (bool): whether to fill the stop losses inside the bars, from their high and low prices. The batch
+            simulation only fills them at the close price, so intrabar fills simulate every combination on its own
+        slippage (float): the fraction of the price lost when a stop loss fills inside a bar
+        strategy (str): the search strategy, 'exhaustive', 'random', 'halving' or 'tpe'
+        n_samples (int): the number of combinations sampled by the random, halving and TPE strategies
+        eta (int): the reduction factor of every rung of successive halving
+        min_bars (int): the minimum number of bars of the shortest window of successive halving
+        seed (int): the seed of the sampling strategies
+        instrumentation (Instrumentation): the instrumentation of the search, None for none. Only the calls of this
+            process are instrumented: the result writing, and the backtests with n_jobs=1. Its report is saved next to
+            the results
+        verbose (bool): whether to print each result in the console
+
+    Returns:
+        Path: the path of the results
+    """
+    search_space = config['grid_search']
+    predict_len_list = predict_len_list or search_space['predict_len_list']
+    init_cash_list = init_cash_list or search_space['init_cash_list']
+    init_crypto_list = init_crypto_list or search_space['init_crypto_list']
+    fee_list = fee_list or search_space['fee_list']
+    min_expected_returns_list = min_expected_returns_list or search_space['min_expected_returns_list']
+    stop_loss_list = stop_loss_list or search_space['stop_loss_list']
+    n_jobs = n_jobs if n_jobs is not None else search_space['n_jobs']
+    batch = batch if batch is not None else search_space['batch']
+    batch = batch and not intrabar
+    results_format = results_format or search_space['results_format']
+    strategy = strategy or search_space['strategy']
+    n_samples = n_samples or search_space['n_samples']
+    eta = eta or search_space['eta']
+    min_bars = min_bars or search_space['min_bars']
+    seed = seed if seed is not None else search_space['seed']
 
     print(f'Model prediction capacity: between {min(predict_len_list)} and {max(predict_len_list)} timesteps in the future')
     print(f'Initial cash amount in portfolio: between {min(init_cash_list)}$ and {max(init_cash_list)}$')
     print(f'Initial crypto amount in portfolio: between {min(init_crypto_list)} and {max(init_crypto_list)}')
     print(f'Minimum expected returns to enter a position: between {min(min_expected_returns_list)}$ and {max(min_expected_returns_list)}$')
     print(f'Stop loss: between {min(stop_loss_list)}% and {max(stop_loss_list)}% of the initial cash used to enter a position')
-    print(f'Estimating returns...')
-
-    # Generate all parameter combinations
-    param_combinations = list(itertools.product(
-        predict_len_list, init_cash_list, init_crypto_list, fee_list,
-        min_expected_returns_list, stop_loss_list, verbose_list, short_verbose_list, plot_results_list
-    ))
+    print(f'Estimating returns ({strategy} search)...')
+
+    # The values of each parameter, ordered as PARAMETERS
+    space = [predict_len_list, init_cash_list, init_crypto_list, fee_list, min_expected_returns_list, stop_loss_list]
+    if strategy == 'random':
+        search = RandomSearch(n_samples=n_samples, seed=seed)
+    elif strategy == 'halving':
+        search = SuccessiveHalving(n_samples=n_samples, eta=eta, min_bars=min_bars, seed=seed)
+    elif strategy == 'tpe':
+        # Propose a combination per worker at once
+        search = TPESearch(n_samples=n_samples, batch_size=n_jobs if n_jobs > 0 else os.cpu_count(), seed=seed)
+    else:
+        search = ExhaustiveSearch()
 
     # Define the save path
     results_dir = Path(f'{config["results_dir"]}/{config["data"]["type"]}/grid-search')
     results_dir.mkdir(parents=True, exist_ok=True)
-    csv_save_path = results_dir / "grid-search-results.csv"
+    save_path = results_dir / f"grid-search-results.{results_format}"
 
-    # Ensure unique filename if file already exists
+    # Ensure unique filename if file already exists, when not resuming
     counter = 1
-    while csv_save_path.exists():
-        csv_save_path = results_dir / f"grid-search-results_{counter}.csv"
+    while restart and save_path.exists():
+        save_path = results_dir / f"grid-search-results_{counter}.{results_format}"
         counter += 1
 
-    # Define a queue for parallel writing
-    result_queue = Queue()
-
-
-    # Define a writer function that runs in a separate process
-    def csv_writer(queue, save_path):
-        """ Continuously writes results from the queue to the CSV file. """
-        file_exists = save_path.exists()
-        while True:
-            result = queue.get()
-            if result is None:  # Sentinel value to stop
-                break
-            df = pd.DataFrame([result])
-            df.to_csv(save_path, mode='a', header=not file_exists, index=False)
-            file_exists = True  # Ensure header is written only once
-
-
-    # Start the writer process
-    writer_process = Process(target=csv_writer, args=(result_queue, csv_save_path))
-    writer_process.start()
+    with instrumentation or contextlib.nullcontext(), \
+            ResultStore(save_path, columns=['key'] + PARAMETERS + ['returns']) as store:
+        completed = store.completed_values('returns')
+
+        def evaluate(param_combinations, n_bars=None):
+            """ Estimate the returns of combinations on the last n_bars of the window, the full window if None. """
+            window = None if n_bars is None else (-n_bars, None)
+            data_id = window_id(window, resolution=resolution)
+            if intrabar:
+                # Intrabar fills give other results on the same dataset window
+                data_id = f'{data_id}:intrabar:{slippage}'
+
+            # Skip the combinations already computed on this dataset window, and the duplicates
+            returns = completed if n_bars is None else {}
+            remaining = {}
+            for params in param_combinations:
+                key = param_key(params, data_id)
+                if key not in returns:
+                    remaining.setdefault(key, params)
+            if n_bars is None:
+                print(f'Resuming {save_path}: {len(param_combinations) - len(remaining)} combinations already computed, '
+                      f'{len(remaining)} remaining')
+            else:
+                print(f'Screening {len(remaining)} combinations on the last {n_bars} bars')
+
+            # Run in parallel, checkpointing the results of the full window as they complete
+            executor = GridSearchExecutor(n_jobs=n_jobs, chunksize=chunksize, batch=batch, engine=engine,
+                                          short_verbose=verbose, resolution=resolution, intrabar=intrabar,
+                                          slippage=slippage)
+            for result in executor.run(list(remaining.values()), windows=[window]):
+                result['key'] = param_key(tuple(result[param] for param in PARAMETERS), data_id)
+                returns[result['key']] = result['returns']
+                if n_bars is None:
+                    store.append(result)
+
+            return [returns[param_key(params, data_id)] for params in param_combinations]
+
+        results = search.search(space, evaluate, len(load_dataset(resolution=resolution)))
+
+    n_combinations = math.prod(len(set(values)) for values in space)
+    n_screened = sum(n for n_bars, n in search.history if n_bars is not None)
+    print(f'{len(results)} of {n_combinations} combinations backtested on the full window'
+          + (f', {n_screened} screenings on shorter windows' if n_screened else ''))
+    if results:
+        best_params, best_returns = max(results, key=lambda result: result[1])
+        print(f'Best combination: {dict(zip(PARAMETERS, best_params))} Returns {best_returns:.2f}')
+    print(f'Grid search results saved to {save_path}')
+
+    if instrumentation is not None:
+        report_path = results_dir / f'{save_path.stem}-profile.json'
+        print(format_report(instrumentation.save(str(report_path))))
+        print(f'Instrumentation report saved to {report_path}')
+    return save_path
 
 
-    # Define wrapper function
-    def run_estimate(params, queue):
-        """ Runs the estimation and sends the result to the queue. """
-        result = {
-            "predict_len": params[0], "init_cash": params[1], "init_crypto": params[2],
-            "fee": params[3], "min_expected_returns": params[4], "stop_loss": params[5],
-            "verbose": params[6], "short-verbose": params[7], "plot_results": params[8],
-            "returns": estimate_returns(*params)
-        }
-        queue.put(result)  # Send result to writer process
-        return result
-
-
-    # Run in parallel without waiting for writing
-    results = Parallel(n_jobs=-1, backend="threading")(
-        delayed(run_estimate)(params, result_queue) for params in param_combinations
-    )
-
-    # Signal the writer process to stop
-    result_queue.put(None)
-    writer_process.join()  # Ensure all results are written before exiting
+if __name__ == '__main__':
+    args = parse_args()
 
-    print(f'Grid search results saved to {csv_save_path}')
\ No newline at end of file
+    run(predict_len_list=[int(predict_len) for predict_len in args.predict_len_list],
+        init_cash_list=[float(init_cash) for init_cash in args.init_cash_list],
+        init_crypto_list=[float(init_crypto) for init_crypto in args.init_crypto_list],
+        fee_list=[float(fee) for fee in args.fee_list],
+        min_expected_returns_list=[float(min_expected_returns) for min_expected_returns in args.min_expected_returns_list],
+        stop_loss_list=[float(stop_loss) for stop_loss in args.stop_loss_list],
+        n_jobs=args.n_jobs,
+        chunksize=args.chunksize,
+        engine=args.engine,
+        batch=False if args.no_batch else None,
+        restart=args.restart,
+        results_format=args.results_format,
+        resolution=args.resolution,
+        intrabar=args.intrabar,
+        slippage=args.slippage,
+        strategy=args.strategy,
+        n_samples=args.n_samples,
+        eta=args.eta,
+        min_bars=args.min_bars,
+        seed=args.seed,
+        instrumentation=Instrumentation(profile=args.profile) if args.instrument or args.profile else None,
+        verbose=args.verbose)
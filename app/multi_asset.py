@@ -0,0 +1,86 @@
+import argparse
+import numpy as np
+from config import config
+from src.dataset import TsData
+from src.multiasset import AssetPortfolio, MultiAssetOptimizer
+from src.policy import Policy
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backtest several assets together, in a single pass over their prices aligned on a shared time index.")
+
+    # Define arguments
+    parser.add_argument("--assets", nargs="+", default=None, help="Names of the assets to backtest, among config['multi_asset']['sources'] (default: all of them)")
+    parser.add_argument("--predict_len", type=int, default=50, help="Length of the predicted data (how far in the future we can predict prices)")
+    parser.add_argument("--init_cash", type=float, default=5000.0, help="Initial amount of cash in portfolio, shared by the assets")
+    parser.add_argument("--fee", type=float, default=0.001, help="The fixed fee for each transaction")
+    parser.add_argument("--min_expected_returns", type=float, default=0.0, help="The minimum returns that can are expected from a position in order to buy it")
+    parser.add_argument("--stop_loss", type=float, default=-0.02, help="The percentage of loss (compared to the entry price) that triggers the sell of a position (negative float)")
+    parser.add_argument("--max_buys", type=int, default=None, help="Maximum number of positions bought per timestep (default from the config)")
+    parser.add_argument("--how", choices=["inner", "outer"], default=None, help="Keep the timesteps of all the assets (inner) or of any asset (outer) (default from the config)")
+    parser.add_argument("--resolution", default=None, help="Resolution of the bars, e.g. 5m, 1h or 1d (default from the config)")
+    parser.add_argument("--verbose", action="store_true", help="Show a progress bar")
+
+    return parser.parse_args()
+
+
+def run(assets=None, predict_len=50, init_cash=5000.0, fee=0.001, min_expected_returns=0.0, stop_loss=-0.02,
+        max_buys=None, how=None, resolution=None, verbose=False):
+    """ Backtest several assets together with a shared cash, over the configured window of their aligned prices.
+    Loading, alignment and the forecasts of the horizons are done once for all the assets, then every timestep
+    checks the positions and scores the buy candidates of all the assets at once.
+
+    Args:
+        assets (list): names of the assets, among config['multi_asset']['sources'], all of them if None
+        predict_len (int): the length of the predicted data
+        init_cash (float): the initial amount of cash, shared by the assets
+        fee (float): the fee at each transaction
+        min_expected_returns (float): the minimum expected returns in the future to buy a position
+        stop_loss (float): the loss percentage that triggers the sell of a position
+        max_buys (int): the maximum number of positions bought per timestep, defaults to the configured one
+        how (str): 'inner' to keep the timesteps of all the assets, 'outer' to keep those of any asset
+        resolution (str): the resolution of the bars, defaults to the configured one
+
+    Returns:
+        AssetPortfolio: the portfolio at the end of the backtest
+    """
+    settings = config['multi_asset']
+    sources = settings['sources']
+    sources = {name: sources[name] for name in assets} if assets else sources
+    max_buys = max_buys if max_buys is not None else settings['max_buys']
+    how = how or settings['how']
+    resolution = resolution if resolution is not None else config['data'].get('resolution')
+
+    # Load and align the assets, then trim the configured window of the shared index
+    data = TsData.load_assets(sources, resolution=resolution, how=how)
+    data = data[config['data']['start_position']:config['data']['end_position']]
+    print(f'Backtesting {len(data.names)} assets over {len(data)} aligned timesteps...')
+
+    portfolio = AssetPortfolio(cash=init_cash, names=data.names, record_history=False)
+    policy = Policy(min_expected_returns=min_expected_returns, stop_loss=stop_loss)
+    optimizer = MultiAssetOptimizer(portfolio, policy, predict_len, fee=fee, max_buys=max_buys, verbose=verbose)
+    optimizer.iterate_policy(data)
+
+    # Print the returns of every asset, then of the portfolio
+    closed = portfolio.closed_positions()
+    asset_returns = closed.groupby('asset')['returns'].sum()
+    for name, trades in zip(portfolio.names, portfolio.trades):
+        print(f'{name}: {trades} trades, returns {asset_returns.get(name, 0.0):.2f}$')
+    print(f'Portfolio final value: {portfolio.cash:.2f}$ (initially {init_cash:.2f}$), '
+          f'returns {portfolio.portfolio_returns:.2f}$, {np.sum(portfolio.trades)} trades')
+    return portfolio
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    run(assets=args.assets,
+        predict_len=args.predict_len,
+        init_cash=args.init_cash,
+        fee=args.fee,
+        min_expected_returns=args.min_expected_returns,
+        stop_loss=args.stop_loss,
+        max_buys=args.max_buys,
+        how=args.how,
+        resolution=args.resolution,
+        verbose=args.verbose)
@@ -0,0 +1,74 @@
+import argparse
+from src.cache import load_dataset
+from src.fees import FeeSchedule
+from src.optimizer import Optimizer
+from src.policy import Policy
+from src.portfolio import Portfolio
+from src.stream import ReplaySource, latency_stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay the configured dataset bar by bar through the incremental optimizer, and measure the per-bar latency.")
+
+    # Define arguments
+    parser.add_argument("--predict_len", type=int, default=50, help="Length of the predicted data (how far in the future we can predict prices)")
+    parser.add_argument("--init_cash", type=float, default=5000.0, help="Initial amount of cash in portfolio")
+    parser.add_argument("--init_crypto", type=float, default=0.0, help="Initial amount of crypto in portfolio")
+    parser.add_argument("--fee", type=float, default=0.001, help="The fixed fee for each transaction (the selling fee if --buy_fee is given)")
+    parser.add_argument("--buy_fee", type=float, default=None, help="The fixed fee for buying, defaults to --fee")
+    parser.add_argument("--min_expected_returns", type=float, default=0.0, help="The minimum returns that can are expected from a position in order to buy it")
+    parser.add_argument("--stop_loss", type=float, default=-0.02, help="The percentage of loss (compared to the entry price) that triggers the sell of a position (negative float)")
+    parser.add_argument("--speed", type=float, default=None, help="Replay speed relative to the time between the bars (default: as fast as possible)")
+    parser.add_argument("--resolution", default=None, help="Resolution of the bars, e.g. 5m, 1h or 1d (default from the config)")
+
+    return parser.parse_args()
+
+
+def run(predict_len=50, init_cash=5000.0, init_crypto=0.0, fee=0.001, buy_fee=None, min_expected_returns=0.0,
+        stop_loss=-0.02, speed=None, resolution=None, forecaster=None):
+    """ Replay the configured dataset window bar by bar through Optimizer.on_bar, as a live feed would.
+
+    Args:
+        predict_len (int): the length of the predicted data
+        init_cash (float): the initial amount of cash
+        init_crypto (float): the initial amount of crypto
+        fee (float): the fee at each transaction (the fee charged when selling, if buy_fee is given)
+        buy_fee (float): the fee charged when buying, defaults to fee
+        min_expected_returns (float): the minimum expected returns in the future to buy a position
+        stop_loss (float): the loss percentage that triggers the sell of a position
+        speed (float): the replay speed relative to the time between the bars, None for as fast as possible
+        resolution (str): the resolution of the bars, defaults to the configured one
+        forecaster (Forecaster): the model predicting the prices, the true future prices if None
+
+    Returns:
+        dict: the latency statistics of the replay, in microseconds
+    """
+    data = load_dataset(resolution=resolution)
+
+    # Keep the memory of the portfolio bounded, as for a live feed
+    portfolio = Portfolio(cash=init_cash, crypto=init_crypto, record_history=False)
+    policy = Policy(min_expected_returns=min_expected_returns, stop_loss=stop_loss)
+    optimizer = Optimizer(portfolio=portfolio, policy=policy, predict_len=predict_len,
+                          fee=FeeSchedule(sell_fee=fee, buy_fee=buy_fee), forecaster=forecaster)
+
+    print(f'Replaying {len(data)} bars...')
+    stats = latency_stats(ReplaySource(data, predict_len, forecaster=forecaster, speed=speed).run(optimizer))
+
+    print(f'Portfolio final value: {portfolio.cash:.2f}$ (initially {init_cash:.2f}$), {portfolio.trades} trades')
+    print(f'Per-bar latency: mean {stats["mean_us"]:.1f}us, median {stats["p50_us"]:.1f}us, '
+          f'p99 {stats["p99_us"]:.1f}us, max {stats["max_us"]:.1f}us')
+    return stats
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    run(predict_len=args.predict_len,
+        init_cash=args.init_cash,
+        init_crypto=args.init_crypto,
+        fee=args.fee,
+        buy_fee=args.buy_fee,
+        min_expected_returns=args.min_expected_returns,
+        stop_loss=args.stop_loss,
+        speed=args.speed,
+        resolution=args.resolution)
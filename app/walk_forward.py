@@ -0,0 +1,153 @@
+import argparse
+import itertools
+from pathlib import Path
+
+import pandas as pd
+
+from src.cache import load_dataset
+from src.search import GridSearchExecutor, PARAMETERS
+from src.walkforward import SPLIT_SCHEMES, pick_combinations, picked_evaluations, select_walk_forward, split_windows, \
+    summarize_walk_forward, walk_forward_splits
+from config import config
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Walk-forward evaluation: pick the best parameters on every train window and evaluate them on the following test window. Parallelized over one shared copy of the data.")
+
+    # Define arguments
+    parser.add_argument("--predict_len_list", nargs="+", type=int, default=None, help="List of: Length of the predicted data (default from the grid search config)")
+    parser.add_argument("--init_cash_list", nargs="+", type=float, default=None, help="List of: Initial amount of cash in portfolio (default from the grid search config)")
+    parser.add_argument("--init_crypto_list", nargs="+", type=float, default=None, help="List of: Initial amount of crypto in portfolio (default from the grid search config)")
+    parser.add_argument("--fee_list", nargs="+", type=float, default=None, help="List of: The fixed fee for each transaction (default from the grid search config)")
+    parser.add_argument("--min_expected_returns_list", nargs="+", type=float, default=None, help="List of: The minimum returns that can are expected from a position in order to buy it (default from the grid search config)")
+    parser.add_argument("--stop_loss_list", nargs="+", type=float, default=None, help="List of: The percentage of loss that triggers the sell of a position (default from the grid search config)")
+
+    parser.add_argument("--scheme", choices=list(SPLIT_SCHEMES), default=None, help="Scheme of the splits (default from the config)")
+    parser.add_argument("--n_splits", type=int, default=None, help="Number of train and test windows (default from the config)")
+    parser.add_argument("--train_bars", type=int, default=None, help="Number of bars of every train window, 0 to only evaluate the first combination on every test window (default from the config)")
+    parser.add_argument("--test_bars", type=int, default=None, help="Number of bars of every test window (default from the config)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the random scheme (default from the config)")
+    parser.add_argument("--full_test_grid", action="store_true", help="Also evaluate every combination on every test window, for diagnostics (default from the config)")
+
+    parser.add_argument("--n_jobs", type=int, default=None, help="Number of worker processes (-1 for all the CPUs, 1 to run in this process)")
+    parser.add_argument("--engine", choices=["pandas", "numpy", "kernel"], default="numpy", help="Backtest engine")
+    parser.add_argument("--resolution", default=None, help="Resolution of the bars, e.g. 1h (default from the config)")
+    parser.add_argument("--no_batch", action="store_true", help="Simulate every combination on its own instead of batching those sharing a prediction length")
+
+    return parser.parse_args()
+
+
+def run(predict_len_list=None, init_cash_list=None, init_crypto_list=None, fee_list=None,
+        min_expected_returns_list=None, stop_loss_list=None, scheme=None, n_splits=None, train_bars=None,
+        test_bars=None, seed=None, full_test_grid=None, n_jobs=None, engine='numpy', batch=None, resolution=None):
+    """ Run a walk-forward evaluation of the configured dataset window and save the results as CSV.
+    The window is split in train and test windows. Every combination is evaluated on every train window first, then
+    only the best one of each train window is evaluated on the following test window, unless full_test_grid. All the
+    windows are slices of a single copy of the data, shared by the worker processes. Set the start and end positions of the configured window to walk over
+    the whole dataset.
+    Missing search lists, n_jobs and batch are read from config['grid_search'], the splits from config['walk_forward'].
+
+    Args:
+        predict_len_list (list): lengths of the predicted data
+        init_cash_list (list): initial amounts of cash
+        init_crypto_list (list): initial amounts of crypto
+        fee_list (list): fees at each transaction
+        min_expected_returns_list (list): minimum expected returns to buy a position
+        stop_loss_list (list): loss percentages that trigger the sell of a position
+        scheme (str): the scheme of the splits, 'rolling', 'expanding', 'fixed' or 'random'
+        n_splits (int): the number of train and test windows
+        train_bars (int): the number of bars of every train window, 0 for no training
+        test_bars (int): the number of bars of every test window
+        seed (int): the seed of the random scheme
+        full_test_grid (bool): whether to also evaluate every combination on every test window, for diagnostics
+        n_jobs (int): number of worker processes, -1 for all the CPUs
+        engine (str): the backtest engine, 'pandas', 'numpy' or 'kernel', when not batching
+        batch (bool): whether to simulate the combinations sharing a prediction length together, in one pass over a window
+        resolution (str): the resolution of the bars ('5m', '1h', '1d', ...), defaults to the configured one
+
+    Returns:
+        pd.DataFrame: one row per split, with its windows, the picked combination, and its train and test returns
+    """
+    search_space = config['grid_search']
+    settings = config['walk_forward']
+    space = [
+        predict_len_list or search_space['predict_len_list'],
+        init_cash_list or search_space['init_cash_list'],
+        init_crypto_list or search_space['init_crypto_list'],
+        fee_list or search_space['fee_list'],
+        min_expected_returns_list or search_space['min_expected_returns_list'],
+        stop_loss_list or search_space['stop_loss_list'],
+    ]
+    scheme = scheme or settings['scheme']
+    n_splits = n_splits or settings['n_splits']
+    train_bars = train_bars if train_bars is not None else settings['train_bars']
+    test_bars = test_bars or settings['test_bars']
+    seed = seed if seed is not None else settings['seed']
+    full_test_grid = full_test_grid if full_test_grid is not None else settings['full_test_grid']
+    n_jobs = n_jobs if n_jobs is not None else search_space['n_jobs']
+    batch = batch if batch is not None else search_space['batch']
+
+    # Split the configured window
+    param_combinations = list(dict.fromkeys(itertools.product(*space)))
+    splits = walk_forward_splits(len(load_dataset(resolution=resolution)), n_splits, test_bars, train_bars, scheme, seed)
+    train_windows = split_windows(splits, param_combinations)
+    print(f'Walk-forward: {n_splits} {scheme} splits of {train_bars} train and {test_bars} test bars, '
+          f'{len(param_combinations)} combinations on {len(train_windows)} train windows')
+
+    # Evaluate every combination on every train window, then the picked ones on the test windows, in parallel
+    executor = GridSearchExecutor(n_jobs=n_jobs, batch=batch, engine=engine, resolution=resolution)
+    returns = {}
+    rows = []
+
+    def evaluate(evaluations):
+        for result in executor.run_windows(evaluations):
+            returns[(result['window'], tuple(result[param] for param in PARAMETERS))] = result['returns']
+            rows.append({'window_start': result['window'][0], 'window_end': result['window'][1],
+                         **{param: result[param] for param in PARAMETERS}, 'returns': result['returns']})
+
+    evaluate([(window, param_combinations) for window in train_windows])
+    picks = pick_combinations(returns, splits, param_combinations)
+    if full_test_grid:
+        evaluate([(test, param_combinations) for test in dict.fromkeys(test for _, test in splits)])
+    else:
+        evaluate(picked_evaluations(splits, picks))
+
+    # Aggregate per split
+    splits_frame = select_walk_forward(returns, splits, picks)
+    summary = summarize_walk_forward(splits_frame)
+    print(splits_frame.to_string(index=False))
+    print(f'Test returns: total {summary["total_test_returns"]:.2f}$, mean {summary["mean_test_returns"]:.2f}$, '
+          f'median {summary["median_test_returns"]:.2f}$, std {summary["std_test_returns"]:.2f}$, '
+          f'min {summary["min_test_returns"]:.2f}$, {100 * summary["profitable_splits"]:.0f}% profitable splits, '
+          f'efficiency {summary["efficiency"]:.2f}')
+
+    # Save the splits and every evaluation
+    results_dir = Path(f'{config["results_dir"]}/{config["data"]["type"]}/walk-forward')
+    results_dir.mkdir(parents=True, exist_ok=True)
+    splits_frame.to_csv(results_dir / f'walk-forward-{scheme}.csv', index=False)
+    pd.DataFrame(rows).sort_values(['window_start', 'window_end'] + PARAMETERS).to_csv(
+        results_dir / f'walk-forward-{scheme}-windows.csv', index=False)
+    print(f'Walk-forward results saved to {results_dir}')
+
+    return splits_frame
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    run(predict_len_list=args.predict_len_list,
+        init_cash_list=args.init_cash_list,
+        init_crypto_list=args.init_crypto_list,
+        fee_list=args.fee_list,
+        min_expected_returns_list=args.min_expected_returns_list,
+        stop_loss_list=args.stop_loss_list,
+        scheme=args.scheme,
+        n_splits=args.n_splits,
+        train_bars=args.train_bars,
+        test_bars=args.test_bars,
+        seed=args.seed,
+        full_test_grid=args.full_test_grid or None,
+        n_jobs=args.n_jobs,
+        engine=args.engine,
+        batch=False if args.no_batch else None,
+        resolution=args.resolution)
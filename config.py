@@ -7,7 +7,9 @@ UNIX_MONTH = 2629743  # Duration of a month in UNIX
 
 config = {
     "data": {
-        "pickle_file": f'{project_root}/data/price_history/BTC/BTCj-2017001-2024096.pkl',  # TODO: Switch from Pickle to all CSV
+        "pickle_file": f'{project_root}/data/price_history/BTC/BTCj-2017001-2024096.pkl',
+        # Columnar store, memory-mapped, used instead of the pickle file when it exists (see TsData.save_store)
+        "store_dir": f'{project_root}/data/price_history/BTC/BTCj-2017001-2024096.store',
         
         "start_position": -1 - 5000,  # Last n time steps
         # "start_position": len(data) - 60*24*7   # Last days
@@ -15,9 +17,67 @@ config = {
 
         "end_position": -1,  # End of data
         # "end_position": START_POSITION + UNIX_MONTH if START_POSITION + UNIX_MONTH < len(data) else len(data)  # One month
+
+        # Resolution of the bars ('5m', '1h', '1d', ...), None for the base data. The positions count bars of this resolution
+        "resolution": None,
     },
 
     "results_dir": f'{project_root}/results',
+
+    "forecast": {
+        "cache_dir": f'{project_root}/data/forecasts',  # Prediction matrices, by model, dataset window and prediction length
+    },
+
+    # Default search space of the grid search (python main.py --mode grid_search)
+    "grid_search": {
+        "predict_len_list": [10, 50, 100],
+        "init_cash_list": [5000.0],
+        "init_crypto_list": [0.0],
+        "fee_list": [0.001],
+        "min_expected_returns_list": [0.0, 10.0, 50.0],
+        "stop_loss_list": [-0.02, -0.05],
+        "n_jobs": -1,  # Number of worker processes, -1 for all the CPUs
+        "batch": True,  # Simulate the combinations sharing a prediction length in one pass over the data
+        "results_format": "csv",  # 'csv' or 'parquet' (compact and fast to load, requires pyarrow)
+        # Search strategy: 'exhaustive' (whole grid), 'random' (sample of the grid), 'halving' (successive halving,
+        # screening on the last bars of the window before the full backtests) or 'tpe' (model-based)
+        "strategy": "exhaustive",
+        "n_samples": 100,  # Combinations sampled by the random, halving and TPE strategies
+        "eta": 3,  # Successive halving keeps the best 1/eta combinations on windows eta times longer
+        "min_bars": 500,  # Bars of the shortest window of successive halving
+        "seed": 0,
+    },
+
+    # Walk-forward evaluation of the configured window (python main.py --mode walk_forward), over the grid search lists
+    "walk_forward": {
+        "scheme": "rolling",  # 'rolling', 'expanding', 'fixed' or 'random' train and test windows
+        "n_splits": 5,
+        "train_bars": 2000,  # Bars to pick the best combination on, 0 to only evaluate the first one on every test window
+        "test_bars": 500,  # e.g. 60 * 24 * 30 for monthly test windows of minute bars
+        "seed": 0,  # Seed of the random scheme
+        "full_test_grid": False,  # Also evaluate every combination on the test windows, for diagnostics only
+    },
+
+    # Benchmarks of the simulation over synthetic data (python main.py --mode benchmark)
+    "benchmark": {
+        "sizes": [1000, 100000, 1000000],  # Numbers of bars
+        "predict_len_list": [10, 100],
+        "engines": ["numpy", "kernel", "pandas"],
+        "pandas_max_bars": 10000,  # The pandas engine is only benchmarked on the smaller sizes
+        "n_combinations": 16,  # Parameter combinations of the grid search benchmark
+        # Modules whose import time is benchmarked in a fresh interpreter, as paid by a CLI call or a worker process
+        "import_modules": ["main", "src.simulation", "src.search", "app.grid_search"],
+        "baseline": f'{project_root}/results/benchmarks/baseline.json',
+        "threshold": 0.2,  # Relative slowdown (or memory increase) reported as a regression
+    },
+
+    # Backtest of several assets sharing the cash (python main.py --mode multi_asset), over the configured window
+    "multi_asset": {
+        # Store directory or pickle file of every asset, by asset name
+        "sources": {"BTC": f'{project_root}/data/price_history/BTC/BTCj-2017001-2024096.pkl'},
+        "how": "inner",  # 'inner' keeps the timesteps of all the assets, 'outer' those of any asset
+        "max_buys": 1,  # Positions bought per timestep, the best expected returns first
+    },
 }
 
 # Get data type
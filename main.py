@@ -1,33 +1,44 @@
 import argparse
+import importlib
 import os
-from app import backtesting
-from app import grid_search
-from app import analyse_grid_search
 import config
 
+# The modes of operation: the module running each mode and the message printed when it starts. The module of a mode is
+# only imported when the mode is run, so the command line starts without loading the libraries of the other modes
+# (e.g. matplotlib and seaborn for the analysis)
+MODES = {
+    "backtest": ("app.backtesting", "Running backtest for strategy: {strategy}"),
+    "grid_search": ("app.grid_search", "Running grid search..."),
+    "analyse": ("app.analyse_grid_search", "Analyzing grid search results..."),
+    "replay": ("app.replay", "Replaying the dataset bar by bar..."),
+    "benchmark": ("app.benchmark", "Benchmarking the simulation over synthetic data..."),
+    "walk_forward": ("app.walk_forward", "Running walk-forward evaluation..."),
+    "multi_asset": ("app.multi_asset", "Backtesting several assets together..."),
+}
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Algorithmic Trading Environment")
-    parser.add_argument("--mode", choices=["backtest", "grid_search", "analyse"], required=True, help="Mode of operation")
+    parser.add_argument("--mode", choices=list(MODES), required=True, help="Mode of operation")
     parser.add_argument("--strategy", type=str, help="Trading strategy to use")
     parser.add_argument("--config", type=str, default="config.py", help="Path to configuration file")
     return parser.parse_args()
 
+def run_mode(mode, *args, **kwargs):
+    # Import the module of the mode, then run it
+    module_name, message = MODES[mode]
+    print(message.format(**kwargs))
+    return importlib.import_module(module_name).run(*args)
+
 def main():
     args = parse_args()
 
     if args.mode == "backtest":
         if not args.strategy:
             raise ValueError("--strategy is required for backtesting")
-        print(f"Running backtest for strategy: {args.strategy}")
-        backtesting.run(args.strategy)
-
-    elif args.mode == "grid_search":
-        print("Running grid search...")
-        grid_search.run()
+        run_mode(args.mode, args.strategy, strategy=args.strategy)
 
-    elif args.mode == "analyse":
-        print("Analyzing grid search results...")
-        analyse_grid_search.run()
+    else:
+        run_mode(args.mode)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
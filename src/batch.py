@@ -0,0 +1,123 @@
+import numpy as np
+from src.forecast import OracleForecaster
+from src.utils.utils import progress
+
+
+class BatchOptimizer:
+    """
+    A class to apply the policy of many parameter sets in a single pass over the data.
+    Every parameter set has its own portfolio, held as one entry of per-parameter arrays, while the work shared by all
+    of them (prices, best exit of the forecast horizon) is done once per timestep. The positions of all the portfolios
+    are held in one pool of arrays, with the index of the open ones.
+    Gives the same results as running Optimizer with each parameter set, with a constant fee.
+    :ivar int predict_len: The number of timesteps we can predict in the future, shared by all the parameter sets.
+    :ivar np.ndarray initial_cash: The initial cash of each portfolio.
+    :ivar np.ndarray cash: The cash of each portfolio.
+    :ivar np.ndarray crypto: The crypto of each portfolio.
+    :ivar np.ndarray trades: The number of trades of each portfolio.
+    :ivar np.ndarray portfolio_value: The last recorded value of each portfolio.
+    :ivar np.ndarray portfolio_returns: The last recorded returns of each portfolio.
+    :ivar np.ndarray portfolio_value_history: The value of each portfolio at each timestep, if recorded.
+    """
+
+    def __init__(self, predict_len, init_cash, init_crypto, fee, min_expected_returns, stop_loss, record_history=False,
+                 verbose=False, forecaster=None):
+        """
+        Initialize the BatchOptimizer class. Every parameter but predict_len is a sequence with one value per parameter set.
+        :param int predict_len: The number of timesteps we can predict in the future.
+        :param init_cash: The initial cash of each portfolio.
+        :param init_crypto: The initial crypto of each portfolio.
+        :param fee: The constant transaction fee of each portfolio.
+        :param min_expected_returns: The minimum expected returns to buy a position, for each portfolio.
+        :param stop_loss: The loss percentage that triggers a sell, for each portfolio.
+        :param bool record_history: Whether to record the value of every portfolio at every timestep.
+        :param bool verbose: Whether to show a progress bar.
+        :param Forecaster forecaster: The model predicting the prices of the horizon, the true future prices if None.
+        """
+        super().__init__()
+
+        self.predict_len = predict_len
+        self.initial_cash = np.array(init_cash, dtype=np.float64)
+        self.cash = self.initial_cash.copy()
+        self.crypto = np.array(init_crypto, dtype=np.float64)
+        self.fee = np.array(fee, dtype=np.float64)
+        self.min_expected_returns = np.array(min_expected_returns, dtype=np.float64)
+        self.stop_loss = np.array(stop_loss, dtype=np.float64)
+        self.trades = np.zeros(len(self.cash), dtype=np.int64)
+        self.record_history = record_history
+        self.verbose = verbose
+        self.forecaster = forecaster if forecaster is not None else OracleForecaster()
+
+        self.portfolio_value = self.cash.copy()
+        self.portfolio_returns = np.zeros(len(self.cash))
+        self.portfolio_value_history = None
+
+        # Pool of the positions of all the portfolios
+        self._owner = np.empty(0, dtype=np.int64)
+        self._entry_cash = np.empty(0)
+        self._quantity = np.empty(0)
+
+    def iterate_policy(self, data):
+        """
+        Apply the policy of every parameter set at each time step of the data, then sell everything.
+        :param data: The data (pd.DataFrame or OhlcvColumns) with columns 'unix' and 'close'.
+        """
+        prices = np.ascontiguousarray(data['close'], dtype=np.float64)
+        n_steps = len(prices)
+        predictions = self.forecaster.forecast(data, self.predict_len)
+        best_exits = self.forecaster.best_exits(predictions)
+
+        if self.record_history:
+            self.portfolio_value_history = np.empty((n_steps - 1, len(self.cash)))
+
+        one_minus_fee = 1 - self.fee
+        one_plus_fee = 1 + self.fee
+
+        for i in progress(range(1, n_steps), self.verbose):
+            current_price = prices[i - 1]
+            max_price = predictions[i, best_exits[i] - i]
+
+            # Determine the cash we can spend, before selling
+            new_position_cash = np.minimum(self.cash, np.maximum(self.cash * 0.1, 300))
+
+            # Determine which positions to sell, in the order they were bought
+            if len(self._owner):
+                entry_cash, quantity, owner = self._entry_cash, self._quantity, self._owner
+                immediate_returns = quantity * current_price * one_minus_fee[owner] - entry_cash
+                future_max_returns = quantity * max_price * one_minus_fee[owner] - entry_cash
+                stop = immediate_returns / entry_cash < self.stop_loss[owner]
+                keep = ~stop & (future_max_returns > immediate_returns) & (future_max_returns > 0)
+
+                if not keep.all():
+                    sell = ~keep
+                    sold_owner = owner[sell]
+                    # Accumulate in order, as the portfolios sell their positions one by one
+                    np.subtract.at(self.crypto, sold_owner, quantity[sell])
+                    np.add.at(self.cash, sold_owner, quantity[sell] * current_price * one_minus_fee[sold_owner])
+                    np.add.at(self.trades, sold_owner, 1)
+
+                    self._owner, self._entry_cash, self._quantity = owner[keep], entry_cash[keep], quantity[keep]
+
+            # Determine which portfolios buy a position
+            new_quantity = new_position_cash / (current_price * one_plus_fee)
+            max_returns = new_quantity * max_price * one_minus_fee - new_position_cash
+            buy = max_returns > self.min_expected_returns
+            if buy.any():
+                self.cash[buy] -= new_position_cash[buy]
+                self.crypto[buy] += new_quantity[buy]
+                self.trades[buy] += 1
+
+                self._owner = np.concatenate([self._owner, np.flatnonzero(buy)])
+                self._entry_cash = np.concatenate([self._entry_cash, new_position_cash[buy]])
+                self._quantity = np.concatenate([self._quantity, new_quantity[buy]])
+
+            # Update the portfolio values and returns
+            self.portfolio_value = self.cash + self.crypto * current_price * one_minus_fee
+            self.portfolio_returns = self.portfolio_value - self.initial_cash
+            if self.record_history:
+                self.portfolio_value_history[i - 1] = self.portfolio_value
+
+        # Sell all the crypto
+        self.cash += self.crypto * prices[-1] * one_minus_fee
+        self.crypto[:] = 0.0
+        self._owner, self._entry_cash, self._quantity = self._owner[:0], self._entry_cash[:0], self._quantity[:0]
@@ -0,0 +1,305 @@
+import cProfile
+import json
+import os
+import platform
+import pstats
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from src.batch import BatchOptimizer
+from src.dataset import OhlcvColumns, TsData
+from src.fees import FeeSchedule
+from src.gaps import gap_report
+from src.kernel import HAS_NUMBA
+from src.optimizer import Optimizer
+from src.policy import Policy
+from src.portfolio import Portfolio
+from src.store import PriceStore
+from src.utils.synthetic import synthetic_ohlcv, write_synthetic_csv
+
+# Metrics compared against the baseline, True if higher is better
+METRICS = {'steps_per_sec': True, 'combinations_per_sec': True, 'rows_per_sec': True, 'peak_mb': False,
+           'import_sec': False}
+
+# Root of the project, where the modules of the import benchmarks are imported from
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Total time a timed benchmark is repeated for, keeping its fastest run
+MIN_TIME = 1.0
+
+# Functions of a profiled simulation, by component. Cumulative times: the policy includes the positions and portfolio
+COMPONENTS = {
+    'forecast': [('forecast.py', 'forecast'), ('forecast.py', 'best_exits')],
+    'policy': [('policy.py', 'apply_policy'), ('policy.py', 'apply_policy_arrays')],
+    'positions': [('position.py', 'should_sell'), ('position.py', 'should_sell_arrays')],
+    'portfolio': [('portfolio.py', 'buy'), ('portfolio.py', 'sell'), ('portfolio.py', 'record')],
+    'kernel': [('kernel.py', 'policy_kernel')],
+}
+
+
+def measure(function, *args, trace_memory=False, min_time=0.0, max_repeat=10, **kwargs):
+    """
+    Time a function call, and optionally trace its peak memory (which slows it down).
+    Short calls can be repeated to reduce the noise: the fastest call is kept.
+    :param function: The function to call.
+    :param bool trace_memory: Whether to trace the memory allocated by the call, with tracemalloc.
+    :param float min_time: The total time to repeat the call for, in seconds, 0 to call it once.
+    :param int max_repeat: The maximum number of calls.
+    :return tuple: The result of the last call, its fastest duration in seconds, and its peak memory in MB (None if not
+        traced).
+    """
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        durations = []
+        while not durations or (sum(durations) < min_time and len(durations) < max_repeat):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            durations.append(time.perf_counter() - start)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20 if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, min(durations), peak_mb
+
+
+def profile_components(function, *args, **kwargs):
+    """
+    Profile a function call, and get the share of its time spent in each component of the simulation (see COMPONENTS).
+    :param function: The function to call.
+    :return dict: The share of the total time of each component met during the call, between 0 and 1.
+    """
+    profiler = cProfile.Profile()
+    profiler.runcall(function, *args, **kwargs)
+    stats = pstats.Stats(profiler)
+
+    shares = {}
+    for component, functions in COMPONENTS.items():
+        cumulative = sum(ct for (file, _, name), (_, _, _, ct, _) in stats.stats.items()
+                         if (os.path.basename(file), name) in functions)
+        if cumulative:
+            shares[component] = cumulative / stats.total_tt
+    return shares
+
+
+def run_simulation(data, predict_len, engine='numpy', fee=0.001, min_expected_returns=0.0, stop_loss=-0.02):
+    """
+    Run the policy over some data as estimate_returns does, without loading the configured dataset.
+    :param data: The data, a pd.DataFrame for the pandas engine, OhlcvColumns otherwise.
+    :param int predict_len: The number of timesteps we can predict in the future.
+    :param str engine: The backtest engine, 'pandas', 'numpy' or 'kernel'.
+    :return Portfolio: The portfolio at the end of the simulation.
+    """
+    portfolio = Portfolio(cash=5000.0, crypto=0.0, record_history=False)
+    policy = Policy(min_expected_returns=min_expected_returns, stop_loss=stop_loss)
+    optimizer = Optimizer(portfolio=portfolio, policy=policy, predict_len=predict_len, fee=FeeSchedule(fee))
+    if engine == 'numpy':
+        optimizer.iterate_policy_numpy(data)
+    elif engine == 'kernel':
+        optimizer.iterate_policy_kernel(data)
+    else:
+        optimizer.iterate_policy(data)
+    return portfolio
+
+
+def bench_simulation(n_bars, predict_len, engine='numpy', seed=0, profile=False):
+    """
+    Benchmark a simulation over synthetic bars: steps per second, peak memory and, if profiled, time per component.
+    :param int n_bars: The number of bars.
+    :param int predict_len: The number of timesteps we can predict in the future.
+    :param str engine: The backtest engine, 'pandas', 'numpy' or 'kernel'.
+    :param int seed: The seed of the synthetic bars.
+    :param bool profile: Whether to profile another run to get the time per component.
+    :return dict: The metrics of the benchmark.
+    """
+    data = OhlcvColumns.from_frame(synthetic_ohlcv(n_bars, seed=seed))
+    if engine == 'pandas':
+        data = data.to_frame()
+
+    portfolio, seconds, _ = measure(run_simulation, data, predict_len, engine, min_time=MIN_TIME)
+    _, _, peak_mb = measure(run_simulation, data, predict_len, engine, trace_memory=True)
+    result = {'seconds': seconds, 'steps_per_sec': (n_bars - 1) / seconds, 'peak_mb': peak_mb,
+              'trades': int(portfolio.trades)}
+    if profile:
+        result['components'] = profile_components(run_simulation, data, predict_len, engine)
+    return result
+
+
+def bench_grid_search(n_bars, predict_len, n_combinations=16, seed=0):
+    """
+    Benchmark the throughput of a batched grid search over synthetic bars, combinations sharing a prediction length.
+    :param int n_bars: The number of bars.
+    :param int predict_len: The number of timesteps we can predict in the future.
+    :param int n_combinations: The number of parameter combinations.
+    :param int seed: The seed of the synthetic bars.
+    :return dict: The metrics of the benchmark.
+    """
+    data = OhlcvColumns.from_frame(synthetic_ohlcv(n_bars, seed=seed))
+    min_expected_returns = np.linspace(0, 50, n_combinations)
+    stop_loss = np.resize([-0.02, -0.05], n_combinations)
+
+    def search():
+        optimizer = BatchOptimizer(predict_len, [5000.0] * n_combinations, [0.0] * n_combinations,
+                                   [0.001] * n_combinations, min_expected_returns, stop_loss)
+        optimizer.iterate_policy(data)
+
+    _, seconds, _ = measure(search, min_time=MIN_TIME)
+    _, _, peak_mb = measure(search, trace_memory=True)
+    return {'seconds': seconds, 'combinations_per_sec': n_combinations / seconds,
+            'steps_per_sec': n_combinations * (n_bars - 1) / seconds, 'peak_mb': peak_mb}
+
+
+def bench_loading(n_bars, seed=0, work_dir=None):
+    """
+    Benchmark TsData loading synthetic bars from CSV files and from a price store.
+    :param int n_bars: The number of bars.
+    :param int seed: The seed of the synthetic bars.
+    :param str work_dir: The directory of the files, a temporary one if None.
+    :return dict: The metrics of each format, by format name.
+    """
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        csv_dir = os.path.join(tmp_dir, 'csv')
+        write_synthetic_csv(csv_dir, n_bars, seed=seed)
+        PriceStore.write(os.path.join(tmp_dir, 'synthetic.store'), synthetic_ohlcv(n_bars, seed=seed))
+
+        results = {}
+        for name, kwargs in [('csv', {'csv_dir_list': [csv_dir]}),
+                             ('store', {'store_dir': os.path.join(tmp_dir, 'synthetic.store')})]:
+            _, seconds, _ = measure(TsData, min_time=MIN_TIME, **kwargs)
+            _, _, peak_mb = measure(TsData, trace_memory=True, **kwargs)
+            results[name] = {'seconds': seconds, 'rows_per_sec': n_bars / seconds, 'peak_mb': peak_mb}
+        return results
+
+
+def bench_gaps(n_bars, missing=0.01, seed=0):
+    """
+    Benchmark the gap report of synthetic minute bars with randomly missing rows.
+    :param int n_bars: The number of bars, before dropping the missing ones.
+    :param float missing: The fraction of missing rows.
+    :param int seed: The seed of the missing rows.
+    :return dict: The metrics of the benchmark.
+    """
+    unix = 60 * np.arange(n_bars)
+    data = OhlcvColumns({'unix': unix[np.random.default_rng(seed).random(n_bars) >= missing]})
+    _, seconds, _ = measure(gap_report, data, min_time=MIN_TIME)
+    _, _, peak_mb = measure(gap_report, data, trace_memory=True)
+    return {'seconds': seconds, 'rows_per_sec': len(data['unix']) / seconds, 'peak_mb': peak_mb}
+
+
+def bench_import(module, repeat=3):
+    """
+    Benchmark the import of a module in a fresh interpreter, as paid by a CLI call or a spawned worker process.
+    :param str module: The name of the module, e.g. 'main' or 'src.simulation'.
+    :param int repeat: The number of interpreters started, the fastest import being kept.
+    :return dict: The import time in seconds, the number of modules imported, and the heavy optional libraries imported.
+    """
+    code = ('import sys, time; modules = set(sys.modules); start = time.perf_counter(); '
+            f'import {module}; seconds = time.perf_counter() - start; '
+            'print(seconds, len(set(sys.modules) - modules), *[name for name in ("matplotlib", "seaborn", "tqdm") '
+            'if name in sys.modules])')
+    seconds = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                                check=True).stdout.split()
+        seconds.append(float(output[0]))
+    return {'import_sec': min(seconds), 'modules': int(output[1]), 'heavy_imports': output[2:]}
+
+
+def run_suite(sizes, predict_len_list, engines=('numpy', 'kernel', 'pandas'), pandas_max_bars=10000,
+              profile_max_bars=100000, n_combinations=16, seed=0, import_modules=(), verbose=True):
+    """
+    Run the benchmarks of the imports, and of the simulation, the grid search, the loading and the gap report over
+    synthetic bars of several sizes.
+    :param list sizes: The numbers of bars.
+    :param list predict_len_list: The prediction lengths of the simulations and grid searches.
+    :param tuple engines: The backtest engines of the simulations.
+    :param int pandas_max_bars: The largest number of bars simulated with the (slow) pandas engine.
+    :param int profile_max_bars: The largest number of bars of the simulations profiled by component.
+    :param int n_combinations: The number of parameter combinations of the grid searches.
+    :param int seed: The seed of the synthetic bars.
+    :param tuple import_modules: The modules whose import time is benchmarked, in a fresh interpreter.
+    :param bool verbose: Whether to print each benchmark as it completes.
+    :return dict: The results, with the environment ('meta') and the metrics of each benchmark ('benchmarks').
+    """
+    benchmarks = {}
+
+    def record(name, metrics):
+        benchmarks[name] = metrics
+        if verbose:
+            print(f'{name}: ' + ', '.join(f'{metric} {metrics[metric]:.4g}' for metric in METRICS if metrics.get(metric) is not None)
+                  + (f', importing {", ".join(metrics["heavy_imports"])}' if metrics.get('heavy_imports') else ''))
+
+    for module in import_modules:
+        record(f'imports/{module}', bench_import(module))
+
+    for n_bars in sizes:
+        for predict_len in predict_len_list:
+            for engine in engines:
+                if engine == 'pandas' and n_bars > pandas_max_bars:
+                    continue
+                record(f'simulation/{engine}/{n_bars}/pl{predict_len}',
+                       bench_simulation(n_bars, predict_len, engine, seed=seed, profile=n_bars <= profile_max_bars))
+            record(f'grid_search/{n_bars}/pl{predict_len}',
+                   bench_grid_search(n_bars, predict_len, n_combinations=n_combinations, seed=seed))
+        for name, metrics in bench_loading(n_bars, seed=seed).items():
+            record(f'loading/{name}/{n_bars}', metrics)
+        record(f'gaps/{n_bars}', bench_gaps(n_bars, seed=seed))
+
+    meta = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'numba': HAS_NUMBA,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+    return {'meta': meta, 'benchmarks': benchmarks}
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compare benchmark results against a baseline, on the metrics of METRICS.
+    :param dict results: The results, see run_suite().
+    :param dict baseline: The baseline results.
+    :param float threshold: The relative change that counts as a regression, e.g. 0.2 for 20% slower.
+    :return list: The regressions, as dictionaries with the benchmark, the metric, the baseline and current values,
+        and the relative change (negative when worse).
+    """
+    regressions = []
+    for name, metrics in results['benchmarks'].items():
+        reference = baseline['benchmarks'].get(name)
+        if reference is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            current, previous = metrics.get(metric), reference.get(metric)
+            if not current or not previous:
+                continue
+            change = (current - previous) / previous if higher_is_better else (previous - current) / previous
+            if change < -threshold:
+                regressions.append({'benchmark': name, 'metric': metric, 'baseline': previous, 'current': current,
+                                    'change': change})
+    return regressions
+
+
+def save_results(results, path):
+    """
+    Save benchmark results as JSON.
+    :param dict results: The results, see run_suite().
+    :param str path: The path of the JSON file, its directory created if needed.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    """
+    Load benchmark results saved as JSON.
+    :param str path: The path of the JSON file.
+    :return dict: The results.
+    """
+    with open(path) as f:
+        return json.load(f)
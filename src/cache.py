@@ -0,0 +1,211 @@
+import os
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+from config import config
+from src.dataset import OhlcvColumns, TsData
+from src.resample import resample_ohlcv
+from src.store import PriceStore
+
+# Datasets already loaded by this process, by (source, start position, end position, resolution)
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+# Shared datasets attached by this process, kept mapped for its lifetime
+_attached = []
+
+
+def dataset_source():
+    """
+    Get the configured source of the data: the columnar store if it exists, the pickle file otherwise.
+    :return str: The path of the store directory or of the pickle file.
+    """
+    store_dir = config['data'].get('store_dir')
+    if store_dir and PriceStore.is_store(store_dir):
+        return store_dir
+    return config['data']['pickle_file']
+
+
+def dataset_key(source=None, start_position=None, end_position=None, resolution=None):
+    """
+    Get the cache key of a dataset window. Missing values are read from the configuration.
+    """
+    return (
+        source if source is not None else dataset_source(),
+        start_position if start_position is not None else config['data']['start_position'],
+        end_position if end_position is not None else config['data']['end_position'],
+        resolution if resolution is not None else config['data'].get('resolution'),
+    )
+
+
+def dataset_id(source=None, start_position=None, end_position=None, resolution=None):
+    """
+    Identify a dataset window without reading it: the file name, size and modification time, the window and the
+    resolution, if any. The header of a store stands for the whole store, as it is written last.
+    Missing values are read from the configuration.
+    :return str: The identity of the dataset window.
+    """
+    source, start_position, end_position, resolution = dataset_key(source, start_position, end_position, resolution)
+    path = os.path.join(source, PriceStore.HEADER) if PriceStore.is_store(source) else source
+    stat = os.stat(path)
+    data_id = f'{os.path.basename(source)}:{stat.st_size}:{stat.st_mtime_ns}:{start_position}:{end_position}'
+    return data_id if resolution is None else f'{data_id}:{resolution}'
+
+
+def load_dataset(source=None, start_position=None, end_position=None, resolution=None):
+    """
+    Load and trim a dataset once per process, then serve it from memory.
+    A store is memory-mapped rather than loaded: the window is a zero-copy view of the files, read on first access.
+    Missing arguments are read from the configuration.
+    :param str source: The path to the store directory or to the pickle file containing the data.
+    :param int start_position: The first bar of the window.
+    :param int end_position: The bar after the last one of the window.
+    :param str resolution: The resolution of the bars ('5m', '1h', '1d', ...), the base data if None. Read from the
+        pyramid of a store, aggregated on load for a pickle file.
+    :return OhlcvColumns: The read-only OHLCV columns of the window.
+    """
+    key = dataset_key(source, start_position, end_position, resolution)
+    source, start_position, end_position, resolution = key
+    with _datasets_lock:
+        if key not in _datasets:
+            if PriceStore.is_store(source):
+                _datasets[key] = PriceStore(source).bars(resolution).window(start_position, end_position)
+            else:
+                data = TsData(pickle_file=source).data
+                if resolution is not None:
+                    _datasets[key] = OhlcvColumns(resample_ohlcv(data, resolution))[start_position:end_position]
+                else:
+                    _datasets[key] = OhlcvColumns.from_frame(data.iloc[start_position:end_position])
+        return _datasets[key]
+
+
+def load_window(window=None, source=None, resolution=None):
+    """
+    Get a slice of the configured dataset window, e.g. a shorter window to screen parameters or the windows of a
+    walk-forward split. The slice is a zero-copy view of the window, so that the worker processes attached to a shared
+    window serve all its slices from the same copy of the data.
+    :param tuple window: The (start, end) slice of the configured window, with the semantics of iloc[start:end], the
+        whole window if None.
+    :param str source: The path to the store directory or to the pickle file containing the data.
+    :param str resolution: The resolution of the bars ('5m', '1h', '1d', ...), the base data if None.
+    :return OhlcvColumns: The read-only OHLCV columns of the slice.
+    """
+    data = load_dataset(source=source, resolution=resolution)
+    return data if window is None else data[window[0]:window[1]]
+
+
+def window_id(window=None, source=None, resolution=None):
+    """
+    Identify a slice of the configured dataset window without reading it, see dataset_id().
+    :param tuple window: The (start, end) slice of the configured window, the whole window if None.
+    :return str: The identity of the slice.
+    """
+    data_id = dataset_id(source=source, resolution=resolution)
+    return data_id if window is None else f'{data_id}:window:{window[0]}:{window[1]}'
+
+
+class SharedDataset:
+    """
+    A class to share the OHLCV columns of a dataset between processes.
+    The columns are copied once in a shared memory block by the publishing process, then every worker attaches
+    read-only NumPy arrays to the same block, without copying nor unpickling the data.
+    :ivar SharedMemory shm: The shared memory block.
+    :ivar list layout: The (name, dtype, offset, length) of each column in the block.
+    """
+
+    def __init__(self, shm, layout, owner):
+        """
+        Initialize the SharedDataset class. Use publish() or attach() instead.
+        :param SharedMemory shm: The shared memory block.
+        :param list layout: The (name, dtype, offset, length) of each column in the block.
+        :param bool owner: Whether this process created the block, and must unlink it.
+        """
+        super().__init__()
+
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+
+    @classmethod
+    def publish(cls, columns):
+        """
+        Copy columns in a new shared memory block.
+        :param OhlcvColumns columns: The columns to share.
+        :return SharedDataset: The shared dataset, owner of the block.
+        """
+        layout = []
+        offset = 0
+        for name, values in columns.columns.items():
+            # Align every column on 8 bytes
+            offset = (offset + 7) // 8 * 8
+            layout.append((name, values.dtype.str, offset, len(values)))
+            offset += values.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        shared = cls(shm, layout, owner=True)
+        for name, values in columns.columns.items():
+            np.copyto(shared._array(name, writeable=True), values)
+
+        return shared
+
+    @classmethod
+    def attach(cls, handle):
+        """
+        Attach to a shared dataset published by another process.
+        :param tuple handle: The handle of the shared dataset, see SharedDataset.handle.
+        :return SharedDataset: The shared dataset.
+        """
+        name, layout = handle
+        return cls(shared_memory.SharedMemory(name=name), layout, owner=False)
+
+    @property
+    def handle(self):
+        """
+        A small picklable handle to attach to the shared dataset from another process.
+        """
+        return self.shm.name, self.layout
+
+    def _array(self, name, writeable=False):
+        for col, dtype, offset, length in self.layout:
+            if col == name:
+                array = np.ndarray((length,), dtype=np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+                array.setflags(write=writeable)
+                return array
+        raise KeyError(name)
+
+    def columns(self):
+        """
+        Get zero-copy, read-only views of the shared columns.
+        :return OhlcvColumns: The columns of the dataset.
+        """
+        return OhlcvColumns({name: self._array(name) for name, _, _, _ in self.layout})
+
+    def close(self):
+        """
+        Detach from the shared memory block, and destroy it if this process published it.
+        The arrays of columns() must not be used anymore.
+        """
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def publish_dataset(source=None, start_position=None, end_position=None, resolution=None):
+    """
+    Load a dataset window once and publish it in shared memory for worker processes.
+    :return SharedDataset: The shared dataset. Pass its handle to attach_dataset() in the workers, then close() it.
+    """
+    return SharedDataset.publish(load_dataset(source, start_position, end_position, resolution))
+
+
+def attach_dataset(handle, key):
+    """
+    Attach a worker process to a shared dataset, so that load_dataset() serves it without loading the data.
+    Meant to be used as a process pool initializer.
+    :param tuple handle: The handle of the shared dataset.
+    :param tuple key: The cache key of the dataset window, see dataset_key().
+    """
+    shared = SharedDataset.attach(handle)
+    with _datasets_lock:
+        _datasets[key] = shared.columns()
+    _attached.append(shared)
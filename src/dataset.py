@@ -1,60 +1,199 @@
-import os
 import pickle
-from matplotlib import pyplot as plt
 import numpy as np
 import pandas as pd
-from matplotlib.pyplot import cm
+from src.gaps import fill_to_grid, gap_report
+from src.resample import aggregate_bars, resample_ohlcv
+
+OHLCV_COLUMNS = ['unix', 'open', 'high', 'low', 'close', 'volume']
+
+
+class OhlcvColumns:
+    """
+    A read-only, column-oriented view of OHLCV data backed by NumPy arrays.
+    Like a DataFrame, it is indexed by column name and len() is its number of rows. Slicing rows gives zero-copy views.
+    :ivar dict columns: The arrays of the data, by column name.
+    """
+    def __init__(self, columns):
+        """
+        Initialize the OhlcvColumns class.
+        :param dict columns: The arrays of the data, by column name. All arrays must have the same length.
+        """
+        super().__init__()
+
+        self.columns = {}
+        for name, values in columns.items():
+            values = np.asarray(values).view()
+            values.setflags(write=False)
+            self.columns[name] = values
+
+    @classmethod
+    def from_frame(cls, data, cols_to_keep=OHLCV_COLUMNS):
+        """
+        Copy the OHLCV columns of a dataframe into contiguous arrays.
+        :param pd.DataFrame data: The data.
+        :param list cols_to_keep: The columns to keep, if present in the data.
+        :return OhlcvColumns: The columns of the data.
+        """
+        return cls({col: np.ascontiguousarray(data[col].to_numpy()) for col in cols_to_keep if col in data.columns})
+
+    def to_frame(self):
+        """
+        Copy the columns into a dataframe, for the pandas code paths (reference engine, plots).
+        """
+        return pd.DataFrame(self.columns)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns[key]
+        return OhlcvColumns({name: values[key] for name, values in self.columns.items()})
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+
+class AssetMatrix:
+    """
+    A read-only view of the OHLCV data of several assets aligned on a shared unix index.
+    Every column is an (n_steps, n_assets) matrix, the prices of an asset being NaN before its first bar.
+    Like OhlcvColumns, it is indexed by column name (the 'unix' column being the shared index), len() is its number of
+    timesteps, and slicing timesteps gives zero-copy views.
+    :ivar list names: The names of the assets, in column order.
+    :ivar dict columns: The 'unix' index and the (n_steps, n_assets) matrix of every other column, by column name.
+    """
+    def __init__(self, names, columns):
+        """
+        Initialize the AssetMatrix class.
+        :param list names: The names of the assets, in column order.
+        :param dict columns: The 'unix' index and the (n_steps, n_assets) matrix of every other column, by column name.
+        """
+        super().__init__()
+
+        self.names = list(names)
+        self.columns = {}
+        for name, values in columns.items():
+            values = np.asarray(values).view()
+            values.setflags(write=False)
+            self.columns[name] = values
+
+    @classmethod
+    def align(cls, data_by_asset, how='inner', cols_to_keep=OHLCV_COLUMNS):
+        """
+        Align the data of several assets on a shared unix index.
+        :param dict data_by_asset: The data of every asset (pd.DataFrame or OhlcvColumns sorted by unix), by asset name.
+        :param str how: 'inner' to keep the timesteps of all the assets, 'outer' to keep the timesteps of any asset, the
+            missing bars repeating the last close price (with no volume), NaN before the first bar of an asset.
+        :param list cols_to_keep: The columns to keep, if present in the data of every asset.
+        :return AssetMatrix: The aligned data.
+        """
+        if how not in ('inner', 'outer'):
+            raise ValueError(f"Unknown alignment {how}, expected 'inner' or 'outer'.")
+        names = list(data_by_asset)
+        unix_list = [np.asarray(data_by_asset[name]['unix']) for name in names]
+        unix = unix_list[0]
+        for asset_unix in unix_list[1:]:
+            unix = np.intersect1d(unix, asset_unix) if how == 'inner' else np.union1d(unix, asset_unix)
+
+        value_cols = [col for col in cols_to_keep
+                      if col != 'unix' and all(col in data.columns for data in data_by_asset.values())]
+        columns = {'unix': unix}
+        columns.update({col: np.full((len(unix), len(names)), np.nan) for col in value_cols})
+        for j, (name, asset_unix) in enumerate(zip(names, unix_list)):
+            data = data_by_asset[name]
+            # Index of the last bar of the asset at or before every timestep, -1 before its first bar
+            rows = np.searchsorted(asset_unix, unix, side='right') - 1
+            listed = rows >= 0
+            exact = listed & (asset_unix[np.maximum(rows, 0)] == unix)
+            for col in value_cols:
+                values = np.asarray(data[col], dtype=np.float64)
+                if col in ('open', 'high', 'low', 'close'):
+                    # A missing bar is flat at the last close price
+                    columns[col][listed, j] = np.where(exact[listed], values[rows[listed]],
+                                                       np.asarray(data['close'], dtype=np.float64)[rows[listed]])
+                else:
+                    columns[col][listed, j] = np.where(exact[listed], values[rows[listed]], 0.0)
+        return cls(names, columns)
+
+    def asset(self, name):
+        """
+        Get the data of an asset, as zero-copy views of its columns.
+        :param str name: The name of the asset.
+        :return OhlcvColumns: The columns of the asset.
+        """
+        j = self.names.index(name)
+        return OhlcvColumns({col: values if col == 'unix' else values[:, j] for col, values in self.columns.items()})
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns[key]
+        return AssetMatrix(self.names, {name: values[key] for name, values in self.columns.items()})
+
+    def __len__(self):
+        return len(self.columns['unix'])
+
 
 class TsData:
-    def __init__(self, csv_dir_list=None, pickle_file=None, sampling=None):
+    def __init__(self, csv_dir_list=None, pickle_file=None, sampling=None, store_dir=None, resolution=None):
         """
         Load a data file containing crypto prices.
         :param list csv_dir_list: A list of directories containing the CSV files. e.g. ['data/cryptoarchive', 'data/kraken', 'data/kaggle']
         :param str pickle_file: The path to the pickle file containing the data.
+        :param str store_dir: The path to the columnar store containing the data, see PriceStore.
+        :param str resolution: The resolution of the bars to load from the store ('5m', '1h', '1d', ...), its base data if None.
         """
         
         self.csv_dir_list = csv_dir_list
         self.pickle_file = pickle_file
+        self.store_dir = store_dir
         self.sampling = sampling
+        self.source_runs = None  # Runs of the rows of each source before the merge, for their gaps
         
         # Get data
         if self.csv_dir_list:
-            self.data_list = self._load_data(self.csv_dir_list)
-            self.data = self._combine_data(self.data_list)
+            # Parse the csv files in parallel, and merge the sources by unix, the first sources winning on duplicates
+            from src.ingest import load_sources
+
+            self.source_runs = {}
+            self.data = load_sources(self.csv_dir_list, source_runs=self.source_runs).to_frame()
+            print(f'Combined {len(self.data)} entries in total:')
             self.data = self._sample_data(self.data, self.sampling)
         elif pickle_file:
             # Load the crypto dataset
             with open(pickle_file, 'rb') as f:
                 self.data = pickle.load(f)
             # print(f'Loaded Pickle of shape {self.data.shape}, with columns {self.data.columns}.')
+        elif store_dir:
+            from src.ingest import load_source_runs
+            from src.store import PriceStore
+
+            self.data = PriceStore(store_dir).bars(resolution).window().to_frame()
+            self.source_runs = load_source_runs(store_dir)
+
+    @staticmethod
+    def load_assets(sources, resolution=None, how='inner'):
+        """
+        Load the data of several assets and align it on a shared unix index, e.g. to backtest them together.
+        :param dict sources: The path of the store directory or of the pickle file of every asset, by asset name.
+        :param str resolution: The resolution of the bars ('5m', '1h', '1d', ...), the base data if None.
+        :param str how: 'inner' to keep the timesteps of all the assets, 'outer' to keep those of any asset.
+        :return AssetMatrix: The aligned data of the assets.
+        """
+        from src.store import PriceStore
+
+        data_by_asset = {}
+        for name, source in sources.items():
+            if PriceStore.is_store(source):
+                data_by_asset[name] = PriceStore(source).bars(resolution).window()
+            else:
+                data = TsData(pickle_file=source).data
+                data_by_asset[name] = data if resolution is None else pd.DataFrame(resample_ohlcv(data, resolution))
+        return AssetMatrix.align(data_by_asset, how=how)
 
     @staticmethod
     def import_csv(data_folder, cols_to_keep=['unix', 'open', 'high', 'low', 'close', 'volume']):
-        # Check if the data folder exists
-        if not os.path.isdir(data_folder):
-            raise IsADirectoryError(f'{data_folder} is not a directory.')
-        
-        # Get a list of all csv files in the data folder
-        csv_files = [file for file in os.listdir(data_folder) if file.endswith('.csv')]
-        csv_files.sort()
-        
-        # Create an empty list to store the dataframes
-        dfs = []
-        # Iterate over each csv file
-        for file in csv_files:
-            # Construct the full path of the csv file
-            file_path = os.path.join(data_folder, file)
-            # Read the csv file into a dataframe
-            df = pd.read_csv(file_path)
-            # Append the dataframe to the list
-            dfs.append(df)
-            
-        # Concatenate all dataframes into a single dataframe
-        data = pd.concat(dfs, ignore_index=True)
-        # Sort the dataframe by the 'unix' column
-        data = data.sort_values('unix')
-        data = data[cols_to_keep]
-        data.reset_index(inplace=True)
+        # Parse the csv files of the folder in parallel and merge them by unix
+        from src.ingest import load_sources
+
+        data = load_sources([data_folder]).to_frame()[cols_to_keep]
         
         print(f'Imported {len(data)} entries from {data_folder}')
         return data
@@ -62,24 +201,6 @@ class TsData:
     def print_data(self, head=3):
         print(f'Fusionned Data:\n{self.data.head(head)}')
 
-    def _load_data(self, csv_dirs):
-        data = []
-        for csv_dir in csv_dirs:
-            data.append(self.import_csv(csv_dir))
-        return data
-    
-    @staticmethod
-    def _combine_data(data_list):
-        # Combine data
-        crypto = pd.concat(data_list, ignore_index=True)
-        crypto.drop_duplicates(subset='unix', keep='first', inplace=True)
-        crypto = crypto.sort_values('unix', ascending=True)
-        crypto.drop(columns='index', inplace=True)
-        crypto.reset_index(drop=True, inplace=True)
-        print(f'Combined {len(crypto)} entries in total:')
-        
-        return crypto
-    
     def _sample_data(self, data, sampling):
         if not sampling or sampling == 1:
             return data
@@ -88,11 +209,16 @@ class TsData:
         elif sampling > len(data):
             raise ValueError('Sampling must be less than the length of the data.')
         
-        # Sample data
-        data = data.iloc[::sampling]
+        # Aggregate every sampling rows into a bar, keeping the high, low and volume of all of them
+        data = pd.DataFrame(aggregate_bars(data, np.arange(0, len(data), sampling)))
         print(f'Sampled data to {sampling} intervals.')
         
         return data
+
+    def resample(self, resolution):
+        # Aggregate the data into OHLCV bars of a fixed duration ('5m', '1h', '1d' or a number of seconds)
+        self.data = pd.DataFrame(resample_ohlcv(self.data, resolution))
+        return self.data
     
     def save_pickle(self, path):
         # Save crypto as a pickle file
@@ -100,52 +226,57 @@ class TsData:
             pickle.dump(self.data, f)
 
         print(f'Saved crypto as a numpy pickle file: {path}')
+
+    def save_store(self, path):
+        # Save crypto as a columnar store, memory-mapped when loaded
+        from src.store import PriceStore
+
+        PriceStore.write(path, self.data)
+
+        print(f'Saved crypto as a columnar store: {path}')
     
-    @staticmethod        
-    def _get_missing_dates(data):
-        # Generate a sequence of all expected dates with one minute intervals
-        expected_dates = pd.date_range(start=pd.to_datetime(data['unix'], unit='s').min(), end=pd.to_datetime(data['unix'], unit='s').max(), freq='1min')
-        # Find the missing dates by comparing the expected dates with the actual dates in the dataframe
-        missing_dates = expected_dates[~expected_dates.isin(pd.to_datetime(data['unix'], unit='s'))]
-        
-        return missing_dates
+    def get_gaps(self, step=None):
+        # Find the gaps of the combined series, and of the rows of each source before the merge if they are known
+        return gap_report(self.data, step, self.source_runs)
 
-    @staticmethod
-    def missing_dates_stats(missing_dates, data):
-        # Find the closest entries in the crypto date column to one of the missing dates
-        displayed_intervals = []
-        last_interval = None
-        for missing_date in missing_dates:
-            if not last_interval or missing_date > last_interval[1]:
-                previous_entry = data.loc[data['date'] < missing_date].tail(1)
-                next_entry = data.loc[data['date'] > missing_date].head(1)
-                closest_entries = pd.concat([previous_entry, next_entry], ignore_index=True)
-                interval = (previous_entry['date'].values[0], next_entry['date'].values[0])
-                last_interval = interval
-                if interval not in displayed_intervals:
-                    displayed_intervals.append(interval)
-                    print(f"##### {missing_date} #####")
-                    print(closest_entries)
+    def print_gaps(self, step=None, longest=5):
+        # Print the statistics and the longest gaps of the combined series and of each source
+        for name, report in self.get_gaps(step).items():
+            stats = report['stats']
+            print(f"##### {name if name == 'combined' else f'Source {name}'} #####")
+            print(f"{stats['rows']} rows, {stats['gaps']} gaps, {stats['missing_rows']} missing rows "
+                  f"({100 * stats['coverage']:.2f}% coverage), longest gap of {stats['longest_gap']} rows")
+            gaps = report['gaps'][np.argsort(report['gaps'][:, 2], kind='stable')[::-1][:longest]]
+            for gap_start, gap_end, length in gaps:
+                print(f"{pd.to_datetime(gap_start, unit='s')} -> {pd.to_datetime(gap_end, unit='s')}: {length} rows")
+
+    def fill_gaps(self, step=None, method='ffill'):
+        # Reindex the data on a regular grid, filling the missing rows ('ffill' or 'interpolate')
+        self.data = pd.DataFrame(fill_to_grid(self.data, step, method))
+        return self.data
         
     def _get_fig(self):
+        # Import the plotting library only when plotting
+        from matplotlib import pyplot as plt
+
         fig = plt.figure(figsize=(10, 5))
         fig.gca().scatter(pd.to_datetime(self.data['unix'], unit='s'), self.data['open'], s=0.05, color='black', label='Fusionned Sources', marker='x')
         return fig
         
     def plot_data(self):            
+        from matplotlib import pyplot as plt
+        from matplotlib.pyplot import cm
+
         # Plot data
         fig = self._get_fig()
         ax = fig.gca()
         
-        # Plot the missing dates
-        missing_dates = self._get_missing_dates(self.data)
-        ax.scatter(pd.to_datetime(missing_dates, unit='s'), [0 for _ in missing_dates], s=0.05, color='black')
-        if self.csv_dir_list:
-            colors = cm.rainbow(np.linspace(0, 1, len(self.data_list)))
-            idx = 0
-            for idx, (data, color) in enumerate(zip(self.data_list, colors)):
-                current_missing_dates = self._get_missing_dates(data)
-                ax.scatter(pd.to_datetime(current_missing_dates, unit='s'), [-500*(idx+1) for _ in current_missing_dates], s=0.05, color=color, label=f'Missing source {idx}')
+        # Plot the gaps of the combined series, then of each source
+        report = self.get_gaps()
+        colors = cm.rainbow(np.linspace(0, 1, len(report)))
+        for idx, ((name, source_report), color) in enumerate(zip(report.items(), colors)):
+            gaps = source_report['gaps']
+            ax.hlines([-500*idx for _ in gaps], pd.to_datetime(gaps[:, 0], unit='s'), pd.to_datetime(gaps[:, 1], unit='s'), color=color, label=f'Missing {name if name == "combined" else f"source {name}"}')
         
         # Set the x-axis label
         ax.set_xlabel('Date')
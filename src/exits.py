@@ -0,0 +1,110 @@
+import heapq
+from bisect import bisect_left
+from itertools import count
+from src.position import Position
+
+# Relative margin on the stop prices, so that rounding never hides a stop that Position.should_sell would trigger
+STOP_MARGIN = 1e-9
+
+
+class ExitScheduler:
+    """
+    A class to index the exits of the open positions, so that a timestep only visits the positions that may be sold.
+    Each position registers its scheduled exit date in a min-heap, and the price that triggers its stop loss in a
+    sorted index. A timestep then pops the positions whose scheduled exit has arrived, and those whose stop price is
+    crossed by the current price, and only these are checked with Position.should_sell_arrays.
+    The other positions are kept, as Position.should_sell_arrays would decide: with a constant selling fee and
+    predictions that do not change from one timestep to the next (e.g. the true future prices), the maximum of the
+    horizon cannot fall below the scheduled exit price before its date (up to prices a few ulps apart).
+    :ivar float fee: The constant selling fee.
+    """
+
+    def __init__(self, fee):
+        """
+        Initialize the ExitScheduler class.
+        :param float fee: The constant selling fee.
+        """
+        super().__init__()
+
+        self.fee = fee
+        self._order = {}  # Buy order of the open positions
+        self._tickets = {}  # Last heap entry of each open position
+        self._counter = count()
+        self._exits = []  # Heap of (scheduled exit date, ticket, position)
+        self._stops = []  # Sorted (stop price, buy order)
+        self._stop_positions = []  # Positions of the sorted stop prices
+
+    @staticmethod
+    def _has_stop(position: Position):
+        # A position bought without cash can not reach its stop loss
+        return position.stop_loss is not None and position.quantity > 0
+
+    def _stop_price(self, position: Position):
+        # The price under which position.should_sell_arrays triggers the stop loss
+        return position.entry_cash * (1 + position.stop_loss) / (position.quantity * (1 - self.fee))
+
+    def add(self, position: Position):
+        """
+        Register a new position, with its scheduled exit and stop loss.
+        A position not expected to be profitable at its scheduled exit (bought with negative minimum expected returns)
+        is checked at the next timestep.
+        :param Position position: The position, just bought.
+        """
+        order = next(self._counter)
+        self._order[position] = order
+        if position.scheduled_exit_returns is not None and position.scheduled_exit_returns > 0:
+            self.reschedule(position)
+        else:
+            self.reschedule(position, position.entry_date)
+        if self._has_stop(position):
+            key = (self._stop_price(position), order)
+            index = bisect_left(self._stops, key)
+            self._stops.insert(index, key)
+            self._stop_positions.insert(index, position)
+
+    def reschedule(self, position: Position, date=None):
+        """
+        Register the scheduled exit of a position, after it was updated. Its previous one is discarded.
+        :param Position position: The position.
+        :param date: The date to check the position at, its scheduled exit date if None.
+        """
+        ticket = next(self._counter)
+        self._tickets[position] = ticket
+        heapq.heappush(self._exits, (position.scheduled_exit_date if date is None else date, ticket, position))
+
+    def remove(self, position: Position):
+        """
+        Unregister a sold position. Its scheduled exits are discarded when they are popped.
+        :param Position position: The position.
+        """
+        order = self._order.pop(position)
+        del self._tickets[position]
+        if self._has_stop(position):
+            index = bisect_left(self._stops, (self._stop_price(position), order))
+            del self._stops[index]
+            del self._stop_positions[index]
+
+    def due(self, current_date, current_price):
+        """
+        Pop the positions whose scheduled exit has arrived or whose stop price is crossed.
+        :param current_date: The current date.
+        :param float current_price: The current price.
+        :return list: The positions to check, in the order they were bought.
+        """
+        due = {}
+
+        # Scheduled exits that have arrived, skipping those of sold or rescheduled positions
+        while self._exits and self._exits[0][0] <= current_date:
+            _, ticket, position = heapq.heappop(self._exits)
+            if self._tickets.get(position) == ticket:
+                due[position] = self._order[position]
+
+        # Stop prices crossed by the current price
+        index = bisect_left(self._stops, (current_price * (1 - STOP_MARGIN), -1))
+        for (_, order), position in zip(self._stops[index:], self._stop_positions[index:]):
+            due[position] = order
+
+        return sorted(due, key=due.get)
+
+    def __len__(self):
+        return len(self._order)
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class FeeSchedule:
+    """
+    A class to represent the transaction fees over time, with separate selling and buying fees.
+    The orders of the simulation are market orders, which pay the taker fee of the exchange on both sides: give the
+    taker rate of the exchange for both fees, or different ones to model e.g. a fee discount on one side.
+    Each fee can be a constant, a NumPy array (one fee per timestep) or a callable mapping an array of unix
+    timestamps to an array of fees. The schedule is resolved once over the data with bind(), then indexed in O(1).
+    :ivar sell_fee: The fee charged when selling an asset.
+    :ivar buy_fee: The fee charged when buying an asset.
+    """
+
+    def __init__(self, sell_fee, buy_fee=None):
+        """
+        Initialize the FeeSchedule class.
+        :param sell_fee: The selling fee, as a float, a np.ndarray or a callable of the unix timestamps.
+        :param buy_fee: The buying fee, same types as sell_fee. Defaults to the selling fee.
+        """
+        super().__init__()
+
+        self.sell_fee = sell_fee
+        self.buy_fee = sell_fee if buy_fee is None else buy_fee
+
+    @staticmethod
+    def _resolve(fee, unix):
+        """
+        Resolve a fee over the given timestamps into an array of fees.
+        A constant fee is broadcast as a read-only view, so it costs O(1) memory whatever the data length.
+        """
+        if callable(fee):
+            fee = fee(unix)
+
+        fees = np.asarray(fee, dtype=np.float64)
+        if fees.ndim == 0:
+            return np.broadcast_to(fees, unix.shape)
+        if fees.shape != unix.shape:
+            raise ValueError(f'The fee schedule has shape {fees.shape}, expected {unix.shape}.')
+
+        return fees
+
+    def bind(self, unix):
+        """
+        Resolve the selling and buying fees over the timestamps of the data.
+        :param np.ndarray unix: The unix timestamps of the data.
+        :return FeeSchedule: A schedule with one selling and one buying fee per timestep.
+        """
+        unix = np.asarray(unix)
+        return FeeSchedule(self._resolve(self.sell_fee, unix), self._resolve(self.buy_fee, unix))
+
+    def window(self, start, stop):
+        """
+        Get a zero-copy view of the bound schedule between two timesteps.
+        :param int start: The first timestep of the window.
+        :param int stop: The timestep after the last one of the window.
+        :return FeeSchedule: The fees of the window.
+        """
+        return FeeSchedule(self.sell_fee[start:stop], self.buy_fee[start:stop])
+
+    def is_constant(self):
+        """
+        Return True if the selling fee is the same at every timestep of the bound schedule, False otherwise.
+        The best exit over a horizon is then the maximum of the prices, whatever the buying fee.
+        """
+        sell_fee = np.asarray(self.sell_fee)
+        return sell_fee.strides == (0,) or bool(np.all(sell_fee == sell_fee[0]))
+
+    def __len__(self):
+        return len(self.sell_fee)
+
+    def __getitem__(self, index):
+        """
+        Get the selling fee at a timestep, so that a schedule can be read like a list of fees.
+        """
+        return self.sell_fee[index]
+
+
+def sell_fees(fees):
+    """
+    Get the selling fees of a FeeSchedule, or the fees themselves for a plain sequence of fees.
+    """
+    return fees.sell_fee if isinstance(fees, FeeSchedule) else fees
+
+
+def buy_fees(fees):
+    """
+    Get the buying fees of a FeeSchedule, or the fees themselves for a plain sequence of fees.
+    """
+    return fees.buy_fee if isinstance(fees, FeeSchedule) else fees
@@ -0,0 +1,114 @@
+import numpy as np
+from src.position import Position
+
+
+def trigger_prices(entry_cash, quantity, returns_pct, fee):
+    """
+    Get the prices at which positions reach some returns, the threshold of their stop loss or take profit orders.
+    :param np.ndarray entry_cash: The cash spent to enter each position.
+    :param np.ndarray quantity: The quantity of asset held by each position.
+    :param np.ndarray returns_pct: The returns reached by each position, as a fraction of its entry cash.
+    :param float fee: The selling fee.
+    :return np.ndarray: The trigger price of each position.
+    """
+    return entry_cash * (1 + returns_pct) / (quantity * (1 - fee))
+
+
+def intrabar_fills(stop_prices, take_profit_prices, bar_open, bar_high, bar_low, slippage=0.0):
+    """
+    Fill the stop loss and take profit orders of long positions inside a bar, from its open, high and low prices.
+    A stop loss triggers when the low falls below its price, and fills at the stop price, or at the open if the bar
+    opened below it, minus the slippage. A take profit triggers when the high reaches its price, and fills at the take
+    profit price, or at the open if the bar opened above it. When both trigger in the same bar, the order of the prices
+    inside the bar is unknown: the stop loss fills first, unless the bar opened above the take profit.
+    :param np.ndarray stop_prices: The stop loss price of each position, -inf without stop loss.
+    :param np.ndarray take_profit_prices: The take profit price of each position, inf without take profit.
+    :param float bar_open: The open price of the bar (or an array, one bar per order).
+    :param float bar_high: The high price of the bar (or an array, one bar per order).
+    :param float bar_low: The low price of the bar (or an array, one bar per order).
+    :param float slippage: The fraction of the price lost when a stop loss fills, as a market order.
+    :return tuple: The mask of the filled positions, and their fill prices (NaN for the others).
+    """
+    take_profit = (bar_high >= take_profit_prices) & ((bar_open >= take_profit_prices) | (bar_low >= stop_prices))
+    stop = (bar_low < stop_prices) & ~take_profit
+
+    fill_prices = np.where(take_profit, np.maximum(bar_open, take_profit_prices),
+                           np.where(stop, np.minimum(bar_open, stop_prices) * (1 - slippage), np.nan))
+    return stop | take_profit, fill_prices
+
+
+class FillEngine:
+    """
+    A class to fill the stop loss and take profit orders of the open positions inside the bars, instead of at the close.
+    The orders are kept as arrays, so that a bar checks all the positions in a single vectorized operation.
+    :ivar float slippage: The fraction of the price lost when a stop loss fills.
+    """
+
+    def __init__(self, slippage=0.0):
+        """
+        Initialize the FillEngine class.
+        :param float slippage: The fraction of the price lost when a stop loss fills, as a market order.
+        """
+        super().__init__()
+
+        self.slippage = slippage
+        self._positions = []  # Positions with an order, in the order they were bought
+        self._entry_cash = np.empty(0)
+        self._quantity = np.empty(0)
+        self._stop_loss = np.empty(0)
+        self._take_profit = np.empty(0)
+
+    def add(self, position: Position):
+        """
+        Register the orders of a new position, if it has any.
+        :param Position position: The position, just bought.
+        """
+        if (position.stop_loss is None and position.take_profit is None) or not position.quantity > 0:
+            return
+        self._positions.append(position)
+        self._entry_cash = np.append(self._entry_cash, position.entry_cash)
+        self._quantity = np.append(self._quantity, position.quantity)
+        self._stop_loss = np.append(self._stop_loss, -np.inf if position.stop_loss is None else position.stop_loss)
+        self._take_profit = np.append(self._take_profit, np.inf if position.take_profit is None else position.take_profit)
+
+    def remove(self, position: Position):
+        """
+        Unregister the orders of a position sold by the policy.
+        :param Position position: The position.
+        """
+        if position in self._positions:
+            self._keep(np.arange(len(self._positions)) != self._positions.index(position))
+
+    def _keep(self, keep):
+        # Only keep the orders of a mask of the positions
+        self._positions = [position for position, kept in zip(self._positions, keep) if kept]
+        self._entry_cash = self._entry_cash[keep]
+        self._quantity = self._quantity[keep]
+        self._stop_loss = self._stop_loss[keep]
+        self._take_profit = self._take_profit[keep]
+
+    def fill(self, bar_open, bar_high, bar_low, fee):
+        """
+        Fill the orders triggered inside a bar, and unregister them.
+        :param float bar_open: The open price of the bar.
+        :param float bar_high: The high price of the bar.
+        :param float bar_low: The low price of the bar.
+        :param float fee: The selling fee.
+        :return list: The filled positions, as (position, fill price), in the order they were bought.
+        """
+        if not self._positions:
+            return []
+
+        filled, fill_prices = intrabar_fills(
+            trigger_prices(self._entry_cash, self._quantity, self._stop_loss, fee),
+            trigger_prices(self._entry_cash, self._quantity, self._take_profit, fee),
+            bar_open, bar_high, bar_low, self.slippage)
+        if not filled.any():
+            return []
+
+        fills = [(self._positions[i], float(fill_prices[i])) for i in np.flatnonzero(filled)]
+        self._keep(~filled)
+        return fills
+
+    def __len__(self):
+        return len(self._positions)
@@ -0,0 +1,165 @@
+import hashlib
+import importlib
+import json
+import os
+import numpy as np
+from config import config
+from src.utils.utils import rolling_forward_argmax
+
+
+class Forecaster:
+    """
+    A base class for the forecasting models of the policy.
+    A forecaster is evaluated ahead of time, by batches of timesteps over the whole backtest window, into a dense
+    (n_steps, predict_len) prediction matrix: row i holds the close prices predicted at timestep i for the timesteps
+    i to i + predict_len - 1, NaN past the end of the data. The optimizer then reads the matrix by row.
+    Subclasses implement predict_batch(), and should only use the data before each timestep.
+    :ivar str model_id: The identifier of the model, part of the cache key of its predictions.
+    :ivar bool cacheable: Whether the predictions are worth caching on disk.
+    :ivar bool consistent: Whether the predictions of a timestep are the same from every earlier timestep, which lets
+        the optimizer index the scheduled exits (see ExitScheduler).
+    :ivar int batch_size: The number of timesteps predicted at once.
+    """
+    model_id = None
+    cacheable = True
+    consistent = False
+
+    def __init__(self, batch_size=4096):
+        """
+        Initialize the Forecaster class.
+        :param int batch_size: The number of timesteps predicted at once.
+        """
+        super().__init__()
+
+        self.batch_size = batch_size
+
+    def predict_batch(self, data, steps, predict_len):
+        """
+        Predict the close prices of the horizon of some timesteps.
+        :param data: The data (pd.DataFrame or OhlcvColumns) with columns 'unix' and 'close'.
+        :param np.ndarray steps: The timesteps to predict from.
+        :param int predict_len: The number of timesteps to predict.
+        :return np.ndarray: The (len(steps), predict_len) predicted close prices.
+        """
+        raise NotImplementedError
+
+    def forecast(self, data, predict_len):
+        """
+        Predict the horizon of every timestep of the data, by batches.
+        :param data: The data (pd.DataFrame or OhlcvColumns) with columns 'unix' and 'close'.
+        :param int predict_len: The number of timesteps to predict.
+        :return np.ndarray: The (len(data), predict_len) prediction matrix, NaN past the end of the data.
+        """
+        n_steps = len(data)
+        predictions = np.empty((n_steps, predict_len))
+        for start in range(0, n_steps, self.batch_size):
+            steps = np.arange(start, min(start + self.batch_size, n_steps))
+            predictions[steps] = self.predict_batch(data, steps, predict_len)
+
+        # Hide the predictions past the end of the data, as the horizons are truncated there
+        past_end = np.arange(n_steps)[:, None] + np.arange(predict_len) >= n_steps
+        predictions[past_end] = np.nan
+        return predictions
+
+    def best_exits(self, predictions):
+        """
+        Index the maximum predicted price of every row of a prediction matrix.
+        Ties resolve to the first occurrence, as list.index(max(...)).
+        :param np.ndarray predictions: The prediction matrix, see forecast().
+        :return np.ndarray: The absolute timestep of the maximum predicted price of every row.
+        """
+        return np.arange(len(predictions)) + np.argmax(np.nan_to_num(predictions, nan=-np.inf), axis=1)
+
+
+class OracleForecaster(Forecaster):
+    """
+    A forecaster predicting the true future prices.
+    Its prediction matrix is a zero-copy sliding window over the close prices, not worth caching.
+    """
+    model_id = 'oracle'
+    cacheable = False
+    consistent = True
+
+    def predict_batch(self, data, steps, predict_len):
+        return self.forecast(data, predict_len)[steps]
+
+    def forecast(self, data, predict_len):
+        prices = np.asarray(data['close'], dtype=np.float64)
+        padded = np.concatenate([prices, np.full(predict_len - 1, np.nan)])
+        return np.lib.stride_tricks.sliding_window_view(padded, predict_len)
+
+    def best_exits(self, predictions):
+        # The first column of the prediction matrix is the close prices
+        return rolling_forward_argmax(predictions[:, 0], predictions.shape[1])
+
+
+class CachedForecaster(Forecaster):
+    """
+    A forecaster caching the prediction matrices of another one on disk, as .npy files memory-mapped when loaded.
+    The cache key is the model, the dataset window and the prediction length.
+    :ivar Forecaster forecaster: The cached forecaster.
+    :ivar str data_id: The identity of the dataset window, see dataset_id().
+    :ivar str cache_dir: The directory of the cached predictions.
+    """
+
+    def __init__(self, forecaster, data_id, cache_dir=None):
+        """
+        Initialize the CachedForecaster class.
+        :param Forecaster forecaster: The forecaster to cache.
+        :param str data_id: The identity of the dataset window the forecaster is evaluated on, see dataset_id().
+        :param str cache_dir: The directory of the cached predictions, read from the configuration if None.
+        """
+        super().__init__(forecaster.batch_size)
+
+        self.forecaster = forecaster
+        self.model_id = forecaster.model_id
+        self.consistent = forecaster.consistent
+        self.data_id = data_id
+        self.cache_dir = cache_dir or config['forecast']['cache_dir']
+
+    def cache_path(self, predict_len):
+        """
+        Get the path of the cached prediction matrix of a prediction length.
+        """
+        key = hashlib.sha1(json.dumps([self.model_id, self.data_id, predict_len]).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f'{self.model_id}-{key}.npy')
+
+    def predict_batch(self, data, steps, predict_len):
+        return self.forecaster.predict_batch(data, steps, predict_len)
+
+    def forecast(self, data, predict_len):
+        path = self.cache_path(predict_len)
+        if os.path.exists(path):
+            predictions = np.load(path, mmap_mode='r')
+            if predictions.shape == (len(data), predict_len):
+                return predictions
+
+        predictions = self.forecaster.forecast(data, predict_len)
+
+        # Write a hidden file then rename it, so that concurrent runs never load a partial matrix
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = os.path.join(self.cache_dir, f'.{os.path.basename(path)}.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, predictions)
+        os.replace(tmp_path, path)
+        return predictions
+
+    def best_exits(self, predictions):
+        return self.forecaster.best_exits(predictions)
+
+
+def load_forecaster(name):
+    """
+    Create a forecaster from the name of its class, as given on the command line.
+    :param str name: 'oracle', or the import path of a Forecaster subclass, as 'module:Class' or 'module.Class'.
+    :return Forecaster: The forecaster, created with its default arguments.
+    """
+    if name == OracleForecaster.model_id:
+        return OracleForecaster()
+    module, _, cls_name = name.rpartition(':') if ':' in name else name.rpartition('.')
+    if not module:
+        raise ValueError(f'Unknown forecaster {name}, expected oracle or the import path of a Forecaster subclass.')
+    cls = getattr(importlib.import_module(module), cls_name)
+    if not (isinstance(cls, type) and issubclass(cls, Forecaster)):
+        raise ValueError(f'{name} is not a Forecaster subclass.')
+    return cls()
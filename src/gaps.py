@@ -0,0 +1,169 @@
+import numpy as np
+
+# Columns filled with the last close when filling gaps, the other ones being set to 0
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+FILL_METHODS = ('ffill', 'interpolate')
+
+
+def infer_step(unix):
+    """
+    Infer the sampling of a series of timestamps, as the median difference between consecutive ones.
+    :param np.ndarray unix: The sorted timestamps.
+    :return int: The number of seconds between two rows.
+    """
+    if len(unix) < 2:
+        raise ValueError('At least two timestamps are needed to infer the sampling.')
+    return int(np.median(np.diff(unix)))
+
+
+def find_gaps(unix, step=None):
+    """
+    Find the gaps of a series of timestamps, with a single pass of np.diff.
+    :param np.ndarray unix: The sorted timestamps.
+    :param int step: The number of seconds between two rows, inferred if None.
+    :return np.ndarray: One (gap_start, gap_end, length) row per gap, gap_start and gap_end being the first and the
+        last missing timestamps, and length the number of missing rows.
+    """
+    unix = np.asarray(unix, dtype=np.int64)
+    step = step or infer_step(unix)
+
+    diff = np.diff(unix)
+    idx = np.flatnonzero(diff > step)
+    length = (diff[idx] - 1) // step
+    return np.column_stack([unix[idx] + step, unix[idx] + length * step, length])
+
+
+def find_runs(unix, step=None):
+    """
+    Find the runs of a series of timestamps, the complement of its gaps: a run is a sequence of timestamps at most
+    step apart. A compact index of the coverage of a series, e.g. of each file of a source.
+    :param np.ndarray unix: The sorted timestamps.
+    :param int step: The number of seconds between two rows, inferred if None.
+    :return np.ndarray: One (run_start, run_end) row per run, the first and the last timestamps of the run.
+    """
+    unix = np.asarray(unix, dtype=np.int64)
+    if len(unix) < 2:
+        return np.column_stack([unix, unix])
+    step = step or infer_step(unix)
+
+    breaks = np.flatnonzero(np.diff(unix) > step)
+    return np.column_stack([unix[np.r_[0, breaks + 1]], unix[np.r_[breaks, len(unix) - 1]]])
+
+
+def merge_runs(runs, step):
+    """
+    Merge the runs of several series of the same source (e.g. its files) into the runs of their union.
+    :param np.ndarray runs: The (run_start, run_end) rows, in any order.
+    :param int step: The number of seconds between two rows: runs at most step apart are merged.
+    :return np.ndarray: The sorted and disjoint runs of the union.
+    """
+    runs = np.asarray(runs, dtype=np.int64).reshape(-1, 2)
+    runs = runs[np.argsort(runs[:, 0], kind='stable')]
+    # A run starts a new merged run if it starts after the end of all the previous ones
+    ends = np.maximum.accumulate(runs[:, 1])
+    starts = np.flatnonzero(np.r_[True, runs[1:, 0] > ends[:-1] + step])
+    return np.column_stack([runs[starts, 0], ends[np.r_[starts[1:] - 1, len(runs) - 1]]]) if len(runs) else runs
+
+
+def gap_stats(unix, gaps, step=None, rows=None):
+    """
+    Summarize the gaps of a series of timestamps.
+    :param np.ndarray unix: The sorted timestamps, or the first and the last ones with the number of rows.
+    :param np.ndarray gaps: The gaps of the timestamps, see find_gaps().
+    :param int step: The number of seconds between two rows, inferred if None.
+    :param int rows: The number of rows, the number of timestamps if None.
+    :return dict: The number of gaps, of present and missing rows, the coverage of the time range and the gap lengths.
+    """
+    step = step or infer_step(unix)
+    rows = len(unix) if rows is None else rows
+    lengths = gaps[:, 2]
+    missing = int(lengths.sum())
+    return {
+        'step': step,
+        'start': int(unix[0]) if len(unix) else None,
+        'end': int(unix[-1]) if len(unix) else None,
+        'rows': rows,
+        'gaps': len(gaps),
+        'missing_rows': missing,
+        'coverage': rows / (rows + missing) if rows else 0.0,
+        'longest_gap': int(lengths.max()) if len(lengths) else 0,
+        'mean_gap': float(lengths.mean()) if len(lengths) else 0.0,
+        'median_gap': float(np.median(lengths)) if len(lengths) else 0.0,
+    }
+
+
+def runs_gaps(runs, step):
+    """
+    Find the gaps between the runs of a series, see find_runs().
+    :param np.ndarray runs: The sorted and disjoint runs.
+    :param int step: The number of seconds between two rows.
+    :return np.ndarray: One (gap_start, gap_end, length) row per gap, as find_gaps().
+    """
+    idx = np.flatnonzero(runs[1:, 0] - runs[:-1, 1] > step)
+    length = (runs[idx + 1, 0] - runs[idx, 1] - 1) // step
+    return np.column_stack([runs[idx, 1] + step, runs[idx, 1] + length * step, length])
+
+
+def gap_report(data, step=None, source_runs=None):
+    """
+    Find and summarize the gaps of the combined series and of each of its sources.
+    The gaps of a source are those of its own rows, before the sources were merged: a timestamp won by another source
+    is not missing from it.
+    :param data: The data (pd.DataFrame or OhlcvColumns), sorted by 'unix'.
+    :param int step: The number of seconds between two rows, inferred from the combined series if None.
+    :param dict source_runs: The runs of the rows of each source, by source index, see find_runs(). Only the combined
+        series is reported if None.
+    :return dict: The gaps and statistics of the combined series under 'combined', and of each source under its index.
+    """
+    unix = np.asarray(data['unix'], dtype=np.int64)
+    step = step or infer_step(unix)
+
+    gaps = find_gaps(unix, step)
+    report = {'combined': {'gaps': gaps, 'stats': gap_stats(unix, gaps, step)}}
+    for source, runs in (source_runs or {}).items():
+        runs = merge_runs(runs, step)
+        if not len(runs):
+            continue
+        gaps = runs_gaps(runs, step)
+        # The rows of a source, counted on the grid of its runs
+        rows = int(((runs[:, 1] - runs[:, 0]) // step + 1).sum())
+        report[int(source)] = {'gaps': gaps, 'stats': gap_stats(np.array([runs[0, 0], runs[-1, 1]]), gaps, step, rows)}
+    return report
+
+
+def fill_to_grid(data, step=None, method='ffill'):
+    """
+    Reindex OHLCV data on a regular grid of timestamps, filling the missing rows.
+    :param data: The data (pd.DataFrame or OhlcvColumns), sorted by 'unix' and aligned on the grid.
+    :param int step: The number of seconds between two rows, inferred if None.
+    :param str method: 'ffill' to repeat the last close on the missing rows, 'interpolate' to interpolate the prices
+        linearly between the rows around each gap. The volume of the missing rows is 0, and their source -1.
+    :return dict: The arrays of the filled data, by column name.
+    """
+    if method not in FILL_METHODS:
+        raise ValueError(f'Unknown fill method {method}, expected one of {FILL_METHODS}.')
+
+    unix = np.asarray(data['unix'], dtype=np.int64)
+    step = step or infer_step(unix)
+    grid = np.arange(unix[0], unix[-1] + 1, step)
+    if not np.array_equal(unix, grid[np.searchsorted(grid, unix)]):
+        raise ValueError(f'The timestamps are not aligned on a grid of {step} seconds.')
+
+    # Index of the last row at or before each timestamp of the grid
+    last = np.searchsorted(unix, grid, side='right') - 1
+    present = unix[last] == grid
+
+    filled = {'unix': grid}
+    for col in data.columns:
+        if col == 'unix':
+            continue
+        values = np.asarray(data[col])
+        if col in PRICE_COLUMNS and method == 'interpolate':
+            filled[col] = np.interp(grid, unix, values)
+        elif col in PRICE_COLUMNS:
+            filled[col] = np.where(present, values[last], np.asarray(data['close'])[last])
+        elif col == 'source':
+            filled[col] = np.where(present, values[last], -1).astype(values.dtype)
+        else:
+            filled[col] = np.where(present, values[last], 0).astype(values.dtype)
+    return filled
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.dataset import OHLCV_COLUMNS, OhlcvColumns
+from src.gaps import find_runs, infer_step
+from src.resample import PYRAMID
+from src.store import PriceStore
+
+# Types the CSV columns are parsed with, instead of letting pandas infer them
+CSV_DTYPES = {'unix': np.float64, 'open': np.float64, 'high': np.float64, 'low': np.float64, 'close': np.float64,
+              'volume': np.float64}
+
+MANIFEST = 'manifest.json'
+
+
+def list_csv_files(csv_dir):
+    """
+    List the CSV files of a source directory, sorted by name.
+    :param str csv_dir: The directory of the source.
+    :return list: The paths of the CSV files.
+    """
+    if not os.path.isdir(csv_dir):
+        raise IsADirectoryError(f'{csv_dir} is not a directory.')
+    return [os.path.join(csv_dir, file) for file in sorted(os.listdir(csv_dir)) if file.endswith('.csv')]
+
+
+def file_fingerprint(path, previous=None):
+    """
+    Get the size, modification time and SHA-1 hash of a file.
+    The hash is reused from the previous fingerprint when the size and modification time did not change.
+    :param str path: The path of the file.
+    :param dict previous: The previous fingerprint of the file, if any.
+    :return dict: The fingerprint, with keys 'size', 'mtime_ns' and 'sha1'.
+    """
+    stat = os.stat(path)
+    if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': previous['sha1']}
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': sha1.hexdigest()}
+
+
+def read_csv_file(path, source=0):
+    """
+    Parse the OHLCV columns of a CSV file, sorted by 'unix'.
+    :param str path: The path of the CSV file.
+    :param int source: The index of the source of the file, stored in the 'source' column.
+    :return dict: The arrays of the file, by column name.
+    """
+    data = pd.read_csv(path, usecols=OHLCV_COLUMNS, dtype=CSV_DTYPES)
+    order = np.argsort(data['unix'].to_numpy(), kind='stable')
+    columns = {col: data[col].to_numpy()[order] for col in OHLCV_COLUMNS}
+    columns['unix'] = columns['unix'].astype(np.int64)
+    columns['source'] = np.full(len(data), source, dtype=np.int16)
+    return columns
+
+
+def merge_columns(columns_list):
+    """
+    Merge sorted runs of OHLCV columns by 'unix', keeping a single row per timestamp.
+    On duplicates, the row of the source with the lowest index wins, then the row of the earliest run.
+    :param list columns_list: The runs, as dictionaries of arrays with a 'unix' and a 'source' column.
+    :return dict: The merged arrays, by column name.
+    """
+    merged = {col: np.concatenate([columns[col] for columns in columns_list]) for col in columns_list[0]}
+    # A stable sort by (unix, source) keeps the runs in order among equal keys
+    order = np.lexsort((merged['source'], merged['unix']))
+    unix = merged['unix'][order]
+    keep = order[np.r_[True, unix[1:] != unix[:-1]]] if len(unix) else order
+    return {col: values[keep] for col, values in merged.items()}
+
+
+def read_csv_files(files, n_jobs=None):
+    """
+    Parse CSV files, in parallel if there are several.
+    :param list files: The (path, source) of each file.
+    :param int n_jobs: The number of worker processes, None for all the CPUs, 1 to parse in this process.
+    :return list: The arrays of each file, in order.
+    """
+    n_jobs = os.cpu_count() if n_jobs is None or n_jobs < 1 else n_jobs
+    if n_jobs == 1 or len(files) < 2:
+        return [read_csv_file(path, source) for path, source in files]
+
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(files))) as pool:
+        return list(pool.map(read_csv_file, *zip(*files)))
+
+
+def load_sources(csv_dir_list, n_jobs=None, source_runs=None):
+    """
+    Parse and merge the CSV files of several sources, in memory.
+    :param list csv_dir_list: The directories of the sources, by decreasing priority.
+    :param int n_jobs: The number of worker processes, None for all the CPUs, 1 to parse in this process.
+    :param dict source_runs: If given, filled with the runs of the rows of each source before the merge, by source
+        index, to find the gaps of each source (see gap_report()).
+    :return OhlcvColumns: The merged columns, with one row per timestamp.
+    """
+    files = [(path, source) for source, csv_dir in enumerate(csv_dir_list) for path in list_csv_files(csv_dir)]
+    columns_list = read_csv_files(files, n_jobs)
+    merged = merge_columns(columns_list)
+    if source_runs is not None:
+        # Index the rows of every file on the sampling of the merged rows
+        step = infer_step(merged['unix']) if len(merged['unix']) > 1 else None
+        for (_, source), columns in zip(files, columns_list):
+            source_runs.setdefault(source, []).extend(find_runs(columns['unix'], step).tolist())
+    return OhlcvColumns(merged)
+
+
+def load_source_runs(store_dir):
+    """
+    Get the runs of the rows of each source ingested into a store, from the runs of its files in the manifest.
+    :param str store_dir: The path of the store directory.
+    :return dict: The runs of each source, by source index, None if the manifest does not index them.
+    """
+    manifest_path = os.path.join(store_dir, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        files = json.load(f)['files'].values()
+    if any('runs' not in file for file in files):
+        return None
+
+    source_runs = {}
+    for file in files:
+        source_runs.setdefault(file['source'], []).extend(file['runs'])
+    return source_runs
+
+
+def ingest(csv_dir_list, store_dir, n_jobs=None, pyramid=PYRAMID, verbose=False):
+    """
+    Ingest the CSV files of several sources into a price store, incrementally.
+    The store keeps a manifest of the ingested files (size, modification time, hash, and the runs of their timestamps
+    for the gaps of each source, see load_source_runs()): only the new files are parsed,
+    and their rows are appended to the store when they all come after its last row, or merged into it otherwise.
+    A changed or removed file, or a different list of sources, rebuilds the store from all the files.
+    :param list csv_dir_list: The directories of the sources, by decreasing priority on duplicate timestamps.
+    :param str store_dir: The path of the store directory, created if it does not exist.
+    :param int n_jobs: The number of worker processes, None for all the CPUs, 1 to parse in this process.
+    :param tuple pyramid: The resolutions of the bars precomputed next to the data, updated from the appended rows, or
+        rebuilt when the store is.
+    :param bool verbose: Whether to print what is ingested.
+    :return PriceStore: The store.
+    """
+    csv_dir_list = [os.path.abspath(csv_dir) for csv_dir in csv_dir_list]
+    os.makedirs(store_dir, exist_ok=True)
+    manifest_path = os.path.join(store_dir, MANIFEST)
+
+    # Load the manifest of the previous ingestion, if the store still matches it
+    manifest = {'sources': csv_dir_list, 'files': {}}
+    if PriceStore.is_store(store_dir) and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+        if previous['sources'] == csv_dir_list:
+            manifest = previous
+
+    # Fingerprint the files, to find the new and the changed ones
+    files = {}
+    for source, csv_dir in enumerate(csv_dir_list):
+        for path in list_csv_files(csv_dir):
+            previous = manifest['files'].get(path)
+            files[path] = dict(previous or {}, **file_fingerprint(path, previous), source=source)
+    if not files:
+        raise ValueError(f'No CSV files in {csv_dir_list}.')
+    new_files = [path for path in files if path not in manifest['files']]
+
+    rebuild = not manifest['files'] or any(
+        path not in files or files[path]['sha1'] != ingested['sha1'] for path, ingested in manifest['files'].items()
+    )
+    if rebuild:
+        new_files = list(files)
+    if verbose:
+        print(f'Ingesting {len(new_files)} new files out of {len(files)}' + (', rebuilding the store.' if rebuild else '.'))
+
+    if new_files:
+        new_columns = read_csv_files([(path, files[path]['source']) for path in new_files], n_jobs)
+        new_rows = merge_columns(new_columns)
+        step = infer_step(new_rows['unix']) if len(new_rows['unix']) > 1 else None
+        for path, columns in zip(new_files, new_columns):
+            files[path]['rows'] = len(columns['unix'])
+            # Index the rows of the file itself on the sampling of the merged rows, for the gaps of its source
+            files[path]['runs'] = find_runs(columns['unix'], step).tolist()
+
+        store = None if rebuild else PriceStore(store_dir)
+        if store is not None and (not len(store) or new_rows['unix'][0] > store.header['unix_end']):
+            # Append the rows, and only aggregate the bars from the last ones of the pyramid
+            store.append(new_rows)
+            store.update_pyramid(pyramid)
+        else:
+            if store is not None:
+                # Compete with the stored rows, the existing ones winning among rows of the same source
+                existing = store.window()
+                new_rows = merge_columns([{col: existing[col] for col in new_rows}, new_rows])
+                del existing, store
+            PriceStore.write(store_dir, OhlcvColumns(new_rows)).build_pyramid(pyramid)
+
+    # Write the manifest last: a killed ingestion parses its files again on the next run
+    manifest = {'sources': csv_dir_list, 'files': files}
+    tmp_manifest = os.path.join(store_dir, f'.{MANIFEST}.tmp')
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_manifest, manifest_path)
+
+    return PriceStore(store_dir)
@@ -0,0 +1,251 @@
+import cProfile
+import functools
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from src.forecast import CachedForecaster, Forecaster, OracleForecaster
+from src.optimizer import Optimizer
+from src.policy import Policy
+from src.portfolio import Portfolio
+from src.position import Position
+from src.results import ResultStore
+
+# Methods timed by the instrumentation, by phase. Slicing is the dataframe windows of the pandas engine (the numpy
+# engine slices views, at no cost), the steps are whole timesteps of the policy, including the other phases.
+PROBES = {
+    'forecast': [(Forecaster, 'forecast'), (OracleForecaster, 'forecast'), (CachedForecaster, 'forecast')],
+    'slicing': [(Optimizer, '_step_window')],
+    'step': [(Policy, 'apply_policy'), (Policy, 'apply_policy_arrays')],
+    'should_buy': [(Policy, '_Policy__should_buy'), (Policy, '_Policy__should_buy_arrays')],
+    'should_sell': [(Position, 'should_sell'), (Position, 'should_sell_arrays')],
+    'buy': [(Portfolio, 'buy')],
+    'sell': [(Portfolio, 'sell'), (Portfolio, 'sell_all')],
+    'record': [(Portfolio, 'record')],
+    'write_results': [(ResultStore, 'flush')],
+}
+
+
+class Instrumentation:
+    """
+    Opt-in timers and counters around the hot paths of a backtest (see PROBES), with optional cProfile and tracemalloc.
+    The probed methods are only wrapped while the instrumentation is active, so the code runs unchanged, without any
+    overhead, the rest of the time. The calls of a phase nested in another call of the same phase are not timed again,
+    and the time of a phase includes the phases it calls (e.g. the steps include the buys and sells).
+    Only the calls of this process are instrumented: run the grid search with n_jobs=1 to include its backtests.
+    :ivar bool profile: Whether to profile every function with cProfile (slows the run down).
+    :ivar bool trace_memory: Whether to trace the memory allocated by every phase with tracemalloc (slows the run down).
+    :ivar dict calls: The number of calls of every phase.
+    :ivar dict times: The total time of every phase, in seconds.
+    :ivar dict allocated: The memory allocated by the calls of every phase and still held when they return, in bytes,
+        summed over the calls, if trace_memory.
+    :ivar dict counters: The custom counters, see count().
+    :ivar float wall_time: The time the instrumentation was active for, in seconds.
+    """
+    def __init__(self, profile=False, trace_memory=False, probes=PROBES):
+        """
+        Initialize the Instrumentation class.
+        :param bool profile: Whether to profile every function with cProfile.
+        :param bool trace_memory: Whether to trace the memory allocated by every phase with tracemalloc.
+        :param dict probes: The (class, method name) pairs to time, by phase.
+        """
+        super().__init__()
+
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.probes = probes
+        self.calls = defaultdict(int)
+        self.times = defaultdict(float)
+        self.allocated = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.wall_time = 0.0
+
+        self._patched = []  # (class, method name, original attribute) of the wrapped methods
+        self._depth = defaultdict(int)  # Calls of every phase in progress
+        self._start = None
+        self._profiler = None
+        self._snapshots = []
+        self._peak = None
+        self._owns_tracemalloc = False
+
+    @property
+    def active(self):
+        return self._start is not None
+
+    def _wrap(self, phase, function):
+        # Time the outermost call of the phase
+        @functools.wraps(function)
+        def probe(*args, **kwargs):
+            if self._depth[phase]:
+                return function(*args, **kwargs)
+            self._depth[phase] += 1
+            memory = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.times[phase] += time.perf_counter() - start
+                self.calls[phase] += 1
+                if self.trace_memory:
+                    self.allocated[phase] += tracemalloc.get_traced_memory()[0] - memory
+                self._depth[phase] -= 1
+        return probe
+
+    def start(self):
+        """
+        Wrap the probed methods, and start the profiler and the memory tracing if enabled.
+        """
+        if self.active:
+            raise RuntimeError('The instrumentation is already active.')
+        for phase, methods in self.probes.items():
+            for cls, name in methods:
+                # Only wrap the methods defined by the class itself, the others are wrapped in their class
+                if name in vars(cls):
+                    original = vars(cls)[name]
+                    self._patched.append((cls, name, original))
+                    setattr(cls, name, self._wrap(phase, original))
+
+        if self.trace_memory:
+            self._owns_tracemalloc = not tracemalloc.is_tracing()
+            if self._owns_tracemalloc:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.snapshot()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def stop(self):
+        """
+        Restore the probed methods, and stop the profiler and the memory tracing.
+        """
+        if not self.active:
+            return
+        self.wall_time += time.perf_counter() - self._start
+        self._start = None
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self.trace_memory:
+            self.snapshot()
+            self._peak = tracemalloc.get_traced_memory()[1]
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+        for cls, name, original in reversed(self._patched):
+            setattr(cls, name, original)
+        self._patched = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def count(self, name, n=1):
+        """
+        Increment a custom counter, e.g. the rows of a chunk of data.
+        :param str name: The name of the counter.
+        :param int n: The increment.
+        """
+        self.counters[name] += n
+
+    @contextmanager
+    def timer(self, phase):
+        """
+        Time a custom block of code as a phase, e.g. the loading of the data.
+        :param str phase: The name of the phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[phase] += time.perf_counter() - start
+            self.calls[phase] += 1
+
+    def snapshot(self):
+        """
+        Take a tracemalloc snapshot, the report showing the top allocations between the first and the last snapshots.
+        Only when tracing the memory.
+        """
+        if self.trace_memory and tracemalloc.is_tracing():
+            self._snapshots.append(tracemalloc.take_snapshot())
+
+    def report(self, top=10):
+        """
+        Summarize the instrumentation.
+        :param int top: The number of allocation sites and profiled functions reported.
+        :return dict: The wall time, the steps per second, the time, calls and allocations of every phase, the custom
+            counters, and the peak memory, top allocation sites and top profiled functions if enabled.
+        """
+        wall_time = self.wall_time + (time.perf_counter() - self._start if self.active else 0.0)
+        steps = self.calls.get('step', 0)
+        phases = {}
+        for phase in self.times:
+            phases[phase] = {
+                'calls': self.calls[phase],
+                'time': self.times[phase],
+                'share': self.times[phase] / wall_time if wall_time else None,
+                'mean_us': 1e6 * self.times[phase] / self.calls[phase] if self.calls[phase] else None,
+            }
+            if self.trace_memory:
+                phases[phase]['allocated_mb'] = self.allocated[phase] / 2 ** 20
+
+        report = {
+            'wall_time': wall_time,
+            'steps': steps,
+            'steps_per_sec': steps / wall_time if steps and wall_time else None,
+            'phases': phases,
+            'counters': dict(self.counters),
+        }
+        if self.trace_memory:
+            report['peak_mb'] = (self._peak if self._peak is not None else tracemalloc.get_traced_memory()[1]) / 2 ** 20
+            if len(self._snapshots) > 1:
+                report['top_allocations'] = [
+                    {'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                     'size_mb': stat.size_diff / 2 ** 20, 'count': stat.count_diff}
+                    for stat in self._snapshots[-1].compare_to(self._snapshots[0], 'lineno')[:top]]
+        if self._profiler is not None:
+            stats = pstats.Stats(self._profiler)
+            functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+            report['profile'] = [
+                {'function': f'{os.path.basename(file)}:{line}({name})', 'calls': n_calls, 'own': own_time,
+                 'cumulative': cumulative}
+                for (file, line, name), (_, n_calls, own_time, cumulative, _) in functions]
+        return report
+
+    def save(self, path, top=10):
+        """
+        Save the report as JSON, and the cProfile statistics next to it (.prof, for pstats or snakeviz) if profiled.
+        :param str path: The path of the JSON file, its directory created if needed.
+        :param int top: The number of allocation sites and profiled functions reported.
+        :return dict: The report.
+        """
+        report = self.report(top)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        if self._profiler is not None:
+            self._profiler.dump_stats(os.path.splitext(path)[0] + '.prof')
+        return report
+
+
+def format_report(report):
+    """
+    Format an instrumentation report as a table, the slowest phases first.
+    :param dict report: The report, see Instrumentation.report().
+    :return str: The formatted report.
+    """
+    lines = [f'Wall time {report["wall_time"]:.3f}s'
+             + (f', {report["steps"]} steps, {report["steps_per_sec"]:.0f} steps/sec' if report['steps_per_sec'] else '')
+             + (f', peak memory {report["peak_mb"]:.1f} MB' if 'peak_mb' in report else '')]
+    for phase, stats in sorted(report['phases'].items(), key=lambda item: item[1]['time'], reverse=True):
+        lines.append(f'{phase:>14}: {stats["time"]:9.3f}s {100 * (stats["share"] or 0):5.1f}% '
+                     f'{stats["calls"]:>9} calls {stats["mean_us"] or 0:9.1f} us/call'
+                     + (f' {stats["allocated_mb"]:8.2f} MB' if 'allocated_mb' in stats else ''))
+    for name, value in report['counters'].items():
+        lines.append(f'{name:>14}: {value}')
+    return '\n'.join(lines)
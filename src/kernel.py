@@ -0,0 +1,116 @@
+import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """
+        Leave the function as is when Numba is not installed: the kernel then runs as plain (slow) Python.
+        """
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+@njit(cache=True, error_model='numpy')
+def policy_kernel(prices, max_prices, init_cash, init_crypto, sell_fee, buy_fees, min_expected_returns, stop_loss):
+    """
+    Run the policy over typed arrays: buy, stop loss and scheduled exit at every timestep, then sell everything.
+    Same arithmetic, in the same order, as Policy.apply_policy_arrays with a constant fee, so the results are the same
+    as the NumPy engine. Compiled with Numba if it is installed.
+    :param np.ndarray prices: The close prices.
+    :param np.ndarray max_prices: The maximum predicted price of the horizon of every timestep (row i predicted at i).
+    :param float init_cash: The initial cash.
+    :param float init_crypto: The initial crypto.
+    :param float sell_fee: The constant selling fee.
+    :param np.ndarray buy_fees: The buying fee at every timestep.
+    :param float min_expected_returns: The minimum expected returns to buy a position.
+    :param float stop_loss: The returns percentage that triggers a sell, NaN without stop loss.
+    :return tuple: The portfolio value at every timestep, the final cash, crypto and number of trades, and the trade
+        log of the closed positions: entry timestep, exit timestep, entry cash, quantity and exit price.
+    """
+    n_steps = len(prices)
+    values = np.empty(max(n_steps - 1, 0))
+    cash = init_cash
+    crypto = init_crypto
+    trades = 0
+
+    # Open positions, in the order they were bought (at most one per timestep)
+    open_step = np.empty(n_steps, dtype=np.int64)
+    open_cash = np.empty(n_steps)
+    open_quantity = np.empty(n_steps)
+    n_open = 0
+
+    # Trade log of the closed positions
+    entry_step = np.empty(n_steps, dtype=np.int64)
+    exit_step = np.empty(n_steps, dtype=np.int64)
+    entry_cash = np.empty(n_steps)
+    quantity = np.empty(n_steps)
+    exit_price = np.empty(n_steps)
+    n_closed = 0
+
+    for i in range(1, n_steps):
+        current_price = prices[i - 1]
+        max_price = max_prices[i]
+
+        # Determine the cash we can spend, before selling
+        new_position_cash = min(cash, max(cash * 0.1, 300.0))
+
+        # Determine which positions to sell, in the order they were bought, and compact the others
+        n_kept = 0
+        for j in range(n_open):
+            position_cash = open_cash[j]
+            position_quantity = open_quantity[j]
+            immediate_returns = position_quantity * current_price * (1 - sell_fee) - position_cash
+            future_max_returns = position_quantity * max_price * (1 - sell_fee) - position_cash
+            if (immediate_returns / position_cash < stop_loss
+                    or not (future_max_returns > immediate_returns and future_max_returns > 0)):
+                crypto -= position_quantity
+                cash += position_quantity * current_price * (1 - sell_fee)
+                trades += 1
+
+                entry_step[n_closed] = open_step[j]
+                exit_step[n_closed] = i - 1
+                entry_cash[n_closed] = position_cash
+                quantity[n_closed] = position_quantity
+                exit_price[n_closed] = current_price
+                n_closed += 1
+            else:
+                open_step[n_kept] = open_step[j]
+                open_cash[n_kept] = position_cash
+                open_quantity[n_kept] = position_quantity
+                n_kept += 1
+        n_open = n_kept
+
+        # Determine if we should buy a position
+        new_quantity = new_position_cash / (current_price * (1 + buy_fees[i - 1]))
+        if new_quantity * max_price * (1 - sell_fee) - new_position_cash > min_expected_returns:
+            cash -= new_position_cash
+            crypto += new_quantity
+            trades += 1
+
+            open_step[n_open] = i - 1
+            open_cash[n_open] = new_position_cash
+            open_quantity[n_open] = new_quantity
+            n_open += 1
+
+        # Record the portfolio value
+        values[i - 1] = cash + crypto * current_price * (1 - sell_fee)
+
+    # Sell all the crypto
+    if n_steps:
+        cash += crypto * prices[-1] * (1 - sell_fee)
+        crypto = 0.0
+        for j in range(n_open):
+            entry_step[n_closed] = open_step[j]
+            exit_step[n_closed] = n_steps - 1
+            entry_cash[n_closed] = open_cash[j]
+            quantity[n_closed] = open_quantity[j]
+            exit_price[n_closed] = prices[-1]
+            n_closed += 1
+
+    return (values, cash, crypto, trades,
+            entry_step[:n_closed], exit_step[:n_closed], entry_cash[:n_closed], quantity[:n_closed], exit_price[:n_closed])
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from src.position import Position
+from src.utils.buffers import GrowableArray
+
+
+class PositionLedger:
+    """
+    A class to record the closed positions of a portfolio, as one typed array per attribute (structure of arrays).
+    A closed position costs a few dozen bytes instead of a Python object, so a million-trade backtest fits in memory.
+    Dates are stored as float64 (exact for unix timestamps), and a missing stop loss or take profit as NaN.
+    """
+    COLUMNS = ['entry_date', 'entry_price', 'entry_cash', 'quantity', 'stop_loss', 'take_profit',
+               'exit_date', 'exit_price', 'exit_cash', 'returns']
+    OPTIONAL_COLUMNS = ('stop_loss', 'take_profit')
+
+    def __init__(self):
+        """
+        Initialize the PositionLedger class.
+        """
+        super().__init__()
+
+        self.columns = {col: GrowableArray(np.float64) for col in self.COLUMNS}
+
+    def record(self, position: Position):
+        """
+        Record a closed position.
+        :param Position position: The closed position.
+        """
+        if not position.closed():
+            raise ValueError('Only closed positions can be recorded.')
+
+        for col, values in self.columns.items():
+            value = getattr(position, col)
+            values.append(np.nan if value is None else value)
+
+    def extend(self, columns):
+        """
+        Record many closed positions at once, e.g. from the trade log of a compiled run.
+        :param dict columns: The attribute arrays of the closed positions, by column name, NaN for the missing ones.
+        """
+        length = len(next(iter(columns.values())))
+        for col, values in self.columns.items():
+            values.extend(columns[col] if col in columns else np.full(length, np.nan))
+
+    def __getitem__(self, col):
+        """
+        Get a zero-copy view of an attribute of all the closed positions.
+        """
+        return self.columns[col].values
+
+    def __len__(self):
+        return len(self.columns['entry_date'])
+
+    def positions(self):
+        """
+        Rebuild Position objects from the ledger, e.g. for plotting.
+        :return generator: The closed positions, in the order they were closed.
+        """
+        for i in range(len(self)):
+            position = Position()
+            for col in self.COLUMNS:
+                value = self.columns[col][i]
+                setattr(position, col, None if col in self.OPTIONAL_COLUMNS and np.isnan(value) else value)
+            yield position
+
+    def to_frame(self):
+        """
+        Get the closed positions as a dataframe, one row per position.
+        """
+        return pd.DataFrame({col: values.values.copy() for col, values in self.columns.items()})
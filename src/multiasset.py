@@ -0,0 +1,274 @@
+import numpy as np
+import pandas as pd
+from src.forecast import OracleForecaster
+from src.ledger import PositionLedger
+from src.utils.buffers import GrowableArray
+from src.utils.utils import progress
+
+
+class AssetPortfolio:
+    """
+    A class to represent a portfolio of several assets sharing its cash.
+    The holdings are one entry per asset, and the open positions of all the assets are the rows of one pool matrix, in
+    the order they were bought, with the index of their asset, so that buying or selling is a single array operation.
+    :ivar list names: The names of the assets, in column order.
+    :ivar float cash: The cash currently available.
+    :ivar float initial_cash: The initial cash deposited.
+    :ivar np.ndarray crypto: The quantity currently held of every asset.
+    :ivar np.ndarray trades: The number of trades of every asset.
+    :ivar PositionLedger ledger: The closed positions, stored column by column.
+    :ivar GrowableArray ledger_assets: The asset index of every closed position.
+    :ivar float portfolio_value: The last recorded portfolio value.
+    :ivar float portfolio_returns: The last recorded portfolio returns.
+    :ivar bool record_history: Whether the portfolio values are recorded at every timestep.
+    """
+    # Columns of the pool of open positions
+    POOL_COLUMNS = ['asset', 'entry_date', 'entry_price', 'entry_cash', 'quantity', 'stop_loss']
+    ASSET, ENTRY_DATE, ENTRY_PRICE, ENTRY_CASH, QUANTITY, STOP_LOSS = range(len(POOL_COLUMNS))
+
+    def __init__(self, cash, names, n_steps=None, record_history=True):
+        """
+        Initialize the AssetPortfolio class.
+        :param float cash: The initial cash amount.
+        :param list names: The names of the assets, in column order.
+        :param int n_steps: The number of timesteps to record, to preallocate the history.
+        :param bool record_history: Whether to record the portfolio values at every timestep.
+        """
+        super().__init__()
+
+        self.names = list(names)
+        self.cash = cash
+        self.initial_cash = cash
+        self.crypto = np.zeros(len(self.names))
+        self.trades = np.zeros(len(self.names), dtype=np.int64)
+        self.ledger = PositionLedger()
+        self.ledger_assets = GrowableArray(np.int64)
+
+        self.portfolio_value = None
+        self.portfolio_returns = None
+        self.record_history = record_history
+        self._value_history = GrowableArray(capacity=n_steps or 16)
+
+        # Pool of the open positions of all the assets, one row per position
+        self.pool = np.empty((0, len(self.POOL_COLUMNS)))
+
+    @property
+    def portfolio_value_list(self) -> np.ndarray:
+        """
+        The portfolio values over time, as a zero-copy view. Only the last value if the history is not recorded.
+        """
+        if self.record_history or self.portfolio_value is None:
+            return self._value_history.values
+        return np.array([self.portfolio_value])
+
+    def open_positions(self, asset=None):
+        """
+        Get the open positions, in the order they were bought.
+        :param str asset: The name of the asset, all the assets if None.
+        :return pd.DataFrame: The open positions, one row per position.
+        """
+        positions = pd.DataFrame(self.pool[:, 1:self.STOP_LOSS], columns=self.POOL_COLUMNS[1:self.STOP_LOSS])
+        positions.insert(0, 'asset', np.array(self.names, dtype=object)[self.pool[:, self.ASSET].astype(np.int64)])
+        return positions if asset is None else positions[positions['asset'] == asset].reset_index(drop=True)
+
+    def closed_positions(self):
+        """
+        Get the closed positions as a dataframe, one row per position, with the name of their asset.
+        """
+        positions = self.ledger.to_frame()
+        positions.insert(0, 'asset', np.array(self.names, dtype=object)[self.ledger_assets.values])
+        return positions
+
+    def buy(self, date, asset, price, cash, fee, stop_loss=np.nan):
+        """
+        Buy all the asset cash can buy.
+        :param int date: The date of the transaction.
+        :param int asset: The index of the asset.
+        :param float price: The price of the asset.
+        :param float cash: The cash to spend.
+        :param float fee: The fee to pay.
+        :param float stop_loss: The defined stop loss, NaN for none.
+        :return float: The quantity bought.
+        """
+        quantity = cash / (price * (1 + fee))
+        self.cash -= cash
+        self.crypto[asset] += quantity
+        self.trades[asset] += 1
+
+        self.pool = np.concatenate([self.pool, [[asset, date, price, cash, quantity, stop_loss]]])
+        return quantity
+
+    def _close(self, close, date, exit_price, exit_cash):
+        # Move the positions from the pool to the ledger
+        closed = self.pool[close]
+        self.ledger_assets.extend(closed[:, self.ASSET].astype(np.int64))
+        self.ledger.extend({
+            **{col: closed[:, j] for j, col in enumerate(self.POOL_COLUMNS) if j != self.ASSET},
+            'exit_date': np.full(len(closed), date, dtype=np.float64),
+            'exit_price': exit_price,
+            'exit_cash': exit_cash,
+            'returns': exit_cash - closed[:, self.ENTRY_CASH],
+        })
+        self.pool = self.pool[~close]
+
+    def sell(self, sell, date, prices, fees):
+        """
+        Sell open positions, in the order they were bought.
+        :param np.ndarray sell: Whether to sell every open position, in the order they were bought.
+        :param int date: The date of the transaction.
+        :param np.ndarray prices: The price of every asset.
+        :param np.ndarray fees: The fee of every asset.
+        """
+        asset = self.pool[sell, self.ASSET].astype(np.int64)
+        quantity = self.pool[sell, self.QUANTITY]
+        exit_price = prices[asset]
+        exit_cash = quantity * exit_price * (1 - fees[asset])
+
+        # Accumulate in order, as the positions are sold one by one
+        for position_cash in exit_cash.tolist():
+            self.cash += position_cash
+        np.subtract.at(self.crypto, asset, quantity)
+        np.add.at(self.trades, asset, 1)
+
+        self._close(sell, date, exit_price, exit_cash)
+
+    def sell_all(self, date, prices, fees):
+        """
+        Sell all the holdings, and close all the positions.
+        :param int date: The date of the transaction.
+        :param np.ndarray prices: The price of every asset.
+        :param np.ndarray fees: The fee of every asset.
+        """
+        for asset in np.flatnonzero(self.crypto):
+            self.cash += self.crypto[asset] * prices[asset] * (1 - fees[asset])
+        self.crypto[:] = 0.0
+
+        asset = self.pool[:, self.ASSET].astype(np.int64)
+        exit_price = prices[asset]
+        self._close(np.ones(len(self.pool), dtype=bool), date, exit_price,
+                    self.pool[:, self.QUANTITY] * exit_price * (1 - fees[asset]))
+
+    def record(self, prices, fees):
+        """
+        Record the portfolio value and returns of the current timestep.
+        :param np.ndarray prices: The price of every asset, NaN for the assets not listed yet.
+        :param np.ndarray fees: The fee of every asset.
+        """
+        held = self.crypto != 0
+        self.portfolio_value = self.cash + (self.crypto[held] * prices[held] * (1 - fees[held])).sum()
+        self.portfolio_returns = self.portfolio_value - self.initial_cash
+        if self.record_history:
+            self._value_history.append(self.portfolio_value)
+
+
+class MultiAssetOptimizer:
+    """
+    A class to apply the policy to several assets in a single pass over their aligned data.
+    The forecasts and the best exits of all the assets are computed once, before the loop. At every timestep, the open
+    positions of all the assets are checked at once, then the buy candidates of all the assets are scored at once,
+    and the best ones are bought with the cash of the portfolio, up to max_buys per timestep.
+    Gives the same results as Optimizer over a single asset, with a constant fee.
+    :ivar AssetPortfolio portfolio: The portfolio to update.
+    :ivar Policy policy: The policy to apply at each timestep, without take profit nor exposure limit.
+    :ivar int predict_len: The number of timesteps we can predict in the future.
+    :ivar np.ndarray fee: The constant transaction fee of every asset.
+    :ivar int max_buys: The maximum number of positions bought per timestep, None for no limit.
+    """
+
+    def __init__(self, portfolio, policy, predict_len, fee=0.001, forecaster=None, max_buys=1, verbose=False):
+        """
+        Initialize the MultiAssetOptimizer class.
+        :param AssetPortfolio portfolio: The portfolio to update.
+        :param Policy policy: The policy to apply at each timestep.
+        :param int predict_len: The number of timesteps we can predict in the future.
+        :param fee: The constant transaction fee, of all the assets or of every asset.
+        :param Forecaster forecaster: The model predicting the prices of the horizon, the true future prices if None.
+        :param int max_buys: The maximum number of positions bought per timestep, None for no limit.
+        :param bool verbose: Whether to show a progress bar.
+        """
+        super().__init__()
+
+        if policy.take_profit is not None or policy.max_exposure is not None:
+            raise ValueError('The multi-asset engine runs the buy, stop loss and scheduled exit policy only.')
+        self.portfolio = portfolio
+        self.policy = policy
+        self.predict_len = predict_len
+        self.fee = np.broadcast_to(np.asarray(fee, dtype=np.float64), len(portfolio.names)).copy()
+        self.forecaster = forecaster if forecaster is not None else OracleForecaster()
+        self.max_buys = max_buys
+        self.verbose = verbose
+
+    def max_prices(self, data):
+        """
+        Get the maximum predicted price of the horizon of every timestep of every asset, row i predicted at i.
+        :param AssetMatrix data: The aligned data of the assets.
+        :return np.ndarray: The (n_steps, n_assets) maximum predicted prices.
+        """
+        steps = np.arange(len(data))
+        max_prices = np.empty((len(data), len(data.names)))
+        for j, name in enumerate(data.names):
+            predictions = self.forecaster.forecast(data.asset(name), self.predict_len)
+            max_prices[:, j] = predictions[steps, self.forecaster.best_exits(predictions) - steps]
+        return max_prices
+
+    def iterate_policy(self, data):
+        """
+        Apply the policy to every asset at each time step of the data, then sell everything.
+        :param AssetMatrix data: The aligned data of the assets, in the order of the names of the portfolio.
+        """
+        if data.names != self.portfolio.names:
+            raise ValueError(f'The data has the assets {data.names}, the portfolio {self.portfolio.names}.')
+
+        dates = np.asarray(data['unix'])
+        prices = np.asarray(data['close'], dtype=np.float64)
+        max_prices = self.max_prices(data)
+        portfolio = self.portfolio
+        one_minus_fee = 1 - self.fee
+        one_plus_fee = 1 + self.fee
+        min_expected_returns = self.policy.min_expected_returns
+        stop_loss = np.nan if self.policy.stop_loss is None else float(self.policy.stop_loss)
+
+        for i in progress(range(1, len(dates)), self.verbose):
+            current_prices = prices[i - 1]
+            max_price = max_prices[i]
+
+            # Determine the cash we can spend, before selling
+            budget = portfolio.cash
+            position_size = max(budget * 0.1, 300)
+
+            # Determine which positions to sell, in the order they were bought
+            if len(portfolio.pool):
+                pool = portfolio.pool
+                asset = pool[:, AssetPortfolio.ASSET].astype(np.int64)
+                entry_cash, quantity = pool[:, AssetPortfolio.ENTRY_CASH], pool[:, AssetPortfolio.QUANTITY]
+                immediate_returns = quantity * current_prices[asset] * one_minus_fee[asset] - entry_cash
+                future_max_returns = quantity * max_price[asset] * one_minus_fee[asset] - entry_cash
+                stop = immediate_returns / entry_cash < stop_loss
+                keep = ~stop & (future_max_returns > immediate_returns) & (future_max_returns > 0)
+                if not keep.all():
+                    portfolio.sell(~keep, dates[i - 1], current_prices, self.fee)
+
+            # Score the buy candidates of all the assets at once, and buy the best ones
+            new_position_cash = min(budget, position_size)
+            new_quantity = new_position_cash / (current_prices * one_plus_fee)
+            expected_returns = new_quantity * max_price * one_minus_fee - new_position_cash
+            candidates = np.flatnonzero(expected_returns > min_expected_returns)
+            if len(candidates):
+                candidates = candidates[np.argsort(-expected_returns[candidates], kind='stable')][:self.max_buys]
+                for n, j in enumerate(candidates):
+                    if n:
+                        # The next positions are bought with the cash left
+                        new_position_cash = min(budget, position_size)
+                        quantity = new_position_cash / (current_prices[j] * one_plus_fee[j])
+                        if new_position_cash <= 0 or not (quantity * max_price[j] * one_minus_fee[j] - new_position_cash
+                                                          > min_expected_returns):
+                            break
+                    portfolio.buy(dates[i - 1], j, current_prices[j], new_position_cash, self.fee[j], stop_loss)
+                    budget -= new_position_cash
+
+            # Record the portfolio value
+            portfolio.record(current_prices, self.fee)
+
+        # Sell all the holdings
+        if len(dates):
+            portfolio.sell_all(dates[-1], prices[-1], self.fee)
@@ -1,16 +1,87 @@
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
+from src.dataset import OHLCV_COLUMNS, OhlcvColumns
+from src.exits import ExitScheduler
+from src.fees import FeeSchedule
+from src.fills import FillEngine
+from src.forecast import Forecaster, OracleForecaster
+from src.kernel import policy_kernel
 from src.portfolio import Portfolio
 from src.policy import Policy
+from src.utils.buffers import RingBuffer
+from src.utils.utils import progress
 
 
 class Optimizer:
-    def __init__(self, portfolio: Portfolio, policy: Policy, predict_len: int, fee=0.03, verbose=False):
+    def __init__(self, portfolio: Portfolio, policy: Policy, predict_len: int, fee=0.03, verbose=False,
+                 forecaster: Forecaster = None, history_len=1000, intrabar=False, slippage=0.0):
+        """
+        Initialize the Optimizer class.
+        :param Portfolio portfolio: The portfolio to update.
+        :param Policy policy: The policy to apply at each timestep.
+        :param int predict_len: The number of timesteps we can predict in the future.
+        :param fee: The transaction fee, as a float or a FeeSchedule (time-varying, selling/buying fees).
+        :param bool verbose: Whether to print the state of the portfolio at each timestep.
+        :param Forecaster forecaster: The model predicting the prices of the horizon, the true future prices if None.
+        :param int history_len: The number of recent bars kept by on_bar() for the forecaster.
+        :param bool intrabar: Whether to fill the stop loss and take profit orders inside the bars, from their high and low
+            prices (see FillEngine), instead of at their close price.
+        :param float slippage: The fraction of the price lost when a stop loss fills inside a bar.
+        """
         self.portfolio : Portfolio = portfolio
         self.policy = policy
         self.fee = fee
+        self.fee_schedule = fee if isinstance(fee, FeeSchedule) else FeeSchedule(fee)
         self.predict_len = predict_len
         self.verbose = verbose
+        self.forecaster = forecaster if forecaster is not None else OracleForecaster()
+        self.history_len = history_len
+        self.intrabar = intrabar
+        self.slippage = slippage
+        self._bars = None  # Recent bars of on_bar(), by column
+        self._fills = None  # Orders of the open positions in on_bar(), if intrabar
+
+    def _best_exits(self, predictions, fees):
+        """
+        Index the maximum predicted price of the forecast horizon of every timestep.
+        Only valid with a constant selling fee, where the best exit is the maximum price. Returns None otherwise.
+        """
+        if not fees.is_constant():
+            return None
+        return self.forecaster.best_exits(predictions)
+
+    def _step_window(self, data, predictions, fees, i):
+        """
+        Slice the past and predicted prices and fees of timestep i, for iterate_policy.
+        :return tuple: The past prices, the predicted prices, the past fees and the predicted fees.
+        """
+        # Get the past close price
+        past_prices = data.iloc[:i]
+
+        # Get the predicted close price
+        predict_prices = data.iloc[i:i + self.predict_len if i + self.predict_len < len(data) else len(data)]
+        predict_prices = predict_prices.assign(close=predictions[i, :len(predict_prices)])
+
+        # # Downsample the predicted prices
+        # if len(predict_prices) > 60:
+        #     sampled_predict_prices = predict_prices.iloc[::int(len(predict_prices)/60)]
+
+        #     if len(sampled_predict_prices) > 0:
+        #         predict_prices = sampled_predict_prices
+
+        # Get the past fees
+        past_fees = fees.window(0, len(past_prices))
+
+        # Get the predicted fees
+        predict_fees = fees.window(i, i + len(predict_prices))
+
+        return past_prices, predict_prices, past_fees, predict_fees
+
+    def _fill_engine(self):
+        """
+        Create the engine filling the orders of a run inside the bars, None to fill them at the close price.
+        """
+        return FillEngine(self.slippage) if self.intrabar else None
 
     def iterate_policy(self, data):
         """
@@ -27,7 +98,22 @@ class Optimizer:
         if self.verbose:
             print(f'Estimating returns over {len(data)} steps of data')
 
-        for i in tqdm(range(1, len(data))) if self.verbose else range(1, len(data)):
+        # Preallocate the history of the portfolio
+        self.portfolio.reserve(len(data) - 1)
+
+        # Resolve the fees once over the data
+        fees = self.fee_schedule.bind(data['unix'].to_numpy())
+
+        # Predict the horizon of every timestep ahead of time
+        predictions = self.forecaster.forecast(data, self.predict_len)
+
+        # With constant fees, index the best exit of every forecast horizon once
+        best_exits = self._best_exits(predictions, fees)
+
+        # Fill the orders inside the bars, if enabled
+        fills = self._fill_engine()
+
+        for i in progress(range(1, len(data)), self.verbose):
             if self.verbose:
                 print(f'Timestep {i} Price: {data.iloc[i]["close"]}')
                 print(f'Start: Cash: {self.portfolio.cash} | '
@@ -36,30 +122,16 @@ class Optimizer:
                     f'Portfolio returns: {self.portfolio.portfolio_returns_list[-1] if len(self.portfolio.portfolio_returns_list)>0 else 0} | '
                     f'Trades: {self.portfolio.trades}')
             
-            # Get the past close price
-            past_prices = data.iloc[:i]
-            
-            # Get the predicted close price
-            predict_prices = data.iloc[i:i + self.predict_len if i + self.predict_len < len(data) else len(data)]
-            
-            # # Downsample the predicted prices
-            # if len(predict_prices) > 60:
-            #     sampled_predict_prices = predict_prices.iloc[::int(len(predict_prices)/60)]
-            
-            #     if len(sampled_predict_prices) > 0:
-            #         predict_prices = sampled_predict_prices
+            # Get the past and predicted prices and fees
+            past_prices, predict_prices, past_fees, predict_fees = self._step_window(data, predictions, fees, i)
 
-            # Get the past fees
-            past_fees = [self.fee for _ in range(len(past_prices))]
-            
-            # Get the predicted fees
-            predict_fees = [self.fee for _ in range(len(predict_prices))]
-            
             self.policy.apply_policy(portfolio=self.portfolio,
                                      past_prices=past_prices,
                                      predict_prices=predict_prices,
                                      past_fees=past_fees,
                                      predict_fees=predict_fees,
+                                     best_exit=best_exits[i] - i if best_exits is not None else None,
+                                     fills=fills,
                                      )
 
             if self.verbose:
@@ -69,4 +141,171 @@ class Optimizer:
                     f'Portfolio returns: {self.portfolio.portfolio_returns_list[-1]} | '
                     f'Trades: {self.portfolio.trades}\n')
         
-        self.portfolio.sell_all(data.iloc[-1]['unix'], data.iloc[-1]['close'], self.fee)
\ No newline at end of file
+        self.portfolio.sell_all(data.iloc[-1]['unix'], data.iloc[-1]['close'], fees[-1])
+
+    def iterate_policy_numpy(self, data):
+        """
+        Vectorized alternative to iterate_policy.
+        Converts the OHLCV columns to contiguous NumPy arrays once, then applies the same policy over array windows.
+        Gives the same portfolio values, returns and trades as iterate_policy.
+
+        Args:
+            data (pd.DataFrame | OhlcvColumns): Data with columns 'unix', 'open', 'high', 'low', 'close', 'volume'
+        """
+        # Convert the columns once (no copy if they already are contiguous arrays)
+        dates = np.ascontiguousarray(data['unix'])
+        prices = np.ascontiguousarray(data['close'], dtype=np.float64)
+        fees = self.fee_schedule.bind(dates)
+        predictions = self.forecaster.forecast(data, self.predict_len)
+        best_exits = self._best_exits(predictions, fees)
+        n_steps = len(prices)
+        self.portfolio.reserve(n_steps - 1)
+
+        # Fill the orders inside the bars, if enabled
+        fills = self._fill_engine()
+        if fills is not None:
+            opens = np.ascontiguousarray(data['open'], dtype=np.float64)
+            highs = np.ascontiguousarray(data['high'], dtype=np.float64)
+            lows = np.ascontiguousarray(data['low'], dtype=np.float64)
+
+        # Index the exits of the positions, when the predictions do not change from one timestep to the next.
+        # A take profit filled at the close price may sell a position at any time, so it needs the full scan.
+        exits = None
+        if (best_exits is not None and self.forecaster.consistent and not self.portfolio.open_positions
+                and (fills is not None or self.policy.take_profit is None)):
+            exits = ExitScheduler(fees[0])
+
+        if self.verbose:
+            print(f'Estimating returns over {n_steps} steps of data')
+
+        for i in progress(range(1, n_steps), self.verbose):
+            # Get the end of the prediction window
+            predict_end = i + self.predict_len if i + self.predict_len < n_steps else n_steps
+
+            self.policy.apply_policy_arrays(portfolio=self.portfolio,
+                                            current_date=dates[i - 1],
+                                            current_price=prices[i - 1],
+                                            predict_dates=dates[i:predict_end],
+                                            predict_prices=predictions[i, :predict_end - i],
+                                            past_fees=fees.window(0, i),
+                                            predict_fees=fees.window(i, predict_end),
+                                            best_exit=best_exits[i] - i if best_exits is not None else None,
+                                            exits=exits,
+                                            fills=fills,
+                                            bar=(opens[i - 1], highs[i - 1], lows[i - 1]) if fills is not None else None,
+                                            )
+
+        self.portfolio.sell_all(dates[-1], prices[-1], fees[-1])
+
+    def iterate_policy_kernel(self, data):
+        """
+        Compiled alternative to iterate_policy_numpy, running the whole loop in policy_kernel (with Numba if it is
+        installed, as plain Python otherwise). Gives the same portfolio values, returns, trades and closed positions.
+        Only covers the buy, stop loss and scheduled exit policy, with a constant selling fee and an empty portfolio;
+        the cash and crypto after each trade are not recorded.
+
+        Args:
+            data (pd.DataFrame | OhlcvColumns): Data with columns 'unix', 'open', 'high', 'low', 'close', 'volume'
+        """
+        if self.policy.take_profit is not None or self.policy.max_exposure is not None or self.intrabar:
+            raise ValueError('The kernel only runs the buy, stop loss and scheduled exit policy, use iterate_policy_numpy.')
+        if self.portfolio.open_positions:
+            raise ValueError('The kernel starts from a portfolio without open positions.')
+
+        dates = np.ascontiguousarray(data['unix'])
+        prices = np.ascontiguousarray(data['close'], dtype=np.float64)
+        fees = self.fee_schedule.bind(dates)
+        predictions = self.forecaster.forecast(data, self.predict_len)
+        best_exits = self._best_exits(predictions, fees)
+        if best_exits is None:
+            raise ValueError('The kernel needs a constant selling fee, use iterate_policy_numpy.')
+
+        # Get the maximum predicted price of every horizon at once
+        steps = np.arange(len(prices))
+        max_prices = np.ascontiguousarray(predictions[steps, best_exits - steps])
+
+        stop_loss = np.nan if self.policy.stop_loss is None else float(self.policy.stop_loss)
+        (values, cash, crypto, trades,
+         entry_step, exit_step, entry_cash, quantity, exit_price) = policy_kernel(
+            prices, max_prices, float(self.portfolio.cash), float(self.portfolio.crypto), float(fees[0]),
+            np.ascontiguousarray(fees.buy_fee, dtype=np.float64), float(self.policy.min_expected_returns), stop_loss)
+
+        # Replay the results into the portfolio
+        self.portfolio.record_values(values)
+        self.portfolio.cash = cash
+        self.portfolio.crypto = crypto
+        self.portfolio.trades += trades
+        exit_cash = quantity * exit_price * (1 - fees[0])
+        self.portfolio.ledger.extend({
+            'entry_date': dates[entry_step],
+            'entry_price': prices[entry_step],
+            'entry_cash': entry_cash,
+            'quantity': quantity,
+            'stop_loss': np.full(len(entry_step), stop_loss),
+            'exit_date': dates[exit_step],
+            'exit_price': exit_price,
+            'exit_cash': exit_cash,
+            'returns': exit_cash - entry_cash,
+        })
+
+    def on_bar(self, bar, predict_prices=None, predict_dates=None):
+        """
+        Apply the policy to a new bar, incrementally.
+        Only the last history_len bars are kept, in ring buffers, so a bar is processed in a time bounded by the
+        prediction length and the open positions, whatever the number of bars already processed.
+        Gives the same results as iterate_policy_numpy when fed the bars and prediction rows of the same data.
+        Use a Portfolio with record_history=False to also keep its memory bounded.
+
+        Args:
+            bar (dict): The new bar, with keys 'unix' and 'close', and optionally 'open', 'high', 'low', 'volume' ('open',
+                'high' and 'low' are required to fill the orders inside the bars)
+            predict_prices (np.ndarray): The predicted close prices of the next timesteps, NaN past the known data.
+                Predicted by the forecaster from the recent bars if None.
+            predict_dates (np.ndarray): The dates of the predicted prices, extrapolated from the last bars if None.
+        """
+        # Keep the recent bars
+        if self._bars is None:
+            self._bars = {col: RingBuffer(self.history_len, dtype=np.int64 if col == 'unix' else np.float64)
+                          for col in OHLCV_COLUMNS if col in bar}
+            self._fills = self._fill_engine()
+        for col, values in self._bars.items():
+            values.append(bar[col])
+
+        # Predict the next timesteps from the recent bars
+        if predict_prices is None:
+            history = OhlcvColumns({col: values.values for col, values in self._bars.items()})
+            predict_prices = self.forecaster.predict_batch(history, np.array([len(history)]), self.predict_len)[0]
+        predict_prices = predict_prices[:np.count_nonzero(~np.isnan(predict_prices))]
+        if predict_dates is None:
+            if len(self._bars['unix']) < 2:
+                # Nothing to extrapolate the dates from yet
+                return
+            interval = self._bars['unix'][-1] - self._bars['unix'][-2]
+            predict_dates = bar['unix'] + interval * np.arange(1, len(predict_prices) + 1)
+        if not len(predict_prices):
+            return
+
+        # Resolve the fees of the bar and of the predicted timesteps
+        fees = self.fee_schedule.bind(np.concatenate([[bar['unix']], predict_dates[:len(predict_prices)]]))
+
+        self.policy.apply_policy_arrays(portfolio=self.portfolio,
+                                        current_date=bar['unix'],
+                                        current_price=bar['close'],
+                                        predict_dates=predict_dates[:len(predict_prices)],
+                                        predict_prices=predict_prices,
+                                        past_fees=fees.window(0, 1),
+                                        predict_fees=fees.window(1, len(fees)),
+                                        best_exit=int(np.argmax(predict_prices)) if fees.window(1, len(fees)).is_constant() else None,
+                                        fills=self._fills,
+                                        bar=(bar['open'], bar['high'], bar['low']) if self._fills is not None else None,
+                                        )
+
+    def close(self, bar):
+        """
+        Sell everything at a last bar, ending an incremental run of on_bar().
+
+        Args:
+            bar (dict): The last bar, with keys 'unix' and 'close'
+        """
+        fees = self.fee_schedule.bind(np.array([bar['unix']]))
+        self.portfolio.sell_all(bar['unix'], bar['close'], fees[-1])
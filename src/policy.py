@@ -1,53 +1,89 @@
+import numpy as np
+from src.fees import sell_fees, buy_fees
 from src.utils.utils import cash2qty, compute_returns
 from src.portfolio import Portfolio
 
 class Policy:
-    def __init__(self, min_expected_returns, stop_loss=-2.0):
+    def __init__(self, min_expected_returns, stop_loss=-2.0, take_profit=None, max_exposure=None):
         """
         Initialize the Policy class.
         :param float min_expected_returns: Threshold stating the minimum expected returns required to buy a position.
         :param float stop_loss: The minimum loss percentage that triggers a sell (a good value is: abs(stop_loss) > 2*fee).
+        :param float take_profit: The returns percentage that triggers a sell, None to only sell at the best exit.
+        :param float max_exposure: The maximum fraction of the portfolio value held in the asset, None for no limit.
         """
         super().__init__()
 
         self.min_expected_returns = min_expected_returns
         self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.max_exposure = max_exposure
 
+    def _position_cash(self, portfolio, current_price):
+        """
+        Get the cash to spend on a new position, within the exposure limit.
+        :return float: The cash to spend, None if the exposure limit is reached.
+        """
+        cash = min(portfolio.cash, max(portfolio.cash * 0.1, 300))
+        if self.max_exposure is not None:
+            exposure = portfolio.crypto * current_price
+            cash = min(cash, self.max_exposure * (portfolio.cash + exposure) - exposure)
+            if cash <= 0:
+                return None
+        return cash
 
-    def __should_buy(self, entry_cash, past_prices, predict_prices, past_fees, predict_fees):
+    def _fill_orders(self, portfolio, fills, bar, current_date, current_fee):
+        """
+        Sell the positions whose stop loss or take profit was triggered inside the current bar, at their fill price.
+        :return list: The positions sold.
+        """
+        filled = fills.fill(*bar, current_fee)
+        for position, fill_price in filled:
+            portfolio.sell(position, current_date, fill_price, current_fee)
+        return [position for position, _ in filled]
+
+
+    def __should_buy(self, entry_cash, past_prices, predict_prices, past_fees, predict_fees, best_exit=None):
         """
         Private method to determine if we should enter a position, based on the predicted prices.
+        If the index of the best exit in predict_prices is known (constant fees), only its returns are computed.
         """
 
         # Get the current close price
         current_price = past_prices.iloc[-1]['close']
 
-        # Get the current fee
-        current_fee = past_fees[-1]
+        # Get the current buying fee
+        current_fee = buy_fees(past_fees)[-1]
 
-        # Create a list to store the predicted returns
-        predicted_returns_list = []
+        if best_exit is not None:
+            # Compute the potential returns at the best exit only
+            quantity_held = cash2qty(entry_cash, current_price, current_fee)
+            max_returns = compute_returns(entry_cash, quantity_held, predict_prices.iloc[best_exit]['close'], predict_fees[best_exit])
+            max_returns_index = best_exit
+        else:
+            # Create a list to store the predicted returns
+            predicted_returns_list = []
 
-        # Iterate over the future prices
-        for i in range(len(predict_prices)):
-            # Get the future close price
-            future_price = predict_prices.iloc[i]['close']
+            # Iterate over the future prices
+            for i in range(len(predict_prices)):
+                # Get the future close price
+                future_price = predict_prices.iloc[i]['close']
 
-            # Get the future fee
-            future_fee = predict_fees[i]
+                # Get the future fee
+                future_fee = predict_fees[i]
 
-            # Compute the potential returns
-            quantity_held = cash2qty(entry_cash, current_price, current_fee)
+                # Compute the potential returns
+                quantity_held = cash2qty(entry_cash, current_price, current_fee)
 
-            returns = compute_returns(entry_cash, quantity_held, future_price, future_fee)
+                returns = compute_returns(entry_cash, quantity_held, future_price, future_fee)
 
-            predicted_returns_list.append(returns)
+                predicted_returns_list.append(returns)
 
-        # Get the maximum returns
-        max_returns = max(predicted_returns_list)
+            # Get the maximum returns
+            max_returns = max(predicted_returns_list)
 
-        # Get the index of the maximum returns
-        max_returns_index = predicted_returns_list.index(max_returns)
+            # Get the index of the maximum returns
+            max_returns_index = predicted_returns_list.index(max_returns)
 
         # Get the date of the maximum returns
         max_returns_date = predict_prices.iloc[max_returns_index]['unix']
@@ -61,9 +97,39 @@ class Policy:
             return False, None, None, None
 
 
-    def apply_policy(self, portfolio, past_prices, predict_prices, past_fees, predict_fees):
+    def __should_buy_arrays(self, entry_cash, current_price, predict_dates, predict_prices, past_fees, predict_fees, best_exit=None):
+        """
+        Private method to determine if we should enter a position, based on arrays of predicted prices.
+        Same decision as __should_buy, with the predicted returns computed in a single vectorized operation.
+        """
+        # Get the current buying fee
+        current_fee = buy_fees(past_fees)[-1]
+
+        quantity_held = cash2qty(entry_cash, current_price, current_fee)
+        if best_exit is not None:
+            # Compute the potential returns at the best exit only
+            max_returns_index = best_exit
+            max_returns = compute_returns(entry_cash, quantity_held, predict_prices[best_exit], predict_fees[best_exit])
+        else:
+            # Compute the potential returns over the whole prediction window
+            predicted_returns = compute_returns(entry_cash, quantity_held, predict_prices, sell_fees(predict_fees))
+
+            # Get the index of the maximum returns (first occurrence, as list.index)
+            max_returns_index = int(np.argmax(predicted_returns))
+            max_returns = predicted_returns[max_returns_index]
+
+        if max_returns > self.min_expected_returns:
+            return True, predict_dates[max_returns_index], predict_prices[max_returns_index], max_returns
+        else:
+            return False, None, None, None
+
+
+    def apply_policy(self, portfolio, past_prices, predict_prices, past_fees, predict_fees, best_exit=None, fills=None):
         """
         Apply the policy to update the portfolio.
+        :param int best_exit: The index of the maximum predicted price, if known (constant fees). Makes the horizon queries O(1).
+        :param FillEngine fills: The stop loss and take profit orders of the open positions, to fill them inside the
+            current bar from its high and low prices. They are checked at the close price if None.
         """
         # Get the current date
         current_date = past_prices.iloc[-1]['unix']
@@ -71,46 +137,140 @@ class Policy:
         # Get the current close price
         current_price = past_prices.iloc[-1]['close']
 
-        # Get the current fee
+        # Get the current selling and buying fees
         current_fee = past_fees[-1]
+        current_buy_fee = buy_fees(past_fees)[-1]
 
         # Determine the cash we can spend
-        new_position_cash = min(portfolio.cash, max(portfolio.cash * 0.1, 300))  # portfolio.cash
+        new_position_cash = self._position_cash(portfolio, current_price)
+
+        # Fill the orders triggered inside the current bar
+        if fills is not None:
+            bar = past_prices.iloc[-1]
+            self._fill_orders(portfolio, fills, (bar['open'], bar['high'], bar['low']), current_date, current_fee)
 
         # Determine if we should sell any position
-        for position in [pos for pos in portfolio.position_list if pos.active()]:
+        for position in portfolio.active_positions():
             sell_bool, new_scheduled_exit_date, new_scheduled_exit_price, new_scheduled_exit_returns = position.should_sell(
-                past_prices, predict_prices, past_fees, predict_fees)
+                past_prices, predict_prices, past_fees, predict_fees, best_exit)
             if sell_bool:
                 # Sell
                 portfolio.sell(position, current_date, current_price, current_fee)
+                if fills is not None:
+                    fills.remove(position)
             else:
                 # Update the scheduled exit
                 position.update_scheduled_exit(new_scheduled_exit_date, new_scheduled_exit_price,
                                                 new_scheduled_exit_returns)
 
         # Determine if we should buy a position
-        buy_bool, scheduled_exit_date, scheduled_exit_price, scheduled_exit_returns = self.__should_buy(
-            new_position_cash, past_prices, predict_prices, past_fees, predict_fees)
+        buy_bool = False
+        if new_position_cash is not None:
+            buy_bool, scheduled_exit_date, scheduled_exit_price, scheduled_exit_returns = self.__should_buy(
+                new_position_cash, past_prices, predict_prices, past_fees, predict_fees, best_exit)
         if buy_bool:
             # Buy
             portfolio.buy(
                 date=current_date,
                 price=current_price,
                 cash=new_position_cash,
-                fee=current_fee,
+                fee=current_buy_fee,
 
                 # Schedule the exit
                 scheduled_exit_date=scheduled_exit_date,
                 scheduled_exit_price=scheduled_exit_price,
                 scheduled_exit_returns=scheduled_exit_returns,
 
-                # Add a stop loss
-                stop_loss=self.stop_loss
+                # Add a stop loss and a take profit
+                stop_loss=self.stop_loss,
+                take_profit=self.take_profit
             )
+            if fills is not None:
+                fills.add(next(reversed(portfolio.open_positions)))
+
+        # Record the portfolio value and returns
+        portfolio.record(current_price, current_fee)
+
+
+    def apply_policy_arrays(self, portfolio, current_date, current_price, predict_dates, predict_prices, past_fees, predict_fees, best_exit=None, exits=None, fills=None, bar=None):
+        """
+        Apply the policy to update the portfolio, from NumPy arrays instead of dataframes.
+        :param Portfolio portfolio: The portfolio to update.
+        :param current_date: The date of the last known price.
+        :param float current_price: The last known close price.
+        :param np.ndarray predict_dates: The dates of the predicted prices.
+        :param np.ndarray predict_prices: The predicted close prices.
+        :param past_fees: The past fees, as an array or a FeeSchedule.
+        :param predict_fees: The predicted fees, as an array or a FeeSchedule.
+        :param int best_exit: The index of the maximum predicted price, if known (constant fees). Makes the horizon queries O(1).
+        :param ExitScheduler exits: The index of the exits of the open positions, if the predictions are consistent. Only
+            the positions whose scheduled exit or stop loss is due are then checked.
+        :param FillEngine fills: The stop loss and take profit orders of the open positions, to fill them inside the
+            current bar. They are checked at the close price if None.
+        :param tuple bar: The open, high and low prices of the current bar, when fills is given.
+        """
+        # Get the current selling and buying fees
+        current_fee = past_fees[-1]
+        current_buy_fee = buy_fees(past_fees)[-1]
 
-        # Update the portfolio value
-        portfolio.portfolio_value_list.append(portfolio.get_portfolio_value(current_price, current_fee))
+        # Determine the cash we can spend
+        new_position_cash = self._position_cash(portfolio, current_price)
+
+        # Fill the orders triggered inside the current bar
+        use_exits = exits is not None and best_exit is not None
+        if fills is not None:
+            for position in self._fill_orders(portfolio, fills, bar, current_date, current_fee):
+                if use_exits:
+                    exits.remove(position)
+
+        # Get the positions that may be sold
+        positions = exits.due(current_date, current_price) if use_exits else portfolio.active_positions()
+
+        # Determine if we should sell any position
+        for position in positions:
+            sell_bool, new_scheduled_exit_date, new_scheduled_exit_price, new_scheduled_exit_returns = position.should_sell_arrays(
+                current_price, predict_dates, predict_prices, past_fees, predict_fees, best_exit)
+            if sell_bool:
+                # Sell
+                portfolio.sell(position, current_date, current_price, current_fee)
+                if use_exits:
+                    exits.remove(position)
+                if fills is not None:
+                    fills.remove(position)
+            else:
+                # Update the scheduled exit
+                position.update_scheduled_exit(new_scheduled_exit_date, new_scheduled_exit_price,
+                                                new_scheduled_exit_returns)
+                if use_exits:
+                    exits.reschedule(position)
+
+        # Determine if we should buy a position
+        buy_bool = False
+        if new_position_cash is not None:
+            buy_bool, scheduled_exit_date, scheduled_exit_price, scheduled_exit_returns = self.__should_buy_arrays(
+                new_position_cash, current_price, predict_dates, predict_prices, past_fees, predict_fees, best_exit)
+        if buy_bool:
+            # Buy
+            portfolio.buy(
+                date=current_date,
+                price=current_price,
+                cash=new_position_cash,
+                fee=current_buy_fee,
+
+                # Schedule the exit
+                scheduled_exit_date=scheduled_exit_date,
+                scheduled_exit_price=scheduled_exit_price,
+                scheduled_exit_returns=scheduled_exit_returns,
+
+                # Add a stop loss and a take profit
+                stop_loss=self.stop_loss,
+                take_profit=self.take_profit
+            )
+            new_position = next(reversed(portfolio.open_positions))
+            if use_exits:
+                exits.add(new_position)
+            if fills is not None:
+                fills.add(new_position)
 
-        # Update the portfolio returns
-        portfolio.portfolio_returns_list.append(portfolio.get_portfolio_returns(current_price, current_fee))
\ No newline at end of file
+        # Record the portfolio value and returns
+        portfolio.record(current_price, current_fee)
@@ -1,5 +1,8 @@
-from typing import List
+from typing import Dict, List
+import numpy as np
+from src.ledger import PositionLedger
 from src.position import Position
+from src.utils.buffers import GrowableArray
 from src.utils.utils import cash2qty, compute_returns
 
 
@@ -8,47 +11,130 @@ class Portfolio:
     A class to represent a trading portfolio of positions.
     :ivar float cash: The cash currently available.
     :ivar float initial_cash: The initial cash deposited.
-    :ivar List[float] cash_list: The list of cash values over time.
+    :ivar GrowableArray cash_list: The cash values over time (after each trade).
     :ivar float crypto: The crypto currently held.
-    :ivar List[float] crypto_list: The list of crypto values over time.
-    :ivar List[Position] position_list: The list of positions held.
+    :ivar GrowableArray crypto_list: The crypto values over time (after each trade).
+    :ivar Dict[Position, None] open_positions: The positions currently held, in the order they were bought.
+    :ivar PositionLedger ledger: The closed positions, stored column by column.
     :ivar int trades: The number of trades.
-    :ivar List[float] portfolio_value_list: The list of portfolio values over time.
-    :ivar List[float] portfolio_returns_list: The list of portfolio returns over time.
+    :ivar float portfolio_value: The last recorded portfolio value.
+    :ivar float portfolio_returns: The last recorded portfolio returns.
+    :ivar bool record_history: Whether the portfolio values and returns are recorded at every timestep.
     """
     
-    def __init__(self, cash, crypto):
+    def __init__(self, cash, crypto, n_steps=None, record_history=True):
         """
         Initialize the Portfolio class.
         :param float cash: The initial cash amount.
         :param float crypto: The initial crypto amount.
+        :param int n_steps: The number of timesteps to record, to preallocate the history (see reserve()).
+        :param bool record_history: Whether to record the portfolio values and returns at every timestep.
+            If False, only the last ones are kept, e.g. for grid searches that never read the curves.
         """
         super().__init__()
         
         self.cash = cash  # Cash currently available
         self.initial_cash = cash  # Initial cash deposited
-        self.cash_list = [cash]  # List of cash values over time
+        self.cash_list = GrowableArray()  # Cash values over time
+        self.cash_list.append(cash)
         
         self.crypto = crypto  # Crypto currently held
-        self.crypto_list = [crypto]  # List of crypto values over time
+        self.crypto_list = GrowableArray()  # Crypto values over time
+        self.crypto_list.append(crypto)
         
-        self.position_list : List[Position] = []  # List of positions held
+        self.open_positions : Dict[Position, None] = {}  # Positions currently held, as an ordered set
+        self.ledger = PositionLedger()  # Closed positions
         
         self.trades = 0  # Number of trades
         
-        self.portfolio_value_list = []  # List of portfolio values over time
+        self.portfolio_value = None  # Last recorded portfolio value
+        self.portfolio_returns = None  # Last recorded portfolio returns
         
-        self.portfolio_returns_list = []  # List of portfolio returns over time
+        self.record_history = record_history
+        self._value_history = GrowableArray(capacity=n_steps or 16)  # Portfolio values over time
+        self._returns_history = GrowableArray(capacity=n_steps or 16)  # Portfolio returns over time
+
+    def reserve(self, n_steps):
+        """
+        Preallocate the history of the portfolio values and returns, so that recording a timestep never allocates.
+        :param int n_steps: The number of timesteps to record.
+        """
+        if self.record_history and len(self._value_history) == 0:
+            self._value_history = GrowableArray(capacity=n_steps)
+            self._returns_history = GrowableArray(capacity=n_steps)
+
+    def record(self, current_price, current_fee):
+        """
+        Record the portfolio value and returns of the current timestep.
+        :param float current_price: The current price of the asset.
+        :param float current_fee: The current transaction fee
+        """
+        self.portfolio_value = self.get_portfolio_value(current_price, current_fee)
+        self.portfolio_returns = self.portfolio_value - self.initial_cash
+        if self.record_history:
+            self._value_history.append(self.portfolio_value)
+            self._returns_history.append(self.portfolio_returns)
+
+    def record_values(self, values):
+        """
+        Record the portfolio values of many timesteps at once, e.g. from a compiled run.
+        :param np.ndarray values: The portfolio value at each timestep.
+        """
+        if not len(values):
+            return
+        returns = values - self.initial_cash
+        self.portfolio_value = values[-1]
+        self.portfolio_returns = returns[-1]
+        if self.record_history:
+            self._value_history.extend(values)
+            self._returns_history.extend(returns)
+
+    @property
+    def portfolio_value_list(self) -> np.ndarray:
+        """
+        The portfolio values over time, as a zero-copy view. Only the last value if the history is not recorded.
+        """
+        if self.record_history or self.portfolio_value is None:
+            return self._value_history.values
+        return np.array([self.portfolio_value])
+
+    @property
+    def portfolio_returns_list(self) -> np.ndarray:
+        """
+        The portfolio returns over time, as a zero-copy view. Only the last returns if the history is not recorded.
+        """
+        if self.record_history or self.portfolio_returns is None:
+            return self._returns_history.values
+        return np.array([self.portfolio_returns])
+
+    @property
+    def position_list(self) -> List[Position]:
+        """
+        All the positions, closed ones first (rebuilt from the ledger) then open ones. O(total positions), use
+        active_positions() to iterate over the open positions.
+        """
+        return list(self.ledger.positions()) + list(self.open_positions)
+
+    def active_positions(self) -> List[Position]:
+        """
+        Get the positions currently held, in the order they were bought. O(open positions).
+        """
+        return list(self.open_positions)
+
+    def _close(self, position:Position):
+        # Move the position from the open positions to the ledger
+        del self.open_positions[position]
+        self.ledger.record(position)
 
-        
     def sell(self, position:Position, date, price, fee):
         self.crypto -= position.quantity
         self.crypto_list.append(self.crypto)
         self.cash += position.sell(date, price, fee)
         self.cash_list.append(self.cash)
         self.trades += 1
+        self._close(position)
 
-    def buy(self, date, price, cash, fee, scheduled_exit_date=None, scheduled_exit_price=None, scheduled_exit_returns=None, stop_loss=None):
+    def buy(self, date, price, cash, fee, scheduled_exit_date=None, scheduled_exit_price=None, scheduled_exit_returns=None, stop_loss=None, take_profit=None):
         """
         Buy the all the asset cash can buy.
         :param int date: The date of the transaction.
@@ -59,6 +145,7 @@ class Portfolio:
         :param int scheduled_exit_price: The price at scheduled exit date.
         :param int scheduled_exit_returns: The returns at scheduled exit date.
         :param int stop_loss: The defined stop loss, as a negative percent of cash invested to buy the asset.
+        :param float take_profit: The defined take profit, as a percent of cash invested to buy the asset.
         :return float: The quantity bought.
         """
         # Verify that the cash is not greater than the available cash
@@ -86,13 +173,14 @@ class Portfolio:
             scheduled_exit_price=scheduled_exit_price,
             scheduled_exit_returns=scheduled_exit_returns,
             
-            # Add a stop loss
+            # Add a stop loss and a take profit
             stop_loss=stop_loss,
+            take_profit=take_profit,
             )
         self.crypto_list.append(self.crypto)
         
-        # Add the position to the list
-        self.position_list.append(position)
+        # Add the position to the open positions
+        self.open_positions[position] = None
         
         # Update the number of trades
         self.trades += 1
@@ -116,8 +204,9 @@ class Portfolio:
         self.crypto = 0.0
         
         # Close all positions
-        for position in [position for position in self.position_list if position.active()]:
+        for position in self.active_positions():
             position.sell(date, price, fee)
+            self._close(position)
         
         return cash
     
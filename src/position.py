@@ -1,3 +1,5 @@
+import numpy as np
+from src.fees import sell_fees
 from src.utils.utils import cash2qty, qty2cash, compute_returns
 
 
@@ -12,11 +14,16 @@ class Position:
     :ivar float scheduled_exit_price: The price the asset is expected to be sold at.
     :ivar float scheduled_returns: The expected returns at the scheduled exit.
     :ivar float stop_loss: The stop loss percentage.
+    :ivar float take_profit: The take profit percentage.
     :ivar int exit_date: The date the position was sold.
     :ivar float exit_price: The price the asset was sold at.
     :ivar float exit_cash: The cash obtained from selling the asset.
     :ivar float returns: The returns obtained from selling the asset.
     """
+    __slots__ = ('entry_date', 'entry_price', 'entry_cash', 'quantity',
+                 'scheduled_exit_date', 'scheduled_exit_price', 'scheduled_returns', 'scheduled_exit_returns',
+                 'stop_loss', 'take_profit', 'exit_date', 'exit_price', 'exit_cash', 'returns')
+
     def __init__(self):
         """
         Initialize the Position class.
@@ -33,9 +40,11 @@ class Position:
         self.scheduled_exit_date = None  # Scheduled exit date
         self.scheduled_exit_price = None  # Scheduled exit price
         self.scheduled_returns = None  # Scheduled returns
+        self.scheduled_exit_returns = None  # Scheduled returns, as updated by buy and update_scheduled_exit
         
-        # Stop loss
+        # Stop loss and take profit
         self.stop_loss = None  # Stop loss percentage
+        self.take_profit = None  # Take profit percentage
         
         # Effective selling
         self.exit_date = None  # Effective exit date
@@ -59,13 +68,15 @@ class Position:
             return True
         return False
     
-    def buy(self, date, price, cash, fee, scheduled_exit_date=None, scheduled_exit_price=None, scheduled_exit_returns=None, stop_loss=None):
+    def buy(self, date, price, cash, fee, scheduled_exit_date=None, scheduled_exit_price=None, scheduled_exit_returns=None, stop_loss=None, take_profit=None):
         """
         Buy the all the asset cash can buy.
         :param int date: The date of the transaction.
         :param float price: The price of the asset.
         :param float cash: The cash to spend.
         :param float fee: The fee to pay.
+        :param float stop_loss: The returns percentage under which the position is sold.
+        :param float take_profit: The returns percentage from which the position is sold.
         :return float: The quantity bought.
         """
         if self.active() or self.closed():
@@ -85,8 +96,9 @@ class Position:
         self.scheduled_exit_price=scheduled_exit_price
         self.scheduled_exit_returns=scheduled_exit_returns
         
-        # Save the stop loss
+        # Save the stop loss and take profit
         self.stop_loss=stop_loss
+        self.take_profit=take_profit
         
         # Compute the quantity bought
         self.quantity = cash2qty(cash, self.entry_price, fee)
@@ -118,31 +130,38 @@ class Position:
         
         return self.exit_cash
     
-    def should_sell(self, past_prices, predict_prices, past_fees, predict_fees):
+    def _order_triggered(self, current_returns_pct):
+        # Check if the returns reach the stop loss or the take profit
+        if self.stop_loss is not None and current_returns_pct < self.stop_loss:
+            return True
+        return self.take_profit is not None and current_returns_pct >= self.take_profit
+
+    def should_sell(self, past_prices, predict_prices, past_fees, predict_fees, best_exit=None):
         """
         Decide whether to sell the asset.
         :param pd.DataFrame past_prices: The past prices.
         :param pd.DataFrame predict_prices: The predicted prices.
-        :param list past_fees: The past fees.
-        :param list predict_fees: The predicted fees.
+        :param list past_fees: The past fees (a list or a FeeSchedule, selling fees are used).
+        :param list predict_fees: The predicted fees (a list or a FeeSchedule, selling fees are used).
+        :param int best_exit: The index of the maximum predicted price, if known (constant fees).
         :return bool: True if the asset should be sold, False otherwise.
         Also returns the optimal date, price and returns to sell the asset in the future if it is better than now.
         """
         # Get the current close price
         current_price = past_prices.iloc[-1]['close']
         
-        # Stop loss
-        if self.stop_loss is not None:
+        # Stop loss and take profit
+        if self.stop_loss is not None or self.take_profit is not None:
             
             # Compute the returns if we sold the asset now
             current_returns_pct = compute_returns(self.entry_cash, self.quantity, current_price, past_fees[-1])/self.entry_cash
             
-            # Check if the stop loss is reached
-            if current_returns_pct < self.stop_loss:
+            # Check if the stop loss or the take profit is reached
+            if self._order_triggered(current_returns_pct):
                 return True, None, None, None
         
         # Compute the future maximal potential returns
-        future_max_returns, max_returns_date, future_max_returns_price, future_max_returns = self._future_returns(predict_prices, predict_fees)
+        future_max_returns, max_returns_date, future_max_returns_price, future_max_returns = self._future_returns(predict_prices, predict_fees, best_exit)
         
         # Compute the immediate potential returns
         immediate_returns = compute_returns(self.entry_cash, self.quantity, current_price, past_fees[-1])      
@@ -153,33 +172,39 @@ class Position:
         else:
             return True, None, None, None
         
-    def _future_returns(self, predict_prices, predict_fees):
+    def _future_returns(self, predict_prices, predict_fees, best_exit=None):
         """
         Compute the future returns.
         :param pd.DataFrame predict_prices: The predicted prices.
         :param list predict_fees: The predicted fees.
+        :param int best_exit: The index of the maximum predicted price, if known (constant fees).
         :return tuple: The maximum returns, the date of the maximum returns, the price of the maximum returns and the maximum returns.
         """
-        predicted_returns_list = []
-        
-        # Iterate over the future prices
-        for i in range(len(predict_prices)):
-            # Get the future close price
-            future_price = predict_prices.iloc[i]['close']
-            
-            # Get the future fee
-            future_fee = predict_fees[i]
-            
-            # Compute the returns if we sold the asset at the future price            
-            returns = compute_returns(self.entry_cash, self.quantity, future_price, future_fee)
-            
-            predicted_returns_list.append(returns)
-            
-        # Get the maximum returns
-        future_max_returns = max(predicted_returns_list)
-        
-        # Get the index of the maximum returns
-        future_max_returns_index = predicted_returns_list.index(future_max_returns)
+        if best_exit is not None:
+            # With a constant fee, the maximum returns are at the maximum price
+            future_max_returns_index = best_exit
+            future_max_returns = compute_returns(self.entry_cash, self.quantity, predict_prices.iloc[best_exit]['close'], predict_fees[best_exit])
+        else:
+            predicted_returns_list = []
+
+            # Iterate over the future prices
+            for i in range(len(predict_prices)):
+                # Get the future close price
+                future_price = predict_prices.iloc[i]['close']
+
+                # Get the future fee
+                future_fee = predict_fees[i]
+
+                # Compute the returns if we sold the asset at the future price
+                returns = compute_returns(self.entry_cash, self.quantity, future_price, future_fee)
+
+                predicted_returns_list.append(returns)
+
+            # Get the maximum returns
+            future_max_returns = max(predicted_returns_list)
+
+            # Get the index of the maximum returns
+            future_max_returns_index = predicted_returns_list.index(future_max_returns)
         
         # Get the date of the maximum returns
         max_returns_date = predict_prices.iloc[future_max_returns_index]['unix']
@@ -190,6 +215,64 @@ class Position:
         return future_max_returns, max_returns_date, future_max_returns_price, future_max_returns
         
     
+    def should_sell_arrays(self, current_price, predict_dates, predict_prices, past_fees, predict_fees, best_exit=None):
+        """
+        Decide whether to sell the asset, from NumPy arrays instead of dataframes.
+        :param float current_price: The current close price.
+        :param np.ndarray predict_dates: The dates of the predicted prices.
+        :param np.ndarray predict_prices: The predicted close prices.
+        :param past_fees: The past fees (an array or a FeeSchedule, selling fees are used).
+        :param predict_fees: The predicted fees (an array or a FeeSchedule, selling fees are used).
+        :param int best_exit: The index of the maximum predicted price, if known (constant fees).
+        :return bool: True if the asset should be sold, False otherwise.
+        Also returns the optimal date, price and returns to sell the asset in the future if it is better than now.
+        """
+        # Stop loss and take profit
+        if self.stop_loss is not None or self.take_profit is not None:
+
+            # Compute the returns if we sold the asset now
+            current_returns_pct = compute_returns(self.entry_cash, self.quantity, current_price, past_fees[-1])/self.entry_cash
+
+            # Check if the stop loss or the take profit is reached
+            if self._order_triggered(current_returns_pct):
+                return True, None, None, None
+
+        # Compute the future maximal potential returns
+        future_max_returns, max_returns_date, future_max_returns_price, future_max_returns = self._future_returns_arrays(
+            predict_dates, predict_prices, predict_fees, best_exit)
+
+        # Compute the immediate potential returns
+        immediate_returns = compute_returns(self.entry_cash, self.quantity, current_price, past_fees[-1])
+
+        # Compare the immediate returns with the future returns
+        if future_max_returns > immediate_returns and future_max_returns > 0:
+            return False, max_returns_date, future_max_returns_price, future_max_returns
+        else:
+            return True, None, None, None
+
+    def _future_returns_arrays(self, predict_dates, predict_prices, predict_fees, best_exit=None):
+        """
+        Compute the future returns over arrays of predicted prices, in a single vectorized operation.
+        :param np.ndarray predict_dates: The dates of the predicted prices.
+        :param np.ndarray predict_prices: The predicted close prices.
+        :param predict_fees: The predicted fees, as an array or a FeeSchedule.
+        :param int best_exit: The index of the maximum predicted price, if known (constant fees).
+        :return tuple: The maximum returns, the date of the maximum returns, the price of the maximum returns and the maximum returns.
+        """
+        if best_exit is not None:
+            # With a constant fee, the maximum returns are at the maximum price
+            future_max_returns_index = best_exit
+            future_max_returns = compute_returns(self.entry_cash, self.quantity, predict_prices[best_exit], predict_fees[best_exit])
+        else:
+            # Compute the returns if we sold the asset at each future price
+            predicted_returns = compute_returns(self.entry_cash, self.quantity, predict_prices, sell_fees(predict_fees))
+
+            # Get the index of the maximum returns (first occurrence, as list.index)
+            future_max_returns_index = int(np.argmax(predicted_returns))
+            future_max_returns = predicted_returns[future_max_returns_index]
+
+        return future_max_returns, predict_dates[future_max_returns_index], predict_prices[future_max_returns_index], future_max_returns
+
     def update_scheduled_exit(self, new_scheduled_exit_date, new_scheduled_exit_price, new_scheduled_exit_returns):
         """
         Update the scheduled exit.
@@ -0,0 +1,62 @@
+import numpy as np
+
+# Common bar intervals, in seconds
+RESOLUTIONS = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '4h': 14400, '1d': 86400}
+
+# Resolutions precomputed next to the base data of a store
+PYRAMID = ('1m', '5m', '1h', '1d')
+
+
+def bar_interval(resolution):
+    """
+    Get the interval of a resolution.
+    :param resolution: A name of RESOLUTIONS, or a number of seconds.
+    :return int: The interval of the bars, in seconds.
+    """
+    if isinstance(resolution, str):
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f'Unknown resolution {resolution}, expected one of {list(RESOLUTIONS)} or a number of seconds.')
+        return RESOLUTIONS[resolution]
+    if resolution <= 0:
+        raise ValueError('The interval of the bars must be a positive number of seconds.')
+    return int(resolution)
+
+
+def aggregate_bars(data, starts):
+    """
+    Aggregate consecutive rows of OHLCV data into bars: open=first, high=max, low=min, close=last, volume=sum.
+    :param data: The data (pd.DataFrame or OhlcvColumns), sorted by 'unix'.
+    :param np.ndarray starts: The index of the first row of each bar, increasing and starting at 0.
+    :return dict: The arrays of the bars, by column name, 'unix' being the timestamp of the first row of each bar.
+    """
+    ends = np.r_[starts[1:], len(data['unix'])] - 1
+    bars = {
+        'unix': np.asarray(data['unix'])[starts],
+        'open': np.asarray(data['open'])[starts],
+        'high': np.maximum.reduceat(np.asarray(data['high']), starts),
+        'low': np.minimum.reduceat(np.asarray(data['low']), starts),
+        'close': np.asarray(data['close'])[ends],
+    }
+    if 'volume' in data.columns:
+        bars['volume'] = np.add.reduceat(np.asarray(data['volume']), starts)
+    return bars
+
+
+def resample_ohlcv(data, resolution):
+    """
+    Aggregate OHLCV data into bars of a fixed duration, aligned on multiples of the interval since the epoch.
+    A bar covers the rows present in its interval: the intervals without any row have no bar.
+    :param data: The data (pd.DataFrame or OhlcvColumns), sorted by 'unix'.
+    :param resolution: A name of RESOLUTIONS, or a number of seconds.
+    :return dict: The arrays of the bars, by column name, 'unix' being the start of the interval of each bar.
+    """
+    interval = bar_interval(resolution)
+    unix = np.asarray(data['unix'], dtype=np.int64)
+    if not len(unix):
+        return {col: np.asarray(data[col])[:0] for col in ['unix', 'open', 'high', 'low', 'close', 'volume'] if col in data.columns}
+
+    bins = unix // interval
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    bars = aggregate_bars(data, starts)
+    bars['unix'] = bins[starts] * interval
+    return bars
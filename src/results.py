@@ -0,0 +1,219 @@
+import csv
+import os
+import time
+import pandas as pd
+
+# Formats of the result stores, by file extension
+RESULT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet'}
+
+
+class ResultStore:
+    """
+    A class to store search results, keyed by the hash of their parameters.
+    Results are buffered and written by batches, when the buffer is full or after some time, so the per-result cost
+    is an append to a list. The store is also the checkpoint of the search: a run killed halfway loses at most its
+    last batch, and is resumed by skipping the keys already stored.
+    Two formats, picked from the extension of the path:
+        - '.csv': a CSV file, appended batch by batch.
+        - '.parquet': a directory of Parquet part files, one per batch (requires pyarrow), compact and fast to load.
+    :ivar str path: The path of the store.
+    :ivar list columns: The columns of the results, the first one being the key.
+    :ivar int batch_size: The number of buffered results that triggers a write.
+    :ivar float flush_interval: The number of seconds after which buffered results are written.
+    """
+
+    def __init__(self, path, columns, batch_size=1000, flush_interval=10.0):
+        """
+        Initialize the ResultStore class, and open the store for appending.
+        :param str path: The path of the store, created if it does not exist.
+        :param list columns: The columns of the results, the first one being the key.
+        :param int batch_size: The number of buffered results that triggers a write.
+        :param float flush_interval: The number of seconds after which buffered results are written.
+        """
+        super().__init__()
+
+        self.path = str(path)
+        self.columns = columns
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.format = result_format(self.path)
+
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+        if self.format == 'parquet':
+            # Fail now rather than when the first batch is written
+            import pyarrow
+
+            os.makedirs(self.path, exist_ok=True)
+            self._parts = len(self._part_files())
+        else:
+            self._repair()
+
+        header = self._header()
+        if header is not None and header != self.columns:
+            raise ValueError(f'{self.path} does not have the columns {self.columns}.')
+
+        if self.format == 'csv':
+            self._file = open(self.path, 'a', newline='')
+            self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction='ignore')
+            if self._file.tell() == 0:
+                self._writer.writeheader()
+                self._file.flush()
+
+    def _part_files(self):
+        return sorted(os.path.join(self.path, file) for file in os.listdir(self.path) if file.endswith('.parquet'))
+
+    def _header(self):
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+
+            parts = self._part_files()
+            return pq.read_schema(parts[0]).names if parts else None
+
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, newline='') as f:
+            return next(csv.reader(f), None)
+
+    def _repair(self):
+        """
+        Drop the last row of a CSV file if it was cut by a killed run, so that new rows do not get appended to it.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            if end == 0:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b'\n':
+                return
+
+            # Read back blocks of the tail until the end of the last complete row
+            block_size = 2 ** 16
+            position = end
+            while position > 0:
+                start = max(0, position - block_size)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b'\n')
+                if newline >= 0:
+                    f.truncate(start + newline + 1)
+                    return
+                position = start
+            f.truncate(0)
+
+    def completed_keys(self):
+        """
+        Get the keys of the results already stored or buffered.
+        :return set: The keys.
+        """
+        keys = {result[self.columns[0]] for result in self._buffer}
+
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+
+            for part in self._part_files():
+                keys.update(pq.read_table(part, columns=[self.columns[0]]).column(0).to_pylist())
+            return keys
+
+        with open(self.path, newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            keys.update(row[0] for row in reader if len(row) == len(self.columns))
+        return keys
+
+    def completed_values(self, column):
+        """
+        Get a numeric column of the results already stored or buffered, e.g. to resume an adaptive search.
+        :param str column: The name of the column.
+        :return dict: The values of the column, by key.
+        """
+        index = self.columns.index(column)
+        values = {}
+
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+
+            for part in self._part_files():
+                table = pq.read_table(part, columns=[self.columns[0], column])
+                values.update(zip(table.column(0).to_pylist(), table.column(1).to_pylist()))
+        else:
+            with open(self.path, newline='') as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                values.update((row[0], float(row[index])) for row in reader if len(row) == len(self.columns))
+
+        values.update((result[self.columns[0]], result[column]) for result in self._buffer)
+        return values
+
+    def append(self, result):
+        """
+        Buffer a result, and write the buffer if it is full or old enough.
+        :param dict result: The result, with one value per column.
+        """
+        self._buffer.append(result)
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered results.
+        """
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+
+        if self.format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pydict({col: [result.get(col) for result in self._buffer] for col in self.columns})
+            # Write a hidden file then rename it, so that a killed run never leaves a partial part file
+            name = f'part-{self._parts:06d}.parquet'
+            tmp_part = os.path.join(self.path, f'.{name}.tmp')
+            pq.write_table(table, tmp_part)
+            os.replace(tmp_part, os.path.join(self.path, name))
+            self._parts += 1
+        else:
+            self._writer.writerows(self._buffer)
+            self._file.flush()
+
+        self._buffer = []
+
+    def close(self):
+        """
+        Write the buffered results and close the store.
+        """
+        self.flush()
+        if self.format == 'csv':
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def result_format(path):
+    """
+    Get the format of a result store from its extension.
+    :param str path: The path of the store.
+    :return str: 'csv' or 'parquet'.
+    """
+    extension = os.path.splitext(str(path).rstrip('/'))[1]
+    if extension not in RESULT_FORMATS:
+        raise ValueError(f'Unknown result format {extension}, expected one of {list(RESULT_FORMATS)}.')
+    return RESULT_FORMATS[extension]
+
+
+def read_results(path):
+    """
+    Read a result store.
+    :param str path: The path of the store, a CSV file or a Parquet directory.
+    :return pd.DataFrame: The results.
+    """
+    if result_format(path) == 'parquet':
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
@@ -0,0 +1,402 @@
+import hashlib
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from src.cache import attach_dataset, dataset_key, publish_dataset
+from src.simulation import estimate_returns, estimate_returns_batch
+
+# The parameters of estimate_returns explored by a search, in order
+PARAMETERS = ['predict_len', 'init_cash', 'init_crypto', 'fee', 'min_expected_returns', 'stop_loss']
+
+
+def param_key(params, data_id):
+    """
+    Hash a parameter combination with the identity of the dataset window it is evaluated on.
+    :param tuple params: The parameter combination, ordered as PARAMETERS.
+    :param str data_id: The identity of the dataset window, see dataset_id().
+    :return str: The key of the combination.
+    """
+    payload = json.dumps([[float(param) for param in params], data_id])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def run_chunk(chunk, **kwargs):
+    """
+    Estimate the returns of a chunk of parameter combinations.
+    :param list chunk: The parameter combinations, as tuples ordered as PARAMETERS.
+    :param kwargs: Extra keyword arguments of estimate_returns (engine, short_verbose, resolution, ...).
+    :return list: One result dictionary per combination, with the parameters and the returns.
+    """
+    results = []
+    for params in chunk:
+        result = dict(zip(PARAMETERS, params))
+        result['returns'] = estimate_returns(*params, **kwargs)
+        results.append(result)
+    return results
+
+
+def run_batch_chunk(chunk, short_verbose=False, resolution=None, forecaster=None, window=None, **kwargs):
+    """
+    Estimate the returns of a chunk of parameter combinations sharing a prediction length, in a single pass over the data.
+    :param list chunk: The parameter combinations, as tuples ordered as PARAMETERS, with the same prediction length.
+    :param bool short_verbose: Whether to print the short version of the results in the console.
+    :param str resolution: The resolution of the bars, defaults to the configured one.
+    :param Forecaster forecaster: The model predicting the prices, the true future prices if None.
+    :param tuple window: The (start, end) slice of the configured window to simulate, the whole window if None.
+    :param kwargs: Other keyword arguments of estimate_returns, unused: the batch simulation has a single engine.
+    :return list: One result dictionary per combination, with the parameters and the returns.
+    """
+    _, *param_lists = zip(*chunk)
+    returns = estimate_returns_batch(chunk[0][0], *param_lists, short_verbose=short_verbose, resolution=resolution,
+                                     forecaster=forecaster, window=window)
+
+    results = []
+    for params, params_returns in zip(chunk, returns):
+        result = dict(zip(PARAMETERS, params))
+        result['returns'] = float(params_returns)
+        results.append(result)
+    return results
+
+
+class GridSearchExecutor:
+    """
+    A class to evaluate parameter combinations over a pool of worker processes.
+    The dataset is loaded once and shared with the workers, the combinations are dispatched by chunks,
+    and the results are streamed back in order of completion.
+    :ivar int n_jobs: The number of worker processes.
+    :ivar int chunksize: The number of combinations per task, None to pick one from the number of combinations.
+    :ivar bool batch: Whether to simulate the combinations sharing a prediction length together, in one pass over the data.
+    :ivar dict kwargs: Extra keyword arguments of estimate_returns.
+    """
+
+    def __init__(self, n_jobs=-1, chunksize=None, batch=False, **kwargs):
+        """
+        Initialize the GridSearchExecutor class.
+        :param int n_jobs: The number of worker processes, -1 for all the CPUs, 1 to run in this process.
+        :param int chunksize: The number of combinations per task, None to pick one from the number of combinations.
+        :param bool batch: Whether to simulate the combinations sharing a prediction length together, in one pass over the data.
+        :param kwargs: Extra keyword arguments of estimate_returns (engine, short_verbose, resolution, ...).
+        """
+        super().__init__()
+
+        self.n_jobs = os.cpu_count() if n_jobs is None or n_jobs < 1 else n_jobs
+        self.chunksize = chunksize
+        self.batch = batch
+        self.kwargs = kwargs
+
+    def _chunks(self, param_combinations):
+        if not self.batch:
+            # About 4 tasks per worker balances the load without paying the dispatch overhead per combination
+            chunksize = self.chunksize or max(1, math.ceil(len(param_combinations) / (4 * self.n_jobs)))
+            return [param_combinations[i:i + chunksize] for i in range(0, len(param_combinations), chunksize)]
+
+        # Group the combinations by prediction length, then split the groups so that every worker gets a task
+        groups = {}
+        for params in param_combinations:
+            groups.setdefault(params[0], []).append(params)
+        chunks = []
+        for group in groups.values():
+            chunksize = self.chunksize or math.ceil(len(group) / math.ceil(self.n_jobs / len(groups)))
+            chunks.extend(group[i:i + chunksize] for i in range(0, len(group), chunksize))
+        return chunks
+
+    def run(self, param_combinations, windows=None):
+        """
+        Estimate the returns of every parameter combination, on every window.
+        :param list param_combinations: The parameter combinations, as tuples ordered as PARAMETERS.
+        :param list windows: The (start, end) slices of the configured window to evaluate every combination on, e.g.
+            the windows of a walk-forward split, None for the configured window. All the slices are served by the
+            workers from the same shared copy of the configured window.
+        :return generator: The result dictionaries, with the window, in order of completion.
+        """
+        param_combinations = list(param_combinations)
+        windows = [None] if windows is None else list(windows)
+        return self.run_windows([(window, param_combinations) for window in windows])
+
+    def run_windows(self, evaluations):
+        """
+        Estimate the returns of different parameter combinations on different windows, over a single pool of workers.
+        :param list evaluations: The (window, param_combinations) pairs, the window being a (start, end) slice of the
+            configured window, or None for the configured window, and the combinations tuples ordered as PARAMETERS.
+        :return generator: The result dictionaries, with the window, in order of completion.
+        """
+        run_task = run_batch_chunk if self.batch else run_chunk
+        tasks = [(chunk, window) for window, param_combinations in evaluations
+                 for chunk in self._chunks(list(param_combinations))]
+        if not tasks:
+            return
+
+        if self.n_jobs == 1:
+            for chunk, window in tasks:
+                for result in run_task(chunk, window=window, **self.kwargs):
+                    result['window'] = window
+                    yield result
+            return
+
+        # Publish the data once, every worker attaches to it
+        resolution = self.kwargs.get('resolution')
+        shared = publish_dataset(resolution=resolution)
+        try:
+            with ProcessPoolExecutor(max_workers=self.n_jobs, initializer=attach_dataset,
+                                     initargs=(shared.handle, dataset_key(resolution=resolution))) as pool:
+                futures = {pool.submit(run_task, chunk, window=window, **self.kwargs): window for chunk, window in tasks}
+                for future in as_completed(futures):
+                    for result in future.result():
+                        result['window'] = futures[future]
+                        yield result
+        finally:
+            shared.close()
+
+
+class SearchStrategy:
+    """
+    A base class to pick the parameter combinations of a search and the windows they are evaluated on.
+    A strategy calls an evaluation function with batches of combinations, so that every batch runs over the pool of
+    workers, and returns the combinations it evaluated on the full dataset window.
+    :ivar list history: The number of bars (None for the full window) and of combinations of every evaluated batch.
+    """
+
+    def __init__(self):
+        """
+        Initialize the SearchStrategy class.
+        """
+        super().__init__()
+
+        self.history = []
+
+    def search(self, space, evaluate, n_bars):
+        """
+        Search the parameter space.
+        :param list space: The values of each parameter, ordered as PARAMETERS.
+        :param evaluate: The evaluation function, called with a list of combinations and a number of bars (the last
+            bars of the window, None for the full window), returning the returns of every combination.
+        :param int n_bars: The number of bars of the full window.
+        :return list: The (combination, returns) evaluated on the full window.
+        """
+        raise NotImplementedError
+
+    def _evaluate(self, evaluate, param_combinations, n_bars=None):
+        self.history.append((n_bars, len(param_combinations)))
+        return list(evaluate(param_combinations, n_bars))
+
+
+def unique_space(space):
+    """
+    Drop the duplicated values of each parameter, keeping their order.
+    :param list space: The values of each parameter.
+    :return list: The unique values of each parameter.
+    """
+    return [list(dict.fromkeys(values)) for values in space]
+
+
+def sample_combinations(space, n_samples, rng, exclude=()):
+    """
+    Sample distinct parameter combinations uniformly, without building the whole grid.
+    :param list space: The unique values of each parameter.
+    :param int n_samples: The number of combinations, at most the number of combinations not excluded.
+    :param np.random.Generator rng: The random generator.
+    :param exclude: The combinations not to sample.
+    :return list: The combinations, as tuples.
+    """
+    shape = tuple(len(values) for values in space)
+    exclude = {np.ravel_multi_index(tuple(values.index(param) for values, param in zip(space, params)), shape)
+               for params in exclude}
+    n_combinations = math.prod(shape)
+    n_samples = min(n_samples, n_combinations - len(exclude))
+
+    # Sample enough combinations to get n_samples that are not excluded
+    candidates = rng.choice(n_combinations, size=min(n_samples + len(exclude), n_combinations), replace=False)
+    flat_indices = [index for index in candidates if index not in exclude][:n_samples]
+    return [tuple(values[i] for values, i in zip(space, np.unravel_index(index, shape))) for index in flat_indices]
+
+
+class ExhaustiveSearch(SearchStrategy):
+    """
+    A class to evaluate every combination of the grid on the full window.
+    """
+
+    def search(self, space, evaluate, n_bars):
+        param_combinations = list(itertools.product(*unique_space(space)))
+        return list(zip(param_combinations, self._evaluate(evaluate, param_combinations)))
+
+
+class RandomSearch(SearchStrategy):
+    """
+    A class to evaluate a random sample of the combinations of the grid on the full window.
+    :ivar int n_samples: The number of combinations evaluated.
+    :ivar int seed: The seed of the sampling.
+    """
+
+    def __init__(self, n_samples=100, seed=0):
+        """
+        Initialize the RandomSearch class.
+        :param int n_samples: The number of combinations evaluated.
+        :param int seed: The seed of the sampling.
+        """
+        super().__init__()
+
+        self.n_samples = n_samples
+        self.seed = seed
+
+    def search(self, space, evaluate, n_bars):
+        param_combinations = sample_combinations(unique_space(space), self.n_samples, np.random.default_rng(self.seed))
+        return list(zip(param_combinations, self._evaluate(evaluate, param_combinations)))
+
+
+class SuccessiveHalving(SearchStrategy):
+    """
+    A class to screen combinations on the last bars of the window and promote the best ones to longer windows.
+    Every rung evaluates the remaining combinations on a window eta times longer than the previous one, and keeps the
+    best 1/eta of them, up to the last rung on the full window. Most candidates are then only backtested on a short
+    window: a rung costs about the same number of bars as the full backtests of the last rung.
+    :ivar int n_samples: The number of combinations screened, sampled from the grid, None for the whole grid.
+    :ivar int eta: The reduction factor of every rung.
+    :ivar int min_bars: The minimum number of bars of the first rung.
+    :ivar int seed: The seed of the sampling.
+    """
+
+    def __init__(self, n_samples=None, eta=3, min_bars=500, seed=0):
+        """
+        Initialize the SuccessiveHalving class.
+        :param int n_samples: The number of combinations screened, sampled from the grid, None for the whole grid.
+        :param int eta: The reduction factor of every rung, at least 2.
+        :param int min_bars: The minimum number of bars of the first rung.
+        :param int seed: The seed of the sampling.
+        """
+        super().__init__()
+
+        if eta < 2:
+            raise ValueError(f'eta must be at least 2, got {eta}.')
+        self.n_samples = n_samples
+        self.eta = eta
+        self.min_bars = min_bars
+        self.seed = seed
+
+    def search(self, space, evaluate, n_bars):
+        space = unique_space(space)
+        if self.n_samples is None:
+            candidates = list(itertools.product(*space))
+        else:
+            candidates = sample_combinations(space, self.n_samples, np.random.default_rng(self.seed))
+
+        # Add rungs while the first window is long enough and the last rung keeps a combination
+        n_rungs = 1
+        while n_bars // self.eta ** n_rungs >= self.min_bars and len(candidates) // self.eta ** n_rungs >= 1:
+            n_rungs += 1
+
+        for rung in range(n_rungs - 1):
+            returns = self._evaluate(evaluate, candidates, n_bars // self.eta ** (n_rungs - 1 - rung))
+
+            # Promote the best combinations, the first ones on ties
+            n_promoted = max(1, math.ceil(len(candidates) / self.eta))
+            best = np.argsort(-np.array(returns, dtype=np.float64), kind='stable')[:n_promoted]
+            candidates = [candidates[i] for i in sorted(best)]
+
+        return list(zip(candidates, self._evaluate(evaluate, candidates)))
+
+
+class TPESearch(SearchStrategy):
+    """
+    A class to search the grid with a Tree-structured Parzen Estimator, evaluating every combination on the full window.
+    After some random combinations, the evaluated ones are split between the best (a gamma fraction) and the others,
+    each parameter gets a density over its values for both groups, and the next combinations are the candidates
+    sampled from the density of the best ones that maximize the ratio of the densities. Values are smoothed with their
+    neighbours in the parameter list, so the lists are expected sorted, as a grid usually is.
+    Combinations are proposed by batches, evaluated in parallel.
+    :ivar int n_samples: The total number of combinations evaluated.
+    :ivar int n_startup: The number of random combinations evaluated first.
+    :ivar int batch_size: The number of combinations proposed at once.
+    :ivar float gamma: The fraction of the evaluated combinations modelled as the best ones.
+    :ivar int n_candidates: The number of candidates sampled for every proposed combination.
+    :ivar int seed: The seed of the sampling.
+    """
+
+    def __init__(self, n_samples=100, n_startup=None, batch_size=8, gamma=0.25, n_candidates=24, seed=0):
+        """
+        Initialize the TPESearch class.
+        :param int n_samples: The total number of combinations evaluated.
+        :param int n_startup: The number of random combinations evaluated first, a fifth of n_samples (at least 10) if None.
+        :param int batch_size: The number of combinations proposed at once.
+        :param float gamma: The fraction of the evaluated combinations modelled as the best ones.
+        :param int n_candidates: The number of candidates sampled for every proposed combination.
+        :param int seed: The seed of the sampling.
+        """
+        super().__init__()
+
+        self.n_samples = n_samples
+        self.n_startup = n_startup if n_startup is not None else max(10, n_samples // 5)
+        self.batch_size = batch_size
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+        self.seed = seed
+
+    @staticmethod
+    def _density(indices, n_values):
+        """
+        Estimate the density of the values of a parameter: a Gaussian kernel over the value indices around every
+        observation, mixed with a uniform prior weighing as one observation.
+        :param np.ndarray indices: The observed value indices.
+        :param int n_values: The number of values of the parameter.
+        :return np.ndarray: The probability of every value.
+        """
+        kernels = np.exp(-0.5 * (np.arange(n_values)[None, :] - indices[:, None]) ** 2)
+        kernels /= kernels.sum(axis=1, keepdims=True)
+        return (kernels.sum(axis=0) + 1 / n_values) / (len(indices) + 1)
+
+    def _propose(self, space, evaluated, n_proposed, rng):
+        param_combinations = list(evaluated)
+        indices = np.array([[values.index(param) for values, param in zip(space, params)]
+                            for params in param_combinations])
+        returns = np.array([evaluated[params] for params in param_combinations], dtype=np.float64)
+
+        # Split the evaluated combinations between the best ones and the others
+        order = np.argsort(-returns, kind='stable')
+        n_best = max(1, math.ceil(self.gamma * len(order)))
+        best, others = indices[order[:n_best]], indices[order[n_best:]]
+
+        # Sample candidates from the densities of the best combinations, and score them by the ratio of the densities
+        n_sampled = n_proposed * self.n_candidates
+        candidates = np.empty((n_sampled, len(space)), dtype=np.int64)
+        scores = np.zeros(n_sampled)
+        for j, values in enumerate(space):
+            best_density = self._density(best[:, j], len(values))
+            others_density = self._density(others[:, j], len(values))
+            candidates[:, j] = rng.choice(len(values), size=n_sampled, p=best_density)
+            scores += np.log(best_density[candidates[:, j]]) - np.log(others_density[candidates[:, j]])
+
+        proposed = []
+        for i in np.argsort(-scores, kind='stable'):
+            params = tuple(values[index] for values, index in zip(space, candidates[i]))
+            if params not in evaluated and params not in proposed:
+                proposed.append(params)
+                if len(proposed) == n_proposed:
+                    return proposed
+
+        # Complete with random combinations when the candidates are all evaluated, e.g. in a small grid
+        return proposed + sample_combinations(space, n_proposed - len(proposed), rng, exclude=[*evaluated, *proposed])
+
+    def search(self, space, evaluate, n_bars):
+        space = unique_space(space)
+        rng = np.random.default_rng(self.seed)
+        n_samples = min(self.n_samples, math.prod(len(values) for values in space))
+
+        evaluated = {}
+        param_combinations = sample_combinations(space, min(self.n_startup, n_samples), rng)
+        while param_combinations:
+            evaluated.update(zip(param_combinations, self._evaluate(evaluate, param_combinations)))
+            n_proposed = min(self.batch_size, n_samples - len(evaluated))
+            param_combinations = self._propose(space, evaluated, n_proposed, rng) if n_proposed > 0 else []
+
+        return list(evaluated.items())
+
+
+# Search strategies, by name
+STRATEGIES = {
+    'exhaustive': ExhaustiveSearch,
+    'random': RandomSearch,
+    'halving': SuccessiveHalving,
+    'tpe': TPESearch,
+}
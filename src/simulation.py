@@ -1,48 +1,89 @@
 import os
 
 from config import config
-from src.dataset import TsData
+from src.batch import BatchOptimizer
+from src.cache import load_window, window_id
+from src.fees import FeeSchedule
+from src.forecast import CachedForecaster, OracleForecaster
 from src.optimizer import Optimizer
 from src.policy import Policy
 from src.portfolio import Portfolio
-from src.utils.plots import plot_situation
 
+ENGINES = ('pandas', 'numpy', 'kernel')
 
-def estimate_returns(predict_len, init_cash, init_crypto, fee, min_expected_returns, stop_loss, verbose=False, short_verbose=False, plot_results=False):
+
+def cached_forecaster(forecaster, resolution=None, window=None):
+    """ Wraps a forecaster to cache its predictions on the configured dataset window, or a slice of it.
+
+    Args:
+        forecaster (Forecaster): the model predicting the prices, the true future prices if None
+        resolution (str): the resolution of the bars, defaults to the configured one
+        window (tuple): the (start, end) slice of the configured window, the whole window if None
+
+    Returns:
+        Forecaster: the forecaster, cached on disk if it is worth it
+    """
+    forecaster = forecaster if forecaster is not None else OracleForecaster()
+    if not forecaster.cacheable:
+        return forecaster
+    return CachedForecaster(forecaster, window_id(window, resolution=resolution))
+
+
+def estimate_returns(predict_len, init_cash, init_crypto, fee, min_expected_returns, stop_loss, verbose=False, short_verbose=False, plot_results=False, engine='pandas', buy_fee=None, resolution=None, forecaster=None,
+                     take_profit=None, max_exposure=None, intrabar=False, slippage=0.0, window=None):
     """ Computes the returns for a given prediction length.
 
     Args:
         predict_len (int): the length of the predicted data.
         init_cash (float): the initial amount of cash
         init_crypto (float): the initial amount of crypto
-        fee (float): the fee at each transaction
+        fee (float): the fee at each transaction (the fee charged when selling, if buy_fee is given)
         min_expected_returns (float): the minimum expected returns in the future to buy a position
         stop_loss (float): the loss percentage that triggers the sell of a position (compared to the entry price)
         verbose (bool): whether to print results in the console
         short_verbose (bool): whether to print the short version of the results in the console (for grid search)
         plot_results (bool): whether to plot results and save in the results folder
+        engine (str): the backtest engine, 'pandas' (reference, row by row), 'numpy' (vectorized, same results) or 'kernel'
+            (compiled with Numba if installed, same results, constant fee and no take profit, exposure limit or intrabar fills)
+        buy_fee (float): the fee charged when buying, defaults to fee
+        resolution (str): the resolution of the bars ('5m', '1h', '1d', ...), defaults to the configured one
+        forecaster (Forecaster): the model predicting the prices, the true future prices if None. Its predictions are cached on disk
+        take_profit (float): the returns percentage that triggers the sell of a position, None to only sell at the best exit
+        max_exposure (float): the maximum fraction of the portfolio value held in crypto, None for no limit
+        intrabar (bool): whether to fill the stop losses and take profits inside the bars, from their high and low prices
+        slippage (float): the fraction of the price lost when a stop loss fills inside a bar
+        window (tuple): the (start, end) slice of the configured window to simulate, the whole window if None (e.g. a shorter
+            window to screen parameters, or the test window of a walk-forward split)
     """
-    # Load data
-    data = TsData(pickle_file=config['data']['pickle_file']).data
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine {engine}, expected one of {ENGINES}.')
 
-    # Trim data
-    data = data.iloc[config['data']['start_position']:config['data']['end_position']]
+    # Load and trim data, once per process
+    data = load_window(window, resolution=resolution)
 
-    # Create a portfolio
-    portfolio = Portfolio(cash=init_cash, crypto=init_crypto)
+    # Create a portfolio, recording its history only if it is plotted
+    portfolio = Portfolio(cash=init_cash, crypto=init_crypto, record_history=plot_results)
 
     # Create a policy
-    policy = Policy(min_expected_returns=min_expected_returns, stop_loss=stop_loss)
+    policy = Policy(min_expected_returns=min_expected_returns, stop_loss=stop_loss, take_profit=take_profit,
+                    max_exposure=max_exposure)
 
     # Create an optimizer
-    optimizer = Optimizer(portfolio=portfolio, policy=policy, predict_len=predict_len, fee=fee, verbose=False)
+    fee_schedule = FeeSchedule(sell_fee=fee, buy_fee=buy_fee)
+    optimizer = Optimizer(portfolio=portfolio, policy=policy, predict_len=predict_len, fee=fee_schedule, verbose=False,
+                          forecaster=cached_forecaster(forecaster, resolution, window), intrabar=intrabar, slippage=slippage)
 
     # Estimate the returns by iterating the policy over time
-    optimizer.iterate_policy(data)
+    if engine == 'numpy':
+        optimizer.iterate_policy_numpy(data)
+    elif engine == 'kernel':
+        optimizer.iterate_policy_kernel(data)
+    else:
+        optimizer.iterate_policy(data.to_frame())
 
     # Get the final returns
-    final_portfolio_value = portfolio.portfolio_value_list[-1]
-    final_portfolio_returns = portfolio.portfolio_returns_list[-1]
+    final_portfolio_value = portfolio.portfolio_value
+    final_portfolio_returns = portfolio.portfolio_returns
     num_trades = portfolio.trades
 
     if verbose:
@@ -59,13 +100,51 @@ def estimate_returns(predict_len, init_cash, init_crypto, fee, min_expected_retu
         print(f'Trades: {num_trades}')
 
     if plot_results:
-        # Plot the portfolio evolution
+        # Plot the portfolio evolution, importing the plotting library only now
+        from src.utils.plots import plot_situation
+
         save_path = f'{config["results_dir"]}/{config["data"]["type"]}/fee{fee}/pred{predict_len}/portfolio-returns.png'
         os.makedirs(os.path.dirname(save_path), exist_ok=True)  # Create the folder
-        plot_situation(data[:-1], portfolio, predict_len=predict_len, hold_fig=True, save_path=save_path)
+        plot_situation(data.to_frame()[:-1], portfolio, predict_len=predict_len, hold_fig=True, save_path=save_path)
 
     if short_verbose:
         print(f'{predict_len}, {init_cash}, {init_crypto}, {fee}, {min_expected_returns}, {stop_loss}'
               f' Returns {final_portfolio_returns:.2f}')
 
     return final_portfolio_returns
+
+
+def estimate_returns_batch(predict_len, init_cash, init_crypto, fee, min_expected_returns, stop_loss, short_verbose=False, resolution=None, forecaster=None,
+                           window=None):
+    """ Computes the returns of many parameter sets sharing a prediction length, in a single pass over the data.
+    Same results as calling estimate_returns with each parameter set.
+
+    Args:
+        predict_len (int): the length of the predicted data, shared by all the parameter sets.
+        init_cash (list): the initial amount of cash of each parameter set
+        init_crypto (list): the initial amount of crypto of each parameter set
+        fee (list): the fee at each transaction of each parameter set
+        min_expected_returns (list): the minimum expected returns in the future to buy a position of each parameter set
+        stop_loss (list): the loss percentage that triggers the sell of a position of each parameter set
+        short_verbose (bool): whether to print the short version of the results in the console (for grid search)
+        resolution (str): the resolution of the bars ('5m', '1h', '1d', ...), defaults to the configured one
+        forecaster (Forecaster): the model predicting the prices, the true future prices if None. Its predictions are cached on disk
+        window (tuple): the (start, end) slice of the configured window to simulate, the whole window if None
+
+    Returns:
+        np.ndarray: the final returns of each parameter set
+    """
+    # Load and trim data, once per process
+    data = load_window(window, resolution=resolution)
+
+    # Estimate the returns of all the parameter sets together
+    optimizer = BatchOptimizer(predict_len=predict_len, init_cash=init_cash, init_crypto=init_crypto, fee=fee,
+                               min_expected_returns=min_expected_returns, stop_loss=stop_loss,
+                               forecaster=cached_forecaster(forecaster, resolution, window))
+    optimizer.iterate_policy(data)
+
+    if short_verbose:
+        for params in zip(init_cash, init_crypto, fee, min_expected_returns, stop_loss, optimizer.portfolio_returns):
+            print(f'{predict_len}, {", ".join(str(param) for param in params[:-1])} Returns {params[-1]:.2f}')
+
+    return optimizer.portfolio_returns
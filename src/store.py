@@ -0,0 +1,212 @@
+import json
+import os
+import numpy as np
+from src.dataset import OhlcvColumns
+from src.resample import PYRAMID, bar_interval, resample_ohlcv
+
+# Fixed-width, little-endian types of the stored columns, 'source' being the index of the source of each row
+STORE_DTYPES = {'unix': '<i8', 'open': '<f8', 'high': '<f8', 'low': '<f8', 'close': '<f8', 'volume': '<f8',
+                'source': '<i2'}
+
+
+class PriceStore:
+    """
+    A class to read a columnar, memory-mapped store of OHLCV data.
+    A store is a directory with a 'header.json' file (length, columns and types, unix range, sampling) and one raw
+    binary file per column. Columns are memory-mapped, so opening a store and taking a window of it reads nothing
+    but the header, whatever the size of the history: pages are loaded when the window is actually read.
+    A store can also hold a pyramid of coarser resolutions of its data, each one a store of OHLCV bars in the
+    'pyramid' subdirectory, so that switching resolution does not aggregate anything.
+    :ivar str path: The path of the store directory.
+    :ivar dict header: The header of the store.
+    """
+    HEADER = 'header.json'
+    PYRAMID_DIR = 'pyramid'
+
+    def __init__(self, path):
+        """
+        Open a store.
+        :param str path: The path of the store directory.
+        """
+        super().__init__()
+
+        self.path = str(path)
+        with open(os.path.join(self.path, self.HEADER)) as f:
+            self.header = json.load(f)
+
+        self._columns = {}
+
+    @staticmethod
+    def is_store(path):
+        """
+        Return True if the path is a store directory, False otherwise.
+        """
+        return os.path.isfile(os.path.join(str(path), PriceStore.HEADER))
+
+    @staticmethod
+    def _write_header(path, header):
+        # Write a hidden file then rename it, so that readers never see a partial header
+        tmp_header = os.path.join(path, f'.{PriceStore.HEADER}.tmp')
+        with open(tmp_header, 'w') as f:
+            json.dump(header, f, indent=4)
+        os.replace(tmp_header, os.path.join(path, PriceStore.HEADER))
+
+    @classmethod
+    def write(cls, path, data, sampling=None):
+        """
+        Write OHLCV data as a store, replacing any store at the same path.
+        :param str path: The path of the store directory.
+        :param data: The data (pd.DataFrame or OhlcvColumns), sorted by 'unix'.
+        :param int sampling: The number of seconds between two rows, guessed from the data if None.
+        :return PriceStore: The store.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        columns = [col for col in STORE_DTYPES if col in data.columns]
+        unix = np.asarray(data['unix'], dtype=STORE_DTYPES['unix'])
+        for col in columns:
+            # Replace the files rather than overwriting them, as they may be mapped by readers
+            tmp_file = os.path.join(path, f'.{col}.bin.tmp')
+            np.asarray(data[col], dtype=STORE_DTYPES[col]).tofile(tmp_file)
+            os.replace(tmp_file, os.path.join(path, f'{col}.bin'))
+
+        if sampling is None:
+            sampling = int(np.median(np.diff(unix))) if len(unix) > 1 else None
+
+        header = {
+            'version': 1,
+            'length': len(unix),
+            'columns': {col: STORE_DTYPES[col] for col in columns},
+            'unix_start': int(unix[0]) if len(unix) else None,
+            'unix_end': int(unix[-1]) if len(unix) else None,
+            'sampling': sampling,
+        }
+        # Write the header last: a store is valid once its header is
+        cls._write_header(path, header)
+
+        return cls(path)
+
+    def append(self, data):
+        """
+        Append rows at the end of the store, without rewriting it.
+        :param data: The rows (pd.DataFrame or OhlcvColumns) with the columns of the store, sorted by 'unix' and
+            all after the last row of the store.
+        """
+        unix = np.asarray(data['unix'], dtype=STORE_DTYPES['unix'])
+        if not len(unix):
+            return
+        if self.header['unix_end'] is not None and unix[0] <= self.header['unix_end']:
+            raise ValueError(f'Cannot append rows from unix {unix[0]} to a store ending at unix {self.header["unix_end"]}.')
+
+        for col, dtype in self.header['columns'].items():
+            with open(os.path.join(self.path, f'{col}.bin'), 'r+b') as f:
+                # Drop the rows written past the length by a killed append, so that the columns stay aligned
+                f.truncate(self.header['length'] * np.dtype(dtype).itemsize)
+                f.seek(0, os.SEEK_END)
+                np.asarray(data[col], dtype=dtype).tofile(f)
+
+        header = dict(self.header)
+        header['length'] += len(unix)
+        if header['unix_start'] is None:
+            header['unix_start'] = int(unix[0])
+        header['unix_end'] = int(unix[-1])
+        # The rows past the old length are ignored by readers until the header is replaced
+        self._write_header(self.path, header)
+
+        self.header = header
+        self._columns = {}
+
+    def truncate(self, length):
+        """
+        Keep the first rows of the store only, without rewriting it.
+        The rows past the length stay in the column files until the next append overwrites them.
+        :param int length: The number of rows kept.
+        """
+        if length >= len(self):
+            return
+        header = dict(self.header)
+        header['length'] = length
+        header['unix_start'] = header['unix_start'] if length else None
+        header['unix_end'] = int(self.column('unix')[length - 1]) if length else None
+        self._write_header(self.path, header)
+
+        self.header = header
+        self._columns = {}
+
+    def column(self, col):
+        """
+        Get a read-only, memory-mapped column of the whole store.
+        :param str col: The name of the column.
+        :return np.ndarray: The column.
+        """
+        if col not in self._columns:
+            dtype = np.dtype(self.header['columns'][col])
+            if len(self) == 0:
+                self._columns[col] = np.empty(0, dtype=dtype)
+            else:
+                self._columns[col] = np.memmap(os.path.join(self.path, f'{col}.bin'), dtype=dtype, mode='r',
+                                               shape=(len(self),))
+        return self._columns[col]
+
+    def window(self, start_position=None, end_position=None):
+        """
+        Get zero-copy views of the columns between two rows, with the semantics of iloc[start_position:end_position].
+        :param int start_position: The first row of the window, negative to count from the end.
+        :param int end_position: The row after the last one of the window, negative to count from the end.
+        :return OhlcvColumns: The columns of the window.
+        """
+        return OhlcvColumns({col: self.column(col)[start_position:end_position] for col in self.header['columns']})
+
+    def build_pyramid(self, resolutions=PYRAMID):
+        """
+        Aggregate the data into bars at coarser resolutions, and store them next to it.
+        Resolutions not coarser than the sampling of the store are skipped.
+        :param tuple resolutions: The resolutions, names of RESOLUTIONS or numbers of seconds.
+        """
+        data = self.window()
+        for resolution in resolutions:
+            if self.header['sampling'] is not None and bar_interval(resolution) <= self.header['sampling']:
+                continue
+            PriceStore.write(os.path.join(self.path, self.PYRAMID_DIR, str(resolution)), OhlcvColumns(resample_ohlcv(data, resolution)),
+                             sampling=bar_interval(resolution))
+
+    def update_pyramid(self, resolutions=PYRAMID):
+        """
+        Bring the pyramid up to date after rows were appended to the store, without aggregating the whole history.
+        The last bar of every resolution may have been partial: it is dropped, and the bars from its start are
+        aggregated again from the last rows of the store, then appended. Resolutions not built yet are built in full.
+        Only valid if the rows of the store were appended: build the pyramid again when they were rewritten.
+        :param tuple resolutions: The resolutions, names of RESOLUTIONS or numbers of seconds.
+        """
+        for resolution in resolutions:
+            if self.header['sampling'] is not None and bar_interval(resolution) <= self.header['sampling']:
+                continue
+            path = os.path.join(self.path, self.PYRAMID_DIR, str(resolution))
+            if not PriceStore.is_store(path):
+                PriceStore.write(path, OhlcvColumns(resample_ohlcv(self.window(), resolution)),
+                                 sampling=bar_interval(resolution))
+                continue
+
+            # Aggregate the rows from the start of the last bar again
+            bars = PriceStore(path)
+            start = 0
+            if len(bars):
+                start = int(np.searchsorted(self.column('unix'), bars.header['unix_end'], side='left'))
+                bars.truncate(len(bars) - 1)
+            bars.append(OhlcvColumns(resample_ohlcv(self.window(start), resolution)))
+
+    def bars(self, resolution=None):
+        """
+        Get the data of the store at a resolution.
+        :param resolution: A name of RESOLUTIONS or a number of seconds, the base data of the store if None.
+        :return PriceStore: This store if the resolution is its sampling, the store of the resolution in the pyramid otherwise.
+        """
+        if resolution is None or bar_interval(resolution) == self.header['sampling']:
+            return self
+        path = os.path.join(self.path, self.PYRAMID_DIR, str(resolution))
+        if not PriceStore.is_store(path):
+            raise ValueError(f'No {resolution} bars in {self.path}, build them with build_pyramid().')
+        return PriceStore(path)
+
+    def __len__(self):
+        return self.header['length']
@@ -0,0 +1,87 @@
+import time
+import numpy as np
+from src.forecast import OracleForecaster
+
+
+class ReplaySource:
+    """
+    A class to replay a stored dataset bar by bar, as a local stand-in for a live feed.
+    The predictions of the forecaster are computed ahead of time over the dataset, and every bar is sent to
+    Optimizer.on_bar() with its row of the prediction matrix, at a configurable speed.
+    :ivar data: The replayed data (pd.DataFrame or OhlcvColumns).
+    :ivar int predict_len: The number of timesteps predicted with every bar.
+    :ivar Forecaster forecaster: The model predicting the prices.
+    :ivar float speed: The replay speed relative to the time between the bars, None to replay as fast as possible.
+    """
+
+    def __init__(self, data, predict_len, forecaster=None, speed=None):
+        """
+        Initialize the ReplaySource class.
+        :param data: The data to replay (pd.DataFrame or OhlcvColumns), with columns 'unix' and 'close'.
+        :param int predict_len: The number of timesteps predicted with every bar.
+        :param Forecaster forecaster: The model predicting the prices, the true future prices if None.
+        :param float speed: The replay speed relative to the time between the bars (e.g. 60 replays minute bars at one
+            bar per second), None to replay as fast as possible.
+        """
+        super().__init__()
+
+        self.data = data
+        self.predict_len = predict_len
+        self.forecaster = forecaster if forecaster is not None else OracleForecaster()
+        self.speed = speed
+
+    def __iter__(self):
+        """
+        Yield the bars, as (bar, predict_prices, predict_dates), the last bar of the data only closing the replay
+        with predict_prices None.
+        """
+        columns = {col: np.asarray(self.data[col]) for col in self.data.columns}
+        dates = columns['unix']
+        predictions = self.forecaster.forecast(self.data, self.predict_len)
+        n_steps = len(dates)
+
+        start = time.perf_counter()
+        for i in range(n_steps):
+            if self.speed:
+                # Wait for the time of the bar, relative to the first one
+                delay = (dates[i] - dates[0]) / self.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            bar = {col: values[i] for col, values in columns.items()}
+            if i == n_steps - 1:
+                yield bar, None, None
+            else:
+                yield bar, predictions[i + 1], dates[i + 1:i + 1 + self.predict_len]
+
+    def run(self, optimizer):
+        """
+        Replay the data through an optimizer, and measure the time it takes to process every bar.
+        :param Optimizer optimizer: The optimizer, with the same prediction length.
+        :return np.ndarray: The latency of every bar, in seconds.
+        """
+        latencies = np.empty(max(len(self.data) - 1, 0))
+        for i, (bar, predict_prices, predict_dates) in enumerate(self):
+            if predict_prices is None:
+                optimizer.close(bar)
+                break
+            bar_start = time.perf_counter()
+            optimizer.on_bar(bar, predict_prices, predict_dates)
+            latencies[i] = time.perf_counter() - bar_start
+        return latencies
+
+
+def latency_stats(latencies):
+    """
+    Summarize the latencies of a replay.
+    :param np.ndarray latencies: The latency of every bar, in seconds.
+    :return dict: The number of bars, and the mean, median, 99th percentile and maximum latencies, in microseconds.
+    """
+    latencies = 1e6 * np.asarray(latencies)
+    return {
+        'bars': len(latencies),
+        'mean_us': float(latencies.mean()),
+        'p50_us': float(np.percentile(latencies, 50)),
+        'p99_us': float(np.percentile(latencies, 99)),
+        'max_us': float(latencies.max()),
+    }
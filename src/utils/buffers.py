@@ -0,0 +1,99 @@
+import numpy as np
+
+
+class GrowableArray:
+    """
+    A typed NumPy array with amortized O(1) appends, which doubles its capacity when it is full.
+    Reads go through zero-copy views of the filled part.
+    """
+    __slots__ = ('_data', '_size')
+
+    def __init__(self, dtype=np.float64, capacity=16):
+        """
+        Initialize the GrowableArray class.
+        :param dtype: The type of the values.
+        :param int capacity: The initial number of values that can be held without growing.
+        """
+        self._data = np.empty(max(capacity, 1), dtype=dtype)
+        self._size = 0
+
+    def append(self, value):
+        if self._size == len(self._data):
+            self._data = np.concatenate([self._data, np.empty_like(self._data)])
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values):
+        values = np.asarray(values)
+        size = self._size + len(values)
+        if size > len(self._data):
+            grown = np.empty(max(size, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:size] = values
+        self._size = size
+
+    @property
+    def values(self):
+        """
+        A zero-copy view of the values.
+        """
+        return self._data[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.values if dtype is None else self.values.astype(dtype)
+
+
+class RingBuffer:
+    """
+    A typed NumPy array keeping the last values appended, in O(1) per append whatever the number of appends.
+    Every value is written twice, capacity apart, so that the last values always are a contiguous zero-copy view.
+    """
+    __slots__ = ('_data', '_capacity', '_size', '_end')
+
+    def __init__(self, capacity, dtype=np.float64):
+        """
+        Initialize the RingBuffer class.
+        :param int capacity: The number of values kept.
+        :param dtype: The type of the values.
+        """
+        if capacity < 1:
+            raise ValueError('The capacity must be a positive integer.')
+        self._data = np.empty(2 * capacity, dtype=dtype)
+        self._capacity = capacity
+        self._size = 0
+        self._end = 0
+
+    def append(self, value):
+        position = self._end % self._capacity
+        self._data[position] = value
+        self._data[position + self._capacity] = value
+        self._end = position + 1
+        self._size = min(self._size + 1, self._capacity)
+
+    @property
+    def values(self):
+        """
+        A zero-copy view of the last values, oldest first.
+        """
+        if self._size < self._capacity:
+            return self._data[:self._size]
+        return self._data[self._end:self._end + self._capacity]
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __array__(self, dtype=None, copy=None):
+        return self.values if dtype is None else self.values.astype(dtype)
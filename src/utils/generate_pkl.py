@@ -1,8 +1,14 @@
+import os
 from src.dataset import TsData
+from src.ingest import ingest
 
-def generate_pickle(csv_dir_list, save_path):
-    # Load the data
-    crypto_data = TsData(csv_dir_list=csv_dir_list, sampling=60*24)
+def generate_pickle(csv_dir_list, save_path, store_dir=None, resolution='1d'):
+    # Ingest the new csv files into the store of the raw sources, next to the pickle file by default
+    store_dir = store_dir or os.path.join(os.path.dirname(save_path), 'sources.store')
+    ingest(csv_dir_list, store_dir, verbose=True)
+
+    # Load the bars of the resolution, precomputed by the ingestion
+    crypto_data = TsData(store_dir=store_dir, resolution=resolution)
     
     # Print the data
     crypto_data.print_data()
@@ -16,6 +22,13 @@ def generate_pickle(csv_dir_list, save_path):
     # Verify the pickle file can be loaded
     TsData(pickle_file=save_path)
 
+    # Save the data as a columnar store next to the pickle file
+    store_path = os.path.splitext(save_path)[0] + '.store'
+    crypto_data.save_store(store_path)
+
+    # Verify the store can be loaded
+    TsData(store_dir=store_path)
+
 if __name__ == '__main__':
     # Define the paths to the original csv files
     csv_dir_list=['/root/data/crypto/sources/cryptoarchive',
@@ -27,4 +40,4 @@ if __name__ == '__main__':
     save_path='/root/data/crypto/BTCj-2017001-2024096.pkl'
     
     # Generate the pickle file
-    generate_pickle(csv_dir_list, save_path)
\ No newline at end of file
+    generate_pickle(csv_dir_list, save_path)
@@ -25,7 +25,7 @@ def plot_situation(data, portfolio:Portfolio, predict_len, hold_fig=True, save_p
 
     # Plot the portfolio returns percentage in the same subplot
     ax2 = ax1.twinx()  # Second y-axis
-    portfolio_returns_pct_list = [returns / portfolio.initial_cash for returns in portfolio.portfolio_returns_list]
+    portfolio_returns_pct_list = portfolio.portfolio_returns_list / portfolio.initial_cash
     ax2.plot(pd.to_datetime(data['unix'], unit='s'), portfolio_returns_pct_list, color='tab:red', label='Portfolio Returns')
     ax2.set_ylabel('Value (% of invest)', color='tab:red')
     
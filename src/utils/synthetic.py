@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+def synthetic_ohlcv(n_bars, seed=0, interval=60, start=1700000000, price=20000.0, volatility=0.002):
+    """
+    Generate seeded OHLCV bars following a geometric random walk, e.g. to test or benchmark without the real data.
+    Every bar opens at the previous close, and its high and low spread around its open and close prices.
+    :param int n_bars: The number of bars.
+    :param int seed: The seed of the random generator, the same seed giving the same bars.
+    :param int interval: The interval between the bars, in seconds.
+    :param int start: The unix timestamp of the first bar.
+    :param float price: The first close price.
+    :param float volatility: The standard deviation of the log returns of a bar.
+    :return pd.DataFrame: The bars, with columns 'unix', 'open', 'high', 'low', 'close', 'volume'.
+    """
+    rng = np.random.default_rng(seed)
+    close = price * np.exp(np.cumsum(rng.normal(0, volatility, n_bars)))
+    open_ = np.empty(n_bars)
+    open_[:1] = price
+    open_[1:] = close[:-1]
+    wick = rng.uniform(0, volatility, (2, n_bars))
+    return pd.DataFrame({
+        'unix': start + interval * np.arange(n_bars, dtype=np.int64),
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + wick[0]),
+        'low': np.minimum(open_, close) * (1 - wick[1]),
+        'close': close,
+        'volume': rng.uniform(0, 10, n_bars),
+    })
+
+
+def write_synthetic_csv(csv_dir, n_bars, n_files=4, seed=0, **kwargs):
+    """
+    Write seeded OHLCV bars as CSV files of a source directory, split by time as the exchange exports.
+    :param str csv_dir: The directory of the CSV files, created if needed.
+    :param int n_bars: The total number of bars.
+    :param int n_files: The number of CSV files.
+    :param int seed: The seed of the random generator.
+    :param kwargs: Other keyword arguments of synthetic_ohlcv.
+    :return list: The paths of the CSV files.
+    """
+    os.makedirs(csv_dir, exist_ok=True)
+    data = synthetic_ohlcv(n_bars, seed=seed, **kwargs)
+    paths = []
+    for i, part in enumerate(np.array_split(np.arange(n_bars), n_files)):
+        path = os.path.join(csv_dir, f'synthetic-{i:03d}.csv')
+        data.iloc[part].to_csv(path, index=False)
+        paths.append(path)
+    return paths
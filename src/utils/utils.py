@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 
@@ -7,6 +8,16 @@ def unix2dt(unix_time):
     """
     return pd.to_datetime(unix_time, unit='s')
 
+def progress(iterable, verbose=True):
+    """
+    Wrap an iterable in a progress bar if verbose, importing tqdm only then.
+    """
+    if not verbose:
+        return iterable
+    from tqdm import tqdm
+
+    return tqdm(iterable)
+
 def cash2qty(cash, entry_price, fee):
     """
     Compute the quantity of the asset that can be bought with the cash.
@@ -40,3 +51,33 @@ def compute_returns(entry_cash, quantity_held, exit_price, exit_fee):
     """
     returns = qty2cash(quantity_held, exit_price, exit_fee) - entry_cash
     return returns
+
+def rolling_forward_argmax(values, window):
+    """
+    Compute the index of the maximum of values[i:i + window] for every i, truncated at the end of the values.
+    Ties resolve to the first occurrence, as list.index(max(...)). Vectorized with a sparse-table doubling:
+    O(n log(window)) time and O(n) memory, then every horizon query is a single lookup.
+    :param np.ndarray values: The values, e.g. the close prices.
+    :param int window: The length of the forward window, e.g. the prediction length.
+    :return np.ndarray: The absolute index of the forward maximum for every position.
+    """
+    if window < 1:
+        raise ValueError('The window must be a positive integer.')
+
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+
+    # Pad so that the windows near the end are truncated
+    padded = np.concatenate([values, np.full(window, -np.inf)])
+
+    # Double the span of the argmax until it covers half the window: argmax[i] over padded[i:i + span]
+    argmax = np.arange(len(padded))
+    span = 1
+    while span * 2 <= window:
+        left, right = argmax[:len(argmax) - span], argmax[span:]
+        argmax = np.where(padded[left] >= padded[right], left, right)
+        span *= 2
+
+    # Combine the two overlapping spans covering [i, i + window)
+    left, right = argmax[:n], argmax[window - span:window - span + n]
+    return np.where(padded[left] >= padded[right], left, right)
@@ -0,0 +1,145 @@
+import math
+import numpy as np
+import pandas as pd
+from src.search import PARAMETERS
+
+# Schemes of the walk-forward splits
+SPLIT_SCHEMES = ('rolling', 'expanding', 'fixed', 'random')
+
+
+def walk_forward_splits(n_bars, n_splits, test_bars, train_bars=0, scheme='rolling', seed=0):
+    """
+    Split a dataset window in train and test windows, as (start, end) slices of the window.
+        - 'rolling': train windows of train_bars, each followed by its test window, moving forward by test_bars so that
+          the last test window ends at the last bar.
+        - 'expanding': the same test windows, every train window starting at the first bar.
+        - 'fixed': the same train window, the first train_bars, followed by n_splits consecutive test windows.
+        - 'random': test windows starting at seeded random bars, each preceded by a train window of train_bars.
+    :param int n_bars: The number of bars of the dataset window.
+    :param int n_splits: The number of train and test windows.
+    :param int test_bars: The number of bars of every test window.
+    :param int train_bars: The number of bars of every train window (the shortest one if expanding), 0 for no training.
+    :param str scheme: The scheme of the splits, one of SPLIT_SCHEMES.
+    :param int seed: The seed of the random test windows.
+    :return list: The (train, test) slices of every split, the train slice being None without training.
+    """
+    if scheme not in SPLIT_SCHEMES:
+        raise ValueError(f'Unknown split scheme {scheme}, expected one of {SPLIT_SCHEMES}.')
+
+    if scheme == 'fixed':
+        test_starts = [train_bars + i * test_bars for i in range(n_splits)]
+    elif scheme == 'random':
+        n_starts = n_bars - test_bars - train_bars + 1
+        if n_starts < n_splits:
+            raise ValueError(f'{n_bars} bars cannot hold {n_splits} distinct random windows of {train_bars} + {test_bars} bars.')
+        rng = np.random.default_rng(seed)
+        test_starts = sorted(train_bars + int(start) for start in rng.choice(n_starts, size=n_splits, replace=False))
+    else:
+        test_starts = [n_bars - (n_splits - i) * test_bars for i in range(n_splits)]
+
+    if test_starts and (test_starts[0] < train_bars or test_starts[-1] + test_bars > n_bars):
+        raise ValueError(f'{n_bars} bars cannot hold {n_splits} {scheme} splits of {train_bars} + {test_bars} bars.')
+
+    splits = []
+    for test_start in test_starts:
+        if not train_bars:
+            train = None
+        elif scheme == 'expanding':
+            train = (0, test_start)
+        elif scheme == 'fixed':
+            train = (0, train_bars)
+        else:
+            train = (test_start - train_bars, test_start)
+        splits.append((train, (test_start, test_start + test_bars)))
+    return splits
+
+
+def split_windows(splits, param_combinations):
+    """
+    Get the train windows to evaluate for walk-forward splits: they are only needed to pick one of several combinations.
+    :param list splits: The (train, test) slices of every split, see walk_forward_splits().
+    :param list param_combinations: The parameter combinations, as tuples ordered as PARAMETERS.
+    :return list: The distinct train windows, in order of appearance, none without training or with a single combination.
+    """
+    if len(param_combinations) < 2:
+        return []
+    return list(dict.fromkeys(train for train, _ in splits if train is not None))
+
+
+def pick_combinations(returns, splits, param_combinations):
+    """
+    Pick the best combination of every train window.
+    Without training, or with a single combination, the first combination is picked for every split.
+    :param dict returns: The returns of every combination on every train window, by (window, combination).
+    :param list splits: The (train, test) slices of every split, see walk_forward_splits().
+    :param list param_combinations: The parameter combinations, as tuples ordered as PARAMETERS.
+    :return list: The picked combination of every split.
+    """
+    picks = []
+    for train, _ in splits:
+        best = param_combinations[0]
+        if train is not None and len(param_combinations) > 1:
+            # The first of the best combinations on ties
+            best = max(param_combinations, key=lambda params: returns[(train, params)])
+        picks.append(best)
+    return picks
+
+
+def picked_evaluations(splits, picks):
+    """
+    Get the evaluations of the test windows: the combination picked for a split is the only one its test window needs.
+    :param list splits: The (train, test) slices of every split, see walk_forward_splits().
+    :param list picks: The picked combination of every split, see pick_combinations().
+    :return list: The (test window, combinations) pairs, every test window appearing once, with distinct combinations.
+    """
+    evaluations = {}
+    for (_, test), best in zip(splits, picks):
+        evaluations.setdefault(test, {})[best] = None
+    return [(test, list(combinations)) for test, combinations in evaluations.items()]
+
+
+def select_walk_forward(returns, splits, picks):
+    """
+    Get the returns of the combination picked for every split on its train and test windows.
+    :param dict returns: The returns of the evaluated combinations on the evaluated windows, by (window, combination).
+    :param list splits: The (train, test) slices of every split, see walk_forward_splits().
+    :param list picks: The picked combination of every split, see pick_combinations().
+    :return pd.DataFrame: One row per split, with its windows, the picked combination, and its train and test returns.
+    """
+    rows = []
+    for i, ((train, test), best) in enumerate(zip(splits, picks)):
+        rows.append({
+            'split': i,
+            'train_start': train[0] if train is not None else math.nan,
+            'train_end': train[1] if train is not None else math.nan,
+            'test_start': test[0],
+            'test_end': test[1],
+            **dict(zip(PARAMETERS, best)),
+            'train_returns': returns.get((train, best), math.nan),
+            'test_returns': returns[(test, best)],
+        })
+    return pd.DataFrame(rows)
+
+
+def summarize_walk_forward(splits_frame):
+    """
+    Aggregate the test returns of walk-forward splits.
+    The efficiency compares the returns per bar on the test windows to those on the train windows, the combinations
+    picked in-sample keeping their returns out-of-sample around 1.
+    :param pd.DataFrame splits_frame: The splits, see select_walk_forward().
+    :return dict: The number of splits, the total, mean, median, standard deviation and minimum of the test returns,
+        the fraction of profitable test windows, and the efficiency (NaN without training).
+    """
+    test_returns = splits_frame['test_returns']
+    test_per_bar = (test_returns / (splits_frame['test_end'] - splits_frame['test_start'])).mean()
+    train_per_bar = (splits_frame['train_returns'] / (splits_frame['train_end'] - splits_frame['train_start'])).mean()
+    return {
+        'splits': len(splits_frame),
+        'total_test_returns': test_returns.sum(),
+        'mean_test_returns': test_returns.mean(),
+        'median_test_returns': test_returns.median(),
+        'std_test_returns': test_returns.std(),
+        'min_test_returns': test_returns.min(),
+        'profitable_splits': (test_returns > 0).mean(),
+        'efficiency': test_per_bar / train_per_bar if train_per_bar > 0 else math.nan,
+    }
@@ -0,0 +1,36 @@
+import itertools
+import unittest
+import numpy as np
+from src.batch import BatchOptimizer
+from test_optimizer import make_data, run_engine
+
+
+class TestBatchOptimizer(unittest.TestCase):
+    """
+    A Unittest class to test the batch simulation of many parameter sets.
+    """
+    def setUp(self):
+        self.data = make_data(400, seed=1)
+        self.param_sets = list(itertools.product([2000.0, 5000.0], [0.0, 0.05], [0.001, 0.0005], [0.0, 0.5, 5.0], [-0.002, -0.05]))
+
+    def test_matches_optimizer(self):
+        init_cash, init_crypto, fee, min_expected_returns, stop_loss = zip(*self.param_sets)
+        batch = BatchOptimizer(30, init_cash, init_crypto, fee, min_expected_returns, stop_loss, record_history=True)
+        batch.iterate_policy(self.data)
+
+        self.assertGreater((batch.trades > 0).mean(), 0.5)
+        for i, (cash, crypto, fee, min_expected_returns, stop_loss) in enumerate(self.param_sets):
+            portfolio = run_engine(self.data, 'numpy', predict_len=30, fee=fee, min_expected_returns=min_expected_returns,
+                                   stop_loss=stop_loss, init_cash=cash, init_crypto=crypto)
+            self.assertEqual(list(batch.portfolio_value_history[:, i]), list(portfolio.portfolio_value_list))
+            self.assertEqual(batch.portfolio_returns[i], portfolio.portfolio_returns_list[-1])
+            self.assertEqual(batch.trades[i], portfolio.trades)
+            self.assertEqual(batch.cash[i], portfolio.cash)
+            self.assertEqual(batch.crypto[i], 0.0)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from src.benchmark import bench_import, compare, load_results, run_suite, save_results
+from src.utils.synthetic import synthetic_ohlcv, write_synthetic_csv
+
+
+class TestBenchmark(unittest.TestCase):
+    """
+    A Unittest class to test the benchmark suite and its synthetic data.
+    """
+    def test_synthetic_ohlcv(self):
+        data = synthetic_ohlcv(1000, seed=1)
+        self.assertTrue(data.equals(synthetic_ohlcv(1000, seed=1)))
+        self.assertFalse(data.equals(synthetic_ohlcv(1000, seed=2)))
+        self.assertTrue((data['high'] >= data[['open', 'close']].max(axis=1)).all())
+        self.assertTrue((data['low'] <= data[['open', 'close']].min(axis=1)).all())
+        self.assertTrue((np.diff(data['unix']) == 60).all())
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = write_synthetic_csv(tmp_dir, 1000, n_files=3, seed=1)
+            self.assertEqual(len(paths), 3)
+
+    def test_run_suite(self):
+        results = run_suite([300], [10], verbose=False)
+        names = set(results['benchmarks'])
+        self.assertEqual(names, {'simulation/numpy/300/pl10', 'simulation/kernel/300/pl10', 'simulation/pandas/300/pl10',
+                                 'grid_search/300/pl10', 'loading/csv/300', 'loading/store/300',
+                                 'gaps/300'})
+        simulation = results['benchmarks']['simulation/numpy/300/pl10']
+        self.assertGreater(simulation['steps_per_sec'], 0)
+        self.assertGreater(simulation['peak_mb'], 0)
+        self.assertIn('policy', simulation['components'])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'results.json')
+            save_results(results, path)
+            self.assertEqual(load_results(path)['benchmarks'].keys(), results['benchmarks'].keys())
+
+    def test_bench_import(self):
+        # The command line and the worker processes start without the plotting libraries
+        self.assertEqual(bench_import('main', repeat=1)['heavy_imports'], [])
+        simulation = bench_import('src.simulation', repeat=1)
+        self.assertNotIn('matplotlib', simulation['heavy_imports'])
+        self.assertGreater(simulation['import_sec'], 0)
+
+    def test_compare(self):
+        baseline = {'benchmarks': {'a': {'steps_per_sec': 100.0, 'peak_mb': 10.0}, 'b': {'rows_per_sec': 50.0}}}
+        results = {'benchmarks': {'a': {'steps_per_sec': 70.0, 'peak_mb': 11.0}, 'b': {'rows_per_sec': 45.0},
+                                  'c': {'steps_per_sec': 1.0}}}
+        regressions = compare(results, baseline, threshold=0.2)
+        self.assertEqual([(regression['benchmark'], regression['metric']) for regression in regressions],
+                         [('a', 'steps_per_sec')])
+        self.assertAlmostEqual(regressions[0]['change'], -0.3)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
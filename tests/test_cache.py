@@ -0,0 +1,73 @@
+import os
+import pickle
+import tempfile
+import unittest
+from multiprocessing import get_context
+import numpy as np
+import pandas as pd
+from src import cache
+from src.cache import SharedDataset, attach_dataset, dataset_key, load_dataset, publish_dataset
+
+
+def close_sum(key):
+    return float(load_dataset(*key)['close'].sum())
+
+
+class TestCache(unittest.TestCase):
+    """
+    A Unittest class to test the process-level dataset cache.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pickle_file = os.path.join(self.tmp_dir.name, 'data.pkl')
+        self.data = pd.DataFrame({
+            'unix': 1700000000 + 60 * np.arange(100),
+            'open': np.arange(100, dtype=float),
+            'high': np.arange(100, dtype=float),
+            'low': np.arange(100, dtype=float),
+            'close': np.arange(100, dtype=float),
+            'volume': np.ones(100),
+        })
+        with open(self.pickle_file, 'wb') as f:
+            pickle.dump(self.data, f)
+        self.key = dataset_key(self.pickle_file, -1 - 50, -1)
+
+    def test_load_once(self):
+        columns = load_dataset(*self.key)
+        self.assertEqual(len(columns), 50)
+        self.assertEqual(columns['close'][-1], 98.0)
+        self.assertIs(load_dataset(*self.key), columns)
+        self.assertFalse(columns['close'].flags.writeable)
+
+    def test_publish_attach(self):
+        shared = publish_dataset(*self.key)
+        try:
+            attached = SharedDataset.attach(shared.handle)
+            close = attached.columns()['close']
+            self.assertTrue(np.array_equal(close, load_dataset(*self.key)['close']))
+            self.assertFalse(close.flags.writeable)
+            del close
+            attached.close()
+        finally:
+            shared.close()
+
+    def test_workers_attach(self):
+        shared = publish_dataset(*self.key)
+        # The workers must not be able to load the pickle: they read the shared memory
+        os.remove(self.pickle_file)
+        try:
+            with get_context('spawn').Pool(2, initializer=attach_dataset, initargs=(shared.handle, self.key)) as pool:
+                self.assertEqual(pool.map(close_sum, [self.key] * 4), [float(np.arange(49, 99).sum())] * 4)
+        finally:
+            shared.close()
+
+    def tearDown(self):
+        cache._datasets.clear()
+        self.tmp_dir.cleanup()
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
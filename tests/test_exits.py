@@ -0,0 +1,67 @@
+import unittest
+from src.exits import ExitScheduler
+from src.forecast import OracleForecaster
+from src.position import Position
+from test_optimizer import make_data, run_engine
+
+
+class UncheckedOracleForecaster(OracleForecaster):
+    """
+    The true future prices, without letting the optimizer index the exits: every position is checked at every timestep.
+    """
+    consistent = False
+
+
+def make_position(date, price, scheduled_exit_date, stop_loss=-0.01, fee=0.001):
+    position = Position()
+    position.buy(date, price, 300.0, fee, scheduled_exit_date=scheduled_exit_date, scheduled_exit_price=price * 1.01,
+                 scheduled_exit_returns=1.0, stop_loss=stop_loss)
+    return position
+
+
+class TestExits(unittest.TestCase):
+    """
+    A Unittest class to test the event-driven exits of the optimizer.
+    """
+    def test_due(self):
+        exits = ExitScheduler(0.001)
+        early = make_position(0, 100.0, scheduled_exit_date=5)
+        late = make_position(1, 100.0, scheduled_exit_date=20)
+        high = make_position(2, 120.0, scheduled_exit_date=30)
+        for position in [early, late, high]:
+            exits.add(position)
+
+        # Nothing is due before the first scheduled exit, while the price stays above the stops
+        self.assertEqual(exits.due(3, 119.5), [])
+
+        # The scheduled exit of the first position, and the stop of the last one bought
+        self.assertEqual(exits.due(5, 115.0), [early, high])
+
+        # A sold position is never due again, a rescheduled one only at its new date
+        exits.remove(high)
+        early.update_scheduled_exit(25, 101.0, 1.0)
+        exits.reschedule(early)
+        self.assertEqual(exits.due(20, 110.0), [late])
+        self.assertEqual(exits.due(25, 110.0), [early])
+        self.assertEqual(len(exits), 2)
+
+    def test_parity(self):
+        data = make_data(2000, seed=5)
+        for min_expected_returns, stop_loss in [(0.5, -0.005), (1.0, None), (-0.5, -0.002)]:
+            reference = run_engine(data, 'numpy', predict_len=40, fee=0.001, min_expected_returns=min_expected_returns,
+                                   stop_loss=stop_loss, forecaster=UncheckedOracleForecaster())
+            indexed = run_engine(data, 'numpy', predict_len=40, fee=0.001, min_expected_returns=min_expected_returns,
+                                 stop_loss=stop_loss)
+
+            self.assertGreater(reference.trades, 0)
+            self.assertEqual(list(reference.portfolio_value_list), list(indexed.portfolio_value_list))
+            self.assertEqual(reference.trades, indexed.trades)
+            self.assertEqual(reference.cash, indexed.cash)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+from src.fees import FeeSchedule, sell_fees, buy_fees
+
+
+class TestFeeSchedule(unittest.TestCase):
+    """
+    A Unittest class to test the FeeSchedule class.
+    """
+    def setUp(self):
+        self.unix = 1700000000 + 60 * np.arange(10)
+
+    def test_constant(self):
+        fees = FeeSchedule(0.001).bind(self.unix)
+        self.assertEqual(len(fees), 10)
+        self.assertEqual(fees[-1], 0.001)
+        self.assertEqual(fees.buy_fee[3], 0.001)
+        # A constant fee is broadcast, not copied
+        self.assertEqual(fees.sell_fee.strides, (0,))
+
+    def test_sell_buy(self):
+        fees = FeeSchedule(sell_fee=0.004, buy_fee=0.006).bind(self.unix)
+        self.assertEqual(fees[0], 0.004)
+        self.assertEqual(buy_fees(fees)[0], 0.006)
+        self.assertEqual(sell_fees(fees)[0], 0.004)
+
+    def test_array_and_callable(self):
+        fees = FeeSchedule(np.linspace(0.001, 0.002, 10), lambda unix: np.where(unix < self.unix[5], 0.01, 0.02)).bind(self.unix)
+        self.assertEqual(fees[9], 0.002)
+        self.assertEqual(fees.buy_fee[4], 0.01)
+        self.assertEqual(fees.buy_fee[5], 0.02)
+
+    def test_window(self):
+        fees = FeeSchedule(np.arange(10, dtype=float)).bind(self.unix)
+        window = fees.window(3, 6)
+        self.assertEqual(len(window), 3)
+        self.assertEqual(window[-1], 5.0)
+        self.assertTrue(np.shares_memory(window.sell_fee, fees.sell_fee))
+
+    def test_wrong_length(self):
+        with self.assertRaises(ValueError):
+            FeeSchedule(np.zeros(3)).bind(self.unix)
+
+    def test_plain_list(self):
+        self.assertEqual(buy_fees([0.1, 0.2])[-1], 0.2)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import unittest
+import numpy as np
+from src.fills import FillEngine, intrabar_fills
+from src.optimizer import Optimizer
+from src.policy import Policy
+from src.portfolio import Portfolio
+from src.stream import ReplaySource
+from test_optimizer import make_data
+
+
+def make_bars(n_steps, seed=0):
+    """
+    Generate random OHLCV data whose high and low spread around the open and close prices.
+    """
+    data = make_data(n_steps, seed=seed)
+    rng = np.random.default_rng(seed)
+    data['open'] = data['close'].shift(1).fillna(data['close'].iloc[0]).to_numpy()
+    body_high = np.maximum(data['open'], data['close'])
+    body_low = np.minimum(data['open'], data['close'])
+    data['high'] = body_high * (1 + rng.uniform(0, 0.003, n_steps))
+    data['low'] = body_low * (1 - rng.uniform(0, 0.003, n_steps))
+    return data
+
+
+def run_intrabar(data, engine, take_profit=0.004, max_exposure=None, slippage=0.001):
+    portfolio = Portfolio(cash=5000.0, crypto=0.0)
+    policy = Policy(min_expected_returns=0.5, stop_loss=-0.003, take_profit=take_profit, max_exposure=max_exposure)
+    optimizer = Optimizer(portfolio, policy, 30, fee=0.001, intrabar=True, slippage=slippage)
+    if engine == 'numpy':
+        optimizer.iterate_policy_numpy(data)
+    else:
+        optimizer.iterate_policy(data)
+    return portfolio
+
+
+class TestFills(unittest.TestCase):
+    """
+    A Unittest class to test the intrabar fills of the stop loss and take profit orders.
+    """
+    def test_intrabar_fills(self):
+        stop_prices = np.array([95.0, 95.0, 95.0, 95.0, -np.inf])
+        take_profit_prices = np.array([110.0, 110.0, 110.0, 104.0, 102.0])
+        bar_open = np.array([100.0, 90.0, 100.0, 105.0, 100.0])
+        bar_high = np.array([105.0, 100.0, 111.0, 106.0, 103.0])
+        bar_low = np.array([96.0, 89.0, 94.0, 94.0, 50.0])
+
+        filled, fill_prices = intrabar_fills(stop_prices, take_profit_prices, bar_open, bar_high, bar_low, slippage=0.01)
+
+        # Untouched, gap under the stop, both orders (stop first), gap over the take profit, take profit only
+        self.assertEqual(list(filled), [False, True, True, True, True])
+        self.assertTrue(np.isnan(fill_prices[0]))
+        np.testing.assert_allclose(fill_prices[1:], [90.0 * 0.99, 95.0 * 0.99, 105.0, 102.0])
+
+    def test_fill_engine(self):
+        portfolio = Portfolio(cash=5000.0, crypto=0.0)
+        fills = FillEngine()
+        for date, take_profit in enumerate([None, 0.05]):
+            portfolio.buy(date, 100.0, 1000.0, 0.0, stop_loss=-0.02, take_profit=take_profit)
+            fills.add(next(reversed(portfolio.open_positions)))
+
+        # Only the take profit of the second position is reached
+        filled = fills.fill(100.0, 106.0, 99.0, 0.0)
+        self.assertEqual([(position.entry_date, price) for position, price in filled], [(1, 105.0)])
+        self.assertEqual(len(fills), 1)
+
+    def test_engine_parity(self):
+        data = make_bars(600, seed=2)
+        reference = run_intrabar(data, 'pandas', max_exposure=0.3)
+        portfolio = run_intrabar(data, 'numpy', max_exposure=0.3)
+
+        self.assertGreater(reference.trades, 0)
+        self.assertEqual(list(reference.portfolio_value_list), list(portfolio.portfolio_value_list))
+        self.assertEqual(reference.trades, portfolio.trades)
+
+        # Some positions were filled between the low and the high of their last bar
+        closed = portfolio.ledger.to_frame()
+        exit_close = data.set_index('unix').loc[closed['exit_date'], 'close'].to_numpy()
+        self.assertTrue((closed['exit_price'].to_numpy() != exit_close).any())
+
+    def test_replay_parity(self):
+        data = make_bars(400, seed=4)
+        reference = run_intrabar(data, 'numpy')
+        portfolio = Portfolio(cash=5000.0, crypto=0.0)
+        policy = Policy(min_expected_returns=0.5, stop_loss=-0.003, take_profit=0.004)
+        ReplaySource(data, 30).run(Optimizer(portfolio, policy, 30, fee=0.001, intrabar=True, slippage=0.001))
+
+        self.assertEqual(list(reference.portfolio_value_list), list(portfolio.portfolio_value_list))
+        self.assertEqual(reference.trades, portfolio.trades)
+
+    def test_take_profit_and_exposure(self):
+        data = make_bars(600, seed=2)
+        portfolio = Portfolio(cash=5000.0, crypto=0.0)
+        policy = Policy(min_expected_returns=0.5, stop_loss=-0.003, take_profit=0.004, max_exposure=0.2)
+        Optimizer(portfolio, policy, 30, fee=0.001).iterate_policy_numpy(data)
+
+        # At the close price, a position is sold at the first close where its returns reach the take profit
+        closed = portfolio.ledger.to_frame()
+        self.assertTrue((closed['take_profit'] == 0.004).all())
+        close = data.set_index('unix')['close']
+        for _, position in closed.iterrows():
+            held = close[(close.index > position['entry_date']) & (close.index < position['exit_date'])].to_numpy()
+            returns_pct = position['quantity'] * held * (1 - 0.001) / position['entry_cash'] - 1
+            self.assertTrue((returns_pct < 0.004).all())
+
+        # The exposure limit bounds the cash invested at once
+        invested = [sum(row['entry_cash'] for _, row in closed.iterrows()
+                        if row['entry_date'] <= date < row['exit_date']) for date in data['unix']]
+        self.assertLessEqual(max(invested), 0.2 * 5000.0 * 1.1)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from src.batch import BatchOptimizer
+from src.forecast import CachedForecaster, Forecaster, OracleForecaster, load_forecaster
+from test_optimizer import make_data, run_engine
+
+
+class NoisyForecaster(Forecaster):
+    """
+    A forecaster predicting the true future prices with some noise, counting its batches.
+    """
+    model_id = 'noisy'
+
+    def __init__(self, batch_size=64):
+        super().__init__(batch_size)
+        self.batches = 0
+
+    def predict_batch(self, data, steps, predict_len):
+        self.batches += 1
+        prices = np.asarray(data['close'])
+        horizon = np.minimum(steps[:, None] + np.arange(predict_len), len(prices) - 1)
+        noise = np.random.default_rng(steps[0]).normal(0, 5, horizon.shape)
+        return prices[horizon] + noise
+
+
+class TestForecast(unittest.TestCase):
+    """
+    A Unittest class to test the forecasters and their prediction matrices.
+    """
+    def setUp(self):
+        self.data = make_data(300, seed=2)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def test_oracle(self):
+        oracle = OracleForecaster()
+        predictions = oracle.forecast(self.data, 20)
+        close = self.data['close'].to_numpy()
+        self.assertEqual(predictions.shape, (300, 20))
+        self.assertTrue(np.array_equal(predictions[10], close[10:30]))
+        self.assertTrue(np.array_equal(predictions[290, :10], close[290:]))
+        self.assertTrue(np.isnan(predictions[290, 10:]).all())
+        self.assertTrue(np.array_equal(oracle.best_exits(predictions), Forecaster.best_exits(oracle, predictions)))
+
+    def test_batches(self):
+        forecaster = NoisyForecaster()
+        predictions = forecaster.forecast(self.data, 20)
+        self.assertEqual(forecaster.batches, 5)
+        self.assertTrue(np.isnan(predictions[-1, 1:]).all())
+        self.assertFalse(np.isnan(predictions[-1, 0]))
+
+    def test_cache(self):
+        forecaster = NoisyForecaster()
+        cached = CachedForecaster(forecaster, 'data-id', cache_dir=self.tmp_dir.name)
+        predictions = cached.forecast(self.data, 20)
+        self.assertTrue(os.path.exists(cached.cache_path(20)))
+
+        # Served from the disk
+        self.assertTrue(np.array_equal(cached.forecast(self.data, 20), predictions, equal_nan=True))
+        self.assertEqual(forecaster.batches, 5)
+
+        # Another window is another key
+        self.assertNotEqual(CachedForecaster(forecaster, 'other-id', self.tmp_dir.name).cache_path(20), cached.cache_path(20))
+
+    def test_load_forecaster(self):
+        self.assertIsInstance(load_forecaster('oracle'), OracleForecaster)
+        self.assertIsInstance(load_forecaster('test_forecast:NoisyForecaster'), NoisyForecaster)
+        self.assertIsInstance(load_forecaster('src.forecast.OracleForecaster'), OracleForecaster)
+        for name in ('noisy', 'src.forecast:CachedForecaster', 'src.forecast:load_forecaster'):
+            with self.assertRaises((ValueError, TypeError)):
+                load_forecaster(name)
+
+    def test_engines_parity(self):
+        kwargs = dict(predict_len=20, fee=0.001, min_expected_returns=0.5, stop_loss=-0.005)
+        reference = run_engine(self.data, 'pandas', forecaster=NoisyForecaster(), **kwargs)
+        portfolio = run_engine(self.data, 'numpy', forecaster=NoisyForecaster(), **kwargs)
+        self.assertGreater(reference.trades, 0)
+        self.assertEqual(list(reference.portfolio_value_list), list(portfolio.portfolio_value_list))
+        self.assertEqual(reference.trades, portfolio.trades)
+
+        batch = BatchOptimizer(20, [5000.0], [0.0], [0.001], [0.5], [-0.005], forecaster=NoisyForecaster())
+        batch.iterate_policy(self.data)
+        self.assertEqual(batch.trades[0], portfolio.trades)
+        self.assertEqual(batch.cash[0], portfolio.cash)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.gaps import fill_to_grid, find_gaps, find_runs, gap_report, merge_runs
+
+
+class TestGaps(unittest.TestCase):
+    """
+    A Unittest class to test the gap detection and filling.
+    """
+    def setUp(self):
+        # Minutes 0 to 9, without 3, 4 and 7, from two sources
+        self.data = pd.DataFrame({
+            'unix': 60 * np.array([0, 1, 2, 5, 6, 8, 9]),
+            'open': np.arange(7, dtype=float),
+            'high': np.arange(7, dtype=float),
+            'low': np.arange(7, dtype=float),
+            'close': np.array([0, 1, 2, 5, 6, 8, 9], dtype=float),
+            'volume': np.ones(7),
+            'source': np.array([0, 0, 1, 1, 0, 0, 0], dtype=np.int16),
+        })
+
+    def test_find_gaps(self):
+        gaps = find_gaps(self.data['unix'].to_numpy(), 60)
+        self.assertTrue(np.array_equal(gaps, [[180, 240, 2], [420, 420, 1]]))
+
+    def test_gap_report(self):
+        # The rows of each source before the merge, the first source also covering minute 2
+        source_runs = {0: find_runs(60 * np.array([0, 1, 2, 6, 8, 9]), 60), 1: find_runs(60 * np.array([2, 5]), 60)}
+        report = gap_report(self.data, source_runs=source_runs)
+        self.assertEqual(report['combined']['stats']['missing_rows'], 3)
+        self.assertEqual(report['combined']['stats']['longest_gap'], 2)
+        self.assertAlmostEqual(report['combined']['stats']['coverage'], 0.7)
+        self.assertTrue(np.array_equal(report[0]['gaps'], [[180, 300, 3], [420, 420, 1]]))
+        self.assertEqual(report[0]['stats']['rows'], 6)
+        self.assertTrue(np.array_equal(report[1]['gaps'], [[180, 240, 2]]))
+        self.assertEqual(set(gap_report(self.data)), {'combined'})
+
+    def test_overlapping_sources(self):
+        # Two sources covering the whole range, the second one in two overlapping files: no gap in either
+        source_runs = {0: find_runs(60 * np.arange(10)),
+                       1: np.r_[find_runs(60 * np.arange(6)), find_runs(60 * np.arange(4, 10))]}
+        self.assertTrue(np.array_equal(merge_runs(source_runs[1], 60), [[0, 540]]))
+        report = gap_report(pd.DataFrame({'unix': 60 * np.arange(10)}), source_runs=source_runs)
+        for source in (0, 1):
+            self.assertEqual(len(report[source]['gaps']), 0)
+            self.assertEqual(report[source]['stats']['coverage'], 1.0)
+
+    def test_fill_to_grid(self):
+        filled = fill_to_grid(self.data, method='ffill')
+        self.assertTrue(np.array_equal(filled['unix'], 60 * np.arange(10)))
+        self.assertTrue(np.array_equal(filled['close'], [0, 1, 2, 2, 2, 5, 6, 6, 8, 9]))
+        self.assertTrue(np.array_equal(filled['volume'], [1, 1, 1, 0, 0, 1, 1, 0, 1, 1]))
+        self.assertTrue(np.array_equal(filled['source'], [0, 0, 1, -1, -1, 1, 0, -1, 0, 0]))
+
+        filled = fill_to_grid(self.data, method='interpolate')
+        self.assertTrue(np.allclose(filled['close'], np.arange(10)))
+
+        with self.assertRaises(ValueError):
+            fill_to_grid(self.data.assign(unix=self.data['unix'] + np.r_[0, 1, np.zeros(5, dtype=int)]), 60)
+
+    def test_long_history(self):
+        # Seven years of minutes with 1% of missing rows, timed by the benchmark suite
+        unix = 60 * np.arange(7 * 365 * 24 * 60)
+        unix = unix[np.random.default_rng(0).random(len(unix)) > 0.01]
+        stats = gap_report(pd.DataFrame({'unix': unix}))['combined']['stats']
+        self.assertEqual(stats['rows'] + stats['missing_rows'], 7 * 365 * 24 * 60)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from src.dataset import TsData
+from src.ingest import MANIFEST, ingest, load_sources
+from src.store import PriceStore
+
+
+def write_csv(path, unix, close):
+    pd.DataFrame({
+        'unix': unix,
+        'date': pd.to_datetime(unix, unit='s'),
+        'open': close,
+        'high': close,
+        'low': close,
+        'close': close,
+        'volume': np.ones(len(unix)),
+    }).to_csv(path, index=False)
+
+
+class TestIngest(unittest.TestCase):
+    """
+    A Unittest class to test the CSV ingestion pipeline.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.sources = [os.path.join(self.tmp_dir.name, source) for source in ('kraken', 'kaggle')]
+        for source in self.sources:
+            os.makedirs(source)
+        self.store_dir = os.path.join(self.tmp_dir.name, 'sources.store')
+
+        # Unsorted rows, and an overlap between the two sources on minutes 5 to 9
+        write_csv(os.path.join(self.sources[0], 'day1.csv'), 60 * np.arange(9, 4, -1), np.full(5, 1.0))
+        write_csv(os.path.join(self.sources[1], 'day1.csv'), 60 * np.arange(10), np.full(10, 2.0))
+
+    def test_load_sources(self):
+        for n_jobs in (1, 2):
+            columns = load_sources(self.sources, n_jobs=n_jobs)
+            self.assertTrue(np.array_equal(columns['unix'], 60 * np.arange(10)))
+            # The first source wins on duplicates
+            self.assertTrue(np.array_equal(columns['close'], np.r_[np.full(5, 2.0), np.full(5, 1.0)]))
+            self.assertTrue(np.array_equal(columns['source'], np.r_[np.ones(5), np.zeros(5)]))
+
+    def test_incremental(self):
+        store = ingest(self.sources, self.store_dir, n_jobs=1)
+        self.assertEqual(len(store), 10)
+        inode = os.stat(os.path.join(self.store_dir, 'close.bin')).st_ino
+
+        # A new day is appended to the store
+        write_csv(os.path.join(self.sources[0], 'day2.csv'), 60 * np.arange(10, 15), np.full(5, 3.0))
+        store = ingest(self.sources, self.store_dir, n_jobs=1)
+        self.assertEqual(len(store), 15)
+        self.assertEqual(store.header['unix_end'], 60 * 14)
+        self.assertEqual(os.stat(os.path.join(self.store_dir, 'close.bin')).st_ino, inode)
+        with open(os.path.join(self.store_dir, MANIFEST)) as f:
+            self.assertEqual(len(json.load(f)['files']), 3)
+
+        # Overlapping rows of a source of higher priority are merged into the store
+        write_csv(os.path.join(self.sources[0], 'day0.csv'), 60 * np.arange(0, 2), np.full(2, 4.0))
+        store = ingest(self.sources, self.store_dir, n_jobs=1)
+        self.assertEqual(len(store), 15)
+        self.assertTrue(np.array_equal(store.window(0, 3)['close'], [4.0, 4.0, 2.0]))
+
+        # A changed file rebuilds the store
+        write_csv(os.path.join(self.sources[1], 'day1.csv'), 60 * np.arange(20), np.full(20, 5.0))
+        store = ingest(self.sources, self.store_dir, n_jobs=1)
+        self.assertEqual(len(store), 20)
+        self.assertTrue(np.array_equal(store.window()['close'][-5:], np.full(5, 5.0)))
+
+    def test_killed_append(self):
+        ingest(self.sources, self.store_dir, n_jobs=1)
+
+        # An append killed after writing some of the columns, before the header and the manifest
+        with open(os.path.join(self.store_dir, 'unix.bin'), 'ab') as f:
+            np.asarray([60 * 10, 60 * 11], dtype='<i8').tofile(f)
+
+        write_csv(os.path.join(self.sources[0], 'day2.csv'), 60 * np.arange(10, 15), np.full(5, 3.0))
+        store = ingest(self.sources, self.store_dir, n_jobs=1)
+        self.assertEqual(len(store), 15)
+        self.assertTrue(np.array_equal(store.window()['unix'], 60 * np.arange(15)))
+        self.assertTrue(np.array_equal(store.window()['close'][-5:], np.full(5, 3.0)))
+        self.assertEqual(os.path.getsize(os.path.join(self.store_dir, 'unix.bin')), 15 * 8)
+
+    def test_source_gaps(self):
+        # The first source wins minutes 3 to 6 in the middle of the second one, both covering their whole range
+        write_csv(os.path.join(self.sources[0], 'day1.csv'), 60 * np.arange(3, 7), np.full(4, 1.0))
+        ingest(self.sources, self.store_dir, n_jobs=1)
+        for data in (TsData(csv_dir_list=self.sources), TsData(store_dir=self.store_dir)):
+            report = data.get_gaps(60)
+            self.assertEqual(len(report[0]['gaps']), 0)
+            self.assertEqual(len(report[1]['gaps']), 0)
+            self.assertEqual((report[0]['stats']['rows'], report[1]['stats']['rows']), (4, 10))
+
+    def test_ingest_matches_load(self):
+        store = ingest(self.sources, self.store_dir, n_jobs=1)
+        columns = load_sources(self.sources, n_jobs=1)
+        for col in columns.columns:
+            self.assertTrue(np.array_equal(store.window()[col], columns[col]))
+        self.assertTrue(PriceStore.is_store(self.store_dir))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
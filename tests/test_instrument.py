@@ -0,0 +1,74 @@
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from config import config
+from src import cache
+from src.instrument import PROBES, Instrumentation, format_report
+from app import grid_search
+from test_optimizer import make_data, run_engine
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    A Unittest class to test the instrumentation of the hot paths.
+    """
+    def setUp(self):
+        self.data = make_data(300)
+
+    def test_same_run(self):
+        # The instrumented run gives the same results, and the methods are restored afterwards
+        originals = {(cls, name): vars(cls)[name] for methods in PROBES.values() for cls, name in methods
+                     if name in vars(cls)}
+        reference = run_engine(self.data, 'pandas')
+        with Instrumentation(trace_memory=True) as instrumentation:
+            portfolio = run_engine(self.data, 'pandas')
+        self.assertEqual(list(reference.portfolio_value_list), list(portfolio.portfolio_value_list))
+        self.assertEqual(originals, {(cls, name): vars(cls)[name] for cls, name in originals})
+
+        report = instrumentation.report()
+        self.assertEqual(report['steps'], len(self.data) - 1)
+        self.assertEqual(report['phases']['slicing']['calls'], len(self.data) - 1)
+        self.assertEqual(report['phases']['should_buy']['calls'], len(self.data) - 1)
+        self.assertEqual(report['phases']['buy']['calls'], portfolio.trades // 2)
+        self.assertEqual(report['phases']['forecast']['calls'], 1)
+        self.assertLessEqual(report['phases']['step']['time'], report['wall_time'])
+        self.assertIn('allocated_mb', report['phases']['step'])
+        self.assertGreater(report['peak_mb'], 0)
+        self.assertIn('steps/sec', format_report(report))
+
+    def test_grid_search_report(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pickle_file = os.path.join(tmp_dir, 'data.pkl')
+            with open(pickle_file, 'wb') as f:
+                pickle.dump(self.data, f)
+            config_data, results_dir = dict(config['data']), config['results_dir']
+            config['data'].update(pickle_file=pickle_file, start_position=-1 - 200, end_position=-1)
+            config['results_dir'] = tmp_dir
+            try:
+                instrumentation = Instrumentation(profile=True)
+                save_path = grid_search.run(predict_len_list=[5, 20], min_expected_returns_list=[0.0, 1.0],
+                                            stop_loss_list=[-0.01], n_jobs=1, batch=False,
+                                            instrumentation=instrumentation)
+            finally:
+                config['results_dir'] = results_dir
+                config['data'].clear()
+                config['data'].update(config_data)
+                cache._datasets.clear()
+
+            report_path = save_path.parent / f'{save_path.stem}-profile.json'
+            with open(report_path) as f:
+                report = json.load(f)
+            self.assertEqual(report['steps'], 4 * 199)
+            self.assertGreaterEqual(report['phases']['write_results']['calls'], 1)
+            self.assertTrue(report['profile'])
+            self.assertTrue(os.path.exists(report_path.with_suffix('.prof')))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+from src.fees import FeeSchedule
+from src.kernel import policy_kernel
+from src.optimizer import Optimizer
+from src.policy import Policy
+from src.portfolio import Portfolio
+from test_optimizer import make_data, run_engine
+
+
+def run_kernel(data, predict_len=20, fee=0.001, min_expected_returns=1.0, stop_loss=-0.01, init_cash=5000.0,
+               init_crypto=0.0):
+    portfolio = Portfolio(cash=init_cash, crypto=init_crypto)
+    policy = Policy(min_expected_returns=min_expected_returns, stop_loss=stop_loss)
+    Optimizer(portfolio=portfolio, policy=policy, predict_len=predict_len, fee=fee).iterate_policy_kernel(data)
+    return portfolio
+
+
+class TestKernel(unittest.TestCase):
+    """
+    A Unittest class to test the compiled policy kernel against the reference engine.
+    """
+    def setUp(self):
+        self.data = make_data(400)
+
+    def test_parity(self):
+        buy_fee = FeeSchedule(0.0005, lambda unix: np.where(unix < 1700000000 + 60 * 200, 0.002, 0.001))
+        for kwargs in [dict(predict_len=50, fee=0.0005, min_expected_returns=0.5, stop_loss=-0.002),
+                       dict(predict_len=20, fee=0.001, min_expected_returns=-0.5, stop_loss=None, init_crypto=0.1),
+                       dict(predict_len=30, fee=buy_fee, min_expected_returns=0.2, stop_loss=-0.005)]:
+            reference = run_engine(self.data, 'pandas', **kwargs)
+            portfolio = run_kernel(self.data, **kwargs)
+
+            self.assertGreater(reference.trades, 0)
+            self.assertEqual(list(reference.portfolio_value_list), list(portfolio.portfolio_value_list))
+            self.assertEqual(list(reference.portfolio_returns_list), list(portfolio.portfolio_returns_list))
+            self.assertEqual(reference.trades, portfolio.trades)
+            self.assertEqual(reference.cash, portfolio.cash)
+            self.assertTrue(reference.ledger.to_frame().equals(portfolio.ledger.to_frame()))
+
+    def test_unsupported(self):
+        portfolio = Portfolio(cash=5000.0, crypto=0.0)
+        with self.assertRaises(ValueError):
+            Optimizer(portfolio, Policy(0.5, take_profit=0.01), 20, fee=0.001).iterate_policy_kernel(self.data)
+        varying_fee = FeeSchedule(lambda unix: np.where(unix < 1700000000 + 60 * 200, 0.002, 0.001))
+        with self.assertRaises(ValueError):
+            Optimizer(portfolio, Policy(0.5), 20, fee=varying_fee).iterate_policy_kernel(self.data)
+
+    def test_empty(self):
+        values, cash, crypto, trades, *log = policy_kernel(np.empty(0), np.empty(0), 100.0, 0.0, 0.001, np.empty(0),
+                                                           0.0, np.nan)
+        self.assertEqual((len(values), cash, trades), (0, 100.0, 0))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.dataset import AssetMatrix
+from src.multiasset import AssetPortfolio, MultiAssetOptimizer
+from src.policy import Policy
+from test_optimizer import make_data, run_engine
+
+
+def run_assets(data, max_buys=1, predict_len=20, fee=0.001, min_expected_returns=1.0, stop_loss=-0.01,
+               init_cash=5000.0):
+    portfolio = AssetPortfolio(cash=init_cash, names=data.names)
+    policy = Policy(min_expected_returns=min_expected_returns, stop_loss=stop_loss)
+    MultiAssetOptimizer(portfolio, policy, predict_len, fee=fee, max_buys=max_buys).iterate_policy(data)
+    return portfolio
+
+
+class TestMultiAsset(unittest.TestCase):
+    """
+    A Unittest class to test the aligned data of several assets and their backtest.
+    """
+    def test_single_asset_parity(self):
+        # Over a single asset, the same run as the numpy engine
+        data = make_data(400)
+        reference = run_engine(data, 'numpy')
+        portfolio = run_assets(AssetMatrix.align({'BTC': data}))
+        self.assertGreater(reference.trades, 0)
+        self.assertEqual(list(reference.portfolio_value_list), list(portfolio.portfolio_value_list))
+        self.assertEqual((reference.trades, reference.cash), (portfolio.trades[0], portfolio.cash))
+
+        expected = reference.ledger.to_frame()
+        closed = portfolio.closed_positions()
+        self.assertEqual(list(closed['asset'].unique()), ['BTC'])
+        for col in expected.columns:
+            np.testing.assert_array_equal(closed[col].to_numpy(), expected[col].to_numpy())
+
+    def test_outer_alignment(self):
+        # ETH is listed later, and misses a bar
+        btc, eth = make_data(10, seed=1), make_data(10, seed=2).iloc[4:].drop(index=6)
+        inner = AssetMatrix.align({'BTC': btc, 'ETH': eth})
+        self.assertEqual(list(inner['unix']), list(eth['unix']))
+
+        outer = AssetMatrix.align({'BTC': btc, 'ETH': eth}, how='outer')
+        close = outer['close']
+        self.assertEqual(list(outer['unix']), list(btc['unix']))
+        self.assertTrue(np.isnan(close[:4, 1]).all())
+        self.assertEqual(close[6, 1], close[5, 1])
+        self.assertEqual((outer['high'][6, 1], outer['volume'][6, 1]), (close[5, 1], 0.0))
+        np.testing.assert_array_equal(outer.asset('BTC')['close'], btc['close'].to_numpy())
+        self.assertEqual(len(outer[2:5]), 3)
+
+    def test_several_assets(self):
+        data = AssetMatrix.align({f'asset{j}': make_data(500, seed=j) for j in range(4)})
+        portfolio = run_assets(data, max_buys=2)
+        self.assertTrue((portfolio.trades > 0).all())
+        self.assertEqual(len(portfolio.pool), 0)
+        self.assertTrue((portfolio.crypto == 0).all())
+
+        # Every asset is a column of the ledger, and the cash is the initial cash plus the returns of all of them
+        closed = portfolio.closed_positions()
+        self.assertEqual(set(closed['asset']), set(data.names))
+        self.assertAlmostEqual(portfolio.cash, 5000.0 + closed['returns'].sum(), places=6)
+        self.assertTrue((closed.groupby('entry_date').size() <= 2).all())
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.fees import FeeSchedule
+from src.optimizer import Optimizer
+from src.policy import Policy
+from src.portfolio import Portfolio
+
+
+def make_data(n_steps, seed=0):
+    """
+    Generate a random walk of OHLCV data with one minute intervals.
+    """
+    rng = np.random.default_rng(seed)
+    close = 20000 * np.exp(np.cumsum(rng.normal(0, 0.002, n_steps)))
+    return pd.DataFrame({
+        'unix': 1700000000 + 60 * np.arange(n_steps),
+        'open': close,
+        'high': close * 1.001,
+        'low': close * 0.999,
+        'close': close,
+        'volume': rng.uniform(0, 10, n_steps),
+    })
+
+
+def run_engine(data, engine, predict_len=20, fee=0.001, min_expected_returns=1.0, stop_loss=-0.01, init_cash=5000.0,
+               init_crypto=0.0, forecaster=None):
+    portfolio = Portfolio(cash=init_cash, crypto=init_crypto)
+    policy = Policy(min_expected_returns=min_expected_returns, stop_loss=stop_loss)
+    optimizer = Optimizer(portfolio=portfolio, policy=policy, predict_len=predict_len, fee=fee, forecaster=forecaster)
+    if engine == 'numpy':
+        optimizer.iterate_policy_numpy(data)
+    else:
+        optimizer.iterate_policy(data)
+    return portfolio
+
+
+class TestOptimizer(unittest.TestCase):
+    """
+    A Unittest class to test the Optimizer engines.
+    """
+    def setUp(self):
+        self.data = make_data(400)
+
+    def assertSameRun(self, reference, other):
+        self.assertEqual(list(reference.portfolio_value_list), list(other.portfolio_value_list))
+        self.assertEqual(list(reference.portfolio_returns_list), list(other.portfolio_returns_list))
+        self.assertEqual(reference.trades, other.trades)
+        self.assertEqual(reference.cash, other.cash)
+
+    def test_numpy_engine_parity(self):
+        reference = run_engine(self.data, 'pandas')
+        self.assertGreater(reference.trades, 0)
+        self.assertSameRun(reference, run_engine(self.data, 'numpy'))
+
+    def test_numpy_engine_parity_stop_loss(self):
+        kwargs = dict(predict_len=50, fee=0.0005, min_expected_returns=0.5, stop_loss=-0.002)
+        self.assertSameRun(run_engine(self.data, 'pandas', **kwargs), run_engine(self.data, 'numpy', **kwargs))
+
+    def test_numpy_engine_parity_fee_schedule(self):
+        fee = FeeSchedule(sell_fee=0.0004, buy_fee=lambda unix: np.where(unix % 120 == 0, 0.0006, 0.0008))
+        reference = run_engine(self.data, 'pandas', fee=fee)
+        self.assertNotEqual(reference.cash, run_engine(self.data, 'pandas', fee=0.0004).cash)
+        self.assertSameRun(reference, run_engine(self.data, 'numpy', fee=fee))
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
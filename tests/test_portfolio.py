@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from src.portfolio import Portfolio
+
+
+class TestPortfolio(unittest.TestCase):
+    """
+    A Unittest class to test the Portfolio class and its ledger of positions.
+    """
+    def setUp(self):
+        self.portfolio = Portfolio(cash=3000.0, crypto=0.0)
+        for date in range(3):
+            self.portfolio.buy(date, 1000, 1000, 0.03, stop_loss=-0.1 if date else None)
+
+    def test_buy(self):
+        self.assertEqual(self.portfolio.cash, 0.0)
+        self.assertEqual(len(self.portfolio.active_positions()), 3)
+        self.assertEqual(len(self.portfolio.ledger), 0)
+        self.assertEqual(self.portfolio.trades, 3)
+
+    def test_sell(self):
+        first, second, third = self.portfolio.active_positions()
+        self.portfolio.sell(second, 5, 1000, 0.03)
+        self.assertEqual(self.portfolio.active_positions(), [first, third])
+        self.assertEqual(len(self.portfolio.ledger), 1)
+        self.assertEqual(self.portfolio.ledger['exit_date'][0], 5)
+        self.assertEqual(self.portfolio.ledger['returns'][0], -58.252427184466)
+        self.assertEqual(self.portfolio.cash, 941.747572815534)
+
+    def test_sell_all(self):
+        self.portfolio.sell_all(10, 1000, 0.03)
+        self.assertEqual(self.portfolio.active_positions(), [])
+        self.assertTrue(np.array_equal(self.portfolio.ledger['entry_date'], [0, 1, 2]))
+        positions = self.portfolio.position_list
+        self.assertEqual(len(positions), 3)
+        self.assertTrue(all(position.closed() for position in positions))
+        self.assertIsNone(positions[0].stop_loss)
+        self.assertEqual(positions[1].stop_loss, -0.1)
+
+    def test_record(self):
+        self.portfolio.reserve(3)
+        for price in [1000, 1100, 900]:
+            self.portfolio.record(price, 0.03)
+        self.assertEqual(len(self.portfolio.portfolio_value_list), 3)
+        self.assertEqual(self.portfolio.portfolio_value_list[-1], self.portfolio.get_portfolio_value(900, 0.03))
+        self.assertEqual(self.portfolio.portfolio_returns_list[-1], self.portfolio.portfolio_value - 3000.0)
+
+    def test_record_final_only(self):
+        portfolio = Portfolio(cash=1000.0, crypto=1.0, record_history=False)
+        for price in [1000, 1100, 900]:
+            portfolio.record(price, 0.0)
+        self.assertEqual(list(portfolio.portfolio_value_list), [1900.0])
+        self.assertEqual(list(portfolio.portfolio_returns_list), [900.0])
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            self.portfolio.active_positions()[0].unknown = 1
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from src import cache
+from src.cache import load_dataset
+from src.resample import aggregate_bars, resample_ohlcv
+from src.store import PriceStore
+
+
+class TestResample(unittest.TestCase):
+    """
+    A Unittest class to test the OHLCV bar aggregation and the bar pyramids.
+    """
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Three days of minutes, with a missing hour
+        unix = 60 * np.arange(3 * 24 * 60)
+        unix = unix[(unix < 3600 * 30) | (unix >= 3600 * 31)]
+        close = 100 + np.cumsum(rng.normal(size=len(unix)))
+        self.data = pd.DataFrame({
+            'unix': unix,
+            'open': close + rng.normal(size=len(unix)),
+            'high': close + 2,
+            'low': close - 2,
+            'close': close,
+            'volume': rng.random(len(unix)),
+        })
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def test_resample_ohlcv(self):
+        bars = resample_ohlcv(self.data, '1h')
+        expected = self.data.assign(date=pd.to_datetime(self.data['unix'], unit='s')).resample('1h', on='date').agg(
+            {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}).dropna()
+        self.assertEqual(len(bars['unix']), 3 * 24 - 1)
+        self.assertTrue(np.array_equal(bars['unix'], (expected.index - pd.Timestamp(0)) // pd.Timedelta('1s')))
+        for col in ['open', 'high', 'low', 'close', 'volume']:
+            self.assertTrue(np.allclose(bars[col], expected[col]))
+
+    def test_aggregate_rows(self):
+        bars = aggregate_bars(self.data, np.arange(0, len(self.data), 1440))
+        self.assertEqual(bars['high'][0], self.data['high'][:1440].max())
+        self.assertEqual(bars['close'][-1], self.data['close'].iloc[-1])
+
+    def test_pyramid(self):
+        store = PriceStore.write(os.path.join(self.tmp_dir.name, 'data.store'), self.data)
+        store.build_pyramid()
+        self.assertIs(store.bars('1m'), store)
+        for resolution in ['5m', '1h', '1d']:
+            bars = store.bars(resolution)
+            self.assertEqual(bars.header['sampling'], {'5m': 300, '1h': 3600, '1d': 86400}[resolution])
+            self.assertTrue(np.array_equal(bars.window()['close'], resample_ohlcv(self.data, resolution)['close']))
+        with self.assertRaises(ValueError):
+            store.bars('4h')
+
+        # A pickle of the same data gives the same bars, aggregated on load
+        pickle_file = os.path.join(self.tmp_dir.name, 'data.pkl')
+        with open(pickle_file, 'wb') as f:
+            pickle.dump(self.data, f)
+        from_store = load_dataset(store.path, -11, -1, '1h')
+        from_pickle = load_dataset(pickle_file, -11, -1, '1h')
+        self.assertEqual(len(from_store), 10)
+        for col in from_store.columns:
+            self.assertTrue(np.array_equal(from_store[col], from_pickle[col]))
+
+    def test_update_pyramid(self):
+        # Append rows in the middle of a 5m, 1h and 1d bar, then in the middle of the next ones
+        store = PriceStore.write(os.path.join(self.tmp_dir.name, 'data.store'), self.data.iloc[:1000])
+        store.build_pyramid()
+        day_file = os.path.join(store.path, PriceStore.PYRAMID_DIR, '1d', 'close.bin')
+        inode = os.stat(day_file).st_ino
+        for start, end in [(1000, 2003), (2003, len(self.data))]:
+            store.append(self.data.iloc[start:end])
+            store.update_pyramid()
+            for resolution in ['5m', '1h', '1d']:
+                expected = resample_ohlcv(self.data.iloc[:end], resolution)
+                bars = store.bars(resolution).window()
+                for col in expected:
+                    self.assertTrue(np.array_equal(bars[col], expected[col]))
+        self.assertEqual(os.stat(day_file).st_ino, inode)
+
+    def tearDown(self):
+        cache._datasets.clear()
+        self.tmp_dir.cleanup()
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from src.results import ResultStore, read_results
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class TestResultStore(unittest.TestCase):
+    """
+    A Unittest class to test the checkpointed result store.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'results.csv')
+        self.columns = ['key', 'fee', 'returns']
+
+    def test_resume(self):
+        with ResultStore(self.path, self.columns) as store:
+            store.append({'key': 'a', 'fee': 0.1, 'returns': 1.0})
+            store.append({'key': 'b', 'fee': 0.2, 'returns': 2.0})
+        with ResultStore(self.path, self.columns) as store:
+            self.assertEqual(store.completed_keys(), {'a', 'b'})
+            store.append({'key': 'c', 'fee': 0.3, 'returns': 3.0})
+            self.assertEqual(store.completed_keys(), {'a', 'b', 'c'})
+            self.assertEqual(store.completed_values('returns'), {'a': 1.0, 'b': 2.0, 'c': 3.0})
+
+    def test_repair_cut_row(self):
+        with ResultStore(self.path, self.columns) as store:
+            store.append({'key': 'a', 'fee': 0.1, 'returns': 1.0})
+        # A run killed while writing a row
+        with open(self.path, 'a') as f:
+            f.write('b,0.2')
+        with ResultStore(self.path, self.columns) as store:
+            self.assertEqual(store.completed_keys(), {'a'})
+            store.append({'key': 'b', 'fee': 0.2, 'returns': 2.0})
+        with open(self.path) as f:
+            self.assertEqual(f.read().splitlines(), ['key,fee,returns', 'a,0.1,1.0', 'b,0.2,2.0'])
+
+    def test_repair_long_cut_row(self):
+        with ResultStore(self.path, self.columns) as store:
+            store.append({'key': 'a', 'fee': 0.1, 'returns': 1.0})
+        # A cut row longer than the blocks read back from the end of the file
+        with open(self.path, 'a') as f:
+            f.write('b,' + '1' * 200000)
+        ResultStore(self.path, self.columns).close()
+        with open(self.path) as f:
+            self.assertEqual(f.read().splitlines(), ['key,fee,returns', 'a,0.1,1.0'])
+
+    def test_batches(self):
+        store = ResultStore(self.path, self.columns, batch_size=2, flush_interval=3600)
+        store.append({'key': 'a', 'fee': 0.1, 'returns': 1.0})
+        self.assertEqual(len(read_results(self.path)), 0)
+        self.assertEqual(store.completed_keys(), {'a'})
+        store.append({'key': 'b', 'fee': 0.2, 'returns': 2.0})
+        self.assertEqual(len(read_results(self.path)), 2)
+        store.append({'key': 'c', 'fee': 0.3, 'returns': 3.0})
+        store.close()
+        self.assertEqual(list(read_results(self.path)['key']), ['a', 'b', 'c'])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        path = os.path.join(self.tmp_dir.name, 'results.parquet')
+        with ResultStore(path, self.columns, batch_size=2) as store:
+            for i, key in enumerate('abc'):
+                store.append({'key': key, 'fee': 0.1 * i, 'returns': float(i)})
+        with ResultStore(path, self.columns) as store:
+            self.assertEqual(store.completed_keys(), {'a', 'b', 'c'})
+            store.append({'key': 'd', 'fee': 0.4, 'returns': 4.0})
+        results = read_results(path)
+        self.assertEqual(sorted(results['key']), ['a', 'b', 'c', 'd'])
+        self.assertEqual(list(results.columns), self.columns)
+
+    def test_other_columns(self):
+        with open(self.path, 'w') as f:
+            f.write('fee,returns\n')
+        with self.assertRaises(ValueError):
+            ResultStore(self.path, self.columns)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from config import config
+from src import cache
+from src.search import GridSearchExecutor, PARAMETERS, RandomSearch, SuccessiveHalving, TPESearch
+from app import grid_search
+
+
+class TestGridSearchExecutor(unittest.TestCase):
+    """
+    A Unittest class to test the process-pool grid search executor.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pickle_file = os.path.join(self.tmp_dir.name, 'data.pkl')
+        rng = np.random.default_rng(0)
+        close = 20000 * np.exp(np.cumsum(rng.normal(0, 0.002, 300)))
+        data = pd.DataFrame({'unix': 1700000000 + 60 * np.arange(300), 'open': close, 'high': close,
+                             'low': close, 'close': close, 'volume': np.ones(300)})
+        with open(self.pickle_file, 'wb') as f:
+            pickle.dump(data, f)
+        self.config_data = dict(config['data'])
+        config['data'].update(pickle_file=self.pickle_file, start_position=-1 - 200, end_position=-1)
+        self.results_dir = config['results_dir']
+        config['results_dir'] = self.tmp_dir.name
+
+        self.param_combinations = [(predict_len, 5000.0, 0.0, 0.001, min_expected_returns, -0.01)
+                                   for predict_len in [5, 20] for min_expected_returns in [0.0, 1.0, 5.0]]
+
+    def test_processes_match_inline(self):
+        inline = list(GridSearchExecutor(n_jobs=1, engine='numpy').run(self.param_combinations))
+        parallel = list(GridSearchExecutor(n_jobs=2, chunksize=2, engine='numpy').run(self.param_combinations))
+        self.assertEqual(len(parallel), len(self.param_combinations))
+
+        def key(result):
+            return tuple(result[param] for param in PARAMETERS)
+        self.assertEqual(sorted(inline, key=key), sorted(parallel, key=key))
+
+    def test_batch_matches_single(self):
+        single = list(GridSearchExecutor(n_jobs=1, engine='numpy').run(self.param_combinations))
+        batch = list(GridSearchExecutor(n_jobs=2, batch=True).run(self.param_combinations))
+
+        def key(result):
+            return tuple(result[param] for param in PARAMETERS)
+        self.assertEqual(sorted(single, key=key), sorted(batch, key=key))
+
+    def test_resume(self):
+        csv_path = grid_search.run(predict_len_list=[5, 20], min_expected_returns_list=[0.0, 1.0, 0.0],
+                                   stop_loss_list=[-0.01], n_jobs=1)
+        with open(csv_path) as f:
+            self.assertEqual(len(f.read().splitlines()), 1 + 2 * 2)
+        grid_search.run(predict_len_list=[5, 20, 50], min_expected_returns_list=[0.0, 1.0],
+                        stop_loss_list=[-0.01], n_jobs=1)
+        with open(csv_path) as f:
+            self.assertEqual(len(f.read().splitlines()), 1 + 3 * 2)
+
+    def test_halving(self):
+        csv_path = grid_search.run(predict_len_list=[5, 20], min_expected_returns_list=[0.0, 1.0, 5.0, 10.0],
+                                   stop_loss_list=[-0.01, -0.05], n_jobs=1, strategy='halving', n_samples=None,
+                                   eta=2, min_bars=50)
+        # Screened on the last 50 and 100 bars, then 4 of the 16 combinations backtested on the full window of 200 bars
+        results = pd.read_csv(csv_path)
+        self.assertEqual(len(results), 4)
+
+        # The full backtests are the same as those of the exhaustive search
+        exhaustive = list(GridSearchExecutor(n_jobs=1, batch=True).run(
+            [tuple(row[PARAMETERS]) for _, row in results.iterrows()]))
+        self.assertEqual(sorted(results['returns']), sorted(result['returns'] for result in exhaustive))
+
+    def tearDown(self):
+        config['results_dir'] = self.results_dir
+        config['data'].clear()
+        config['data'].update(self.config_data)
+        cache._datasets.clear()
+        self.tmp_dir.cleanup()
+
+
+class TestSearchStrategies(unittest.TestCase):
+    """
+    A Unittest class to test the search strategies on a known objective.
+    """
+    def setUp(self):
+        self.space = [[10, 20, 50], [5000.0], [0.0], [0.001], list(np.linspace(0, 50, 11)), [-0.01, -0.02, -0.05, -0.1]]
+
+    @staticmethod
+    def evaluate(param_combinations, n_bars=None):
+        # Best at predict_len 20, min_expected_returns 30 and stop_loss -0.05, noisier on shorter windows
+        noise = 0.0 if n_bars is None else 1000 / n_bars
+        return [-abs(params[0] - 20) - abs(params[4] - 30) - 100 * abs(params[5] + 0.05)
+                + noise * np.sin(params[4]) for params in param_combinations]
+
+    def test_random(self):
+        search = RandomSearch(n_samples=20, seed=1)
+        results = search.search(self.space, self.evaluate, 10000)
+        self.assertEqual(len(set(params for params, _ in results)), 20)
+        self.assertEqual(search.history, [(None, 20)])
+        self.assertEqual(results, RandomSearch(n_samples=20, seed=1).search(self.space, self.evaluate, 10000))
+
+    def test_halving(self):
+        search = SuccessiveHalving(eta=3, min_bars=500)
+        results = search.search(self.space, self.evaluate, 10000)
+        # 132 combinations screened on 1111 and 3333 bars, the best 5 backtested on the full window
+        self.assertEqual(search.history, [(1111, 132), (3333, 44), (None, 15)])
+        best_params, _ = max(results, key=lambda result: result[1])
+        self.assertEqual((best_params[0], best_params[4], best_params[5]), (20, 30.0, -0.05))
+
+    def test_tpe(self):
+        search = TPESearch(n_samples=40, batch_size=4, seed=0)
+        results = search.search(self.space, self.evaluate, 10000)
+        self.assertEqual(len(set(params for params, _ in results)), 40)
+        # Better than the best of as many random combinations
+        random_results = RandomSearch(n_samples=40, seed=0).search(self.space, self.evaluate, 10000)
+        self.assertGreaterEqual(max(returns for _, returns in results), max(returns for _, returns in random_results))
+
+        # A grid smaller than the number of samples is evaluated entirely
+        small_space = [[10, 20], [5000.0], [0.0], [0.001], [0.0, 1.0, 0.0], [-0.01]]
+        self.assertEqual(len(TPESearch(n_samples=40).search(small_space, self.evaluate, 10000)), 4)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from src import cache
+from src.cache import dataset_id, load_dataset
+from src.dataset import TsData
+from src.store import PriceStore
+
+
+class TestPriceStore(unittest.TestCase):
+    """
+    A Unittest class to test the columnar price store.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store_dir = os.path.join(self.tmp_dir.name, 'data.store')
+        self.data = pd.DataFrame({
+            'unix': 1700000000 + 60 * np.arange(100),
+            'open': np.arange(100, dtype=float),
+            'high': np.arange(100, dtype=float) + 1,
+            'low': np.arange(100, dtype=float) - 1,
+            'close': np.arange(100, dtype=float),
+            'volume': np.ones(100),
+        })
+        self.store = PriceStore.write(self.store_dir, self.data)
+
+    def test_header(self):
+        self.assertTrue(PriceStore.is_store(self.store_dir))
+        self.assertEqual(len(self.store), 100)
+        self.assertEqual(self.store.header['unix_start'], 1700000000)
+        self.assertEqual(self.store.header['unix_end'], 1700000000 + 60 * 99)
+        self.assertEqual(self.store.header['sampling'], 60)
+
+    def test_window(self):
+        store = PriceStore(self.store_dir)
+        window = store.window(-1 - 50, -1)
+        expected = self.data.iloc[-1 - 50:-1]
+        self.assertEqual(len(window), 50)
+        for col in self.data.columns:
+            self.assertTrue(np.array_equal(window[col], expected[col].to_numpy()))
+            self.assertFalse(window[col].flags.writeable)
+        # The window is a view of the mapped file, not a copy
+        self.assertTrue(np.shares_memory(window['close'], store.column('close')))
+
+    def test_tsdata(self):
+        pickle_file = os.path.join(self.tmp_dir.name, 'data.pkl')
+        with open(pickle_file, 'wb') as f:
+            pickle.dump(self.data, f)
+
+        store_dir = os.path.join(self.tmp_dir.name, 'converted.store')
+        TsData(pickle_file=pickle_file).save_store(store_dir)
+        pd.testing.assert_frame_equal(TsData(store_dir=store_dir).data, self.data, check_dtype=False)
+
+    def test_cache(self):
+        columns = load_dataset(self.store_dir, 10, 20)
+        self.assertTrue(np.array_equal(columns['close'], np.arange(10, 20, dtype=float)))
+        self.assertTrue(dataset_id(self.store_dir, 10, 20).startswith('data.store:'))
+
+    def tearDown(self):
+        cache._datasets.clear()
+        self.tmp_dir.cleanup()
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
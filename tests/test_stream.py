@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+from src.fees import FeeSchedule
+from src.forecast import Forecaster
+from src.optimizer import Optimizer
+from src.policy import Policy
+from src.portfolio import Portfolio
+from src.stream import ReplaySource, latency_stats
+from src.utils.buffers import RingBuffer
+from test_optimizer import make_data, run_engine
+
+
+class TrendForecaster(Forecaster):
+    """
+    A forecaster extrapolating the trend of the last bars, from the past only.
+    """
+    model_id = 'trend'
+
+    def predict_batch(self, data, steps, predict_len):
+        close = np.asarray(data['close'])
+        predictions = np.empty((len(steps), predict_len))
+        for row, step in enumerate(steps):
+            past = close[max(step - 10, 0):step]
+            slope = (past[-1] - past[0]) / max(len(past) - 1, 1)
+            predictions[row] = past[-1] + slope * np.arange(1, predict_len + 1)
+        return predictions
+
+
+class TestStream(unittest.TestCase):
+    """
+    A Unittest class to test the incremental mode of the optimizer.
+    """
+    def setUp(self):
+        self.data = make_data(500, seed=3)
+
+    def test_ring_buffer(self):
+        ring = RingBuffer(3)
+        for value in range(5):
+            ring.append(value)
+        self.assertEqual(list(ring.values), [2.0, 3.0, 4.0])
+        self.assertEqual(ring[-1], 4.0)
+
+    def test_replay_parity(self):
+        fee_schedules = [0.001, FeeSchedule(0.001, lambda unix: np.where(unix < 1700000000 + 60 * 250, 0.002, 0.0005))]
+        for fee in fee_schedules:
+            reference = run_engine(self.data, 'numpy', predict_len=30, fee=fee, min_expected_returns=0.5, stop_loss=-0.005)
+            portfolio = Portfolio(cash=5000.0, crypto=0.0)
+            optimizer = Optimizer(portfolio, Policy(0.5, -0.005), 30, fee=fee)
+            latencies = ReplaySource(self.data, 30).run(optimizer)
+
+            self.assertGreater(reference.trades, 0)
+            self.assertEqual(list(reference.portfolio_value_list), list(portfolio.portfolio_value_list))
+            self.assertEqual(reference.trades, portfolio.trades)
+            self.assertEqual(reference.cash, portfolio.cash)
+            self.assertEqual(latency_stats(latencies)['bars'], len(self.data) - 1)
+
+    def test_live_forecaster(self):
+        portfolio = Portfolio(cash=5000.0, crypto=0.0, record_history=False)
+        optimizer = Optimizer(portfolio, Policy(0.5, -0.005), 20, fee=0.001, forecaster=TrendForecaster(), history_len=50)
+        for i in range(len(self.data)):
+            optimizer.on_bar({col: self.data[col].iloc[i] for col in self.data.columns})
+        optimizer.close({col: self.data[col].iloc[-1] for col in self.data.columns})
+
+        # The history is bounded, and the positions are all sold
+        self.assertEqual(len(optimizer._bars['close']), 50)
+        self.assertGreater(portfolio.trades, 0)
+        self.assertEqual(portfolio.crypto, 0)
+        self.assertEqual(len(portfolio.portfolio_value_list), 1)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import unittest
+import numpy as np
+from src.utils.utils import rolling_forward_argmax
+
+
+class TestRollingForwardArgmax(unittest.TestCase):
+    """
+    A Unittest class to test the forward argmax over the forecast horizon.
+    """
+    def test_matches_scan(self):
+        rng = np.random.default_rng(0)
+        for n_steps in [1, 2, 17, 200]:
+            for window in [1, 2, 3, 8, 13, 300]:
+                # Few distinct values, so that ties are frequent
+                values = rng.integers(0, 5, n_steps).astype(float)
+                expected = []
+                for i in range(n_steps):
+                    horizon = list(values[i:i + window])
+                    expected.append(i + horizon.index(max(horizon)))
+                self.assertEqual(list(rolling_forward_argmax(values, window)), expected)
+
+    def test_invalid_window(self):
+        with self.assertRaises(ValueError):
+            rolling_forward_argmax(np.zeros(3), 0)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from config import config
+from src import cache
+from src.search import GridSearchExecutor
+from src.walkforward import picked_evaluations, split_windows, walk_forward_splits
+from app import walk_forward
+from test_optimizer import make_data, run_engine
+
+
+class TestWalkForward(unittest.TestCase):
+    """
+    A Unittest class to test the walk-forward splits and their evaluation.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pickle_file = os.path.join(self.tmp_dir.name, 'data.pkl')
+        self.data = make_data(700, seed=3)
+        with open(self.pickle_file, 'wb') as f:
+            pickle.dump(self.data, f)
+        self.config_data = dict(config['data'])
+        config['data'].update(pickle_file=self.pickle_file, start_position=-1 - 600, end_position=-1)
+        self.results_dir = config['results_dir']
+        config['results_dir'] = self.tmp_dir.name
+
+    def test_splits(self):
+        self.assertEqual(walk_forward_splits(1000, 3, 100, 200, 'rolling'),
+                         [((500, 700), (700, 800)), ((600, 800), (800, 900)), ((700, 900), (900, 1000))])
+        self.assertEqual(walk_forward_splits(1000, 2, 100, 200, 'expanding'),
+                         [((0, 800), (800, 900)), ((0, 900), (900, 1000))])
+        self.assertEqual(walk_forward_splits(1000, 2, 100, 200, 'fixed'),
+                         [((0, 200), (200, 300)), ((0, 200), (300, 400))])
+        self.assertEqual(walk_forward_splits(1000, 2, 100, 0, 'rolling'), [(None, (800, 900)), (None, (900, 1000))])
+
+        splits = walk_forward_splits(1000, 5, 100, 200, 'random', seed=1)
+        self.assertEqual(splits, walk_forward_splits(1000, 5, 100, 200, 'random', seed=1))
+        for train, test in splits:
+            self.assertEqual((train[1], test[1] - test[0], train[1] - train[0]), (test[0], 100, 200))
+            self.assertLessEqual(test[1], 1000)
+
+        with self.assertRaises(ValueError):
+            walk_forward_splits(1000, 10, 100, 200, 'rolling')
+
+        # The train windows are only evaluated to pick one of several combinations
+        self.assertEqual(split_windows(walk_forward_splits(1000, 2, 100, 200, 'fixed'), [(1,), (2,)]), [(0, 200)])
+        self.assertEqual(split_windows(walk_forward_splits(1000, 2, 100, 200, 'fixed'), [(1,)]), [])
+        # Every test window is only evaluated with the combination picked for its split
+        self.assertEqual(picked_evaluations(walk_forward_splits(1000, 2, 100, 200, 'fixed'), [(2,), (1,)]),
+                         [((200, 300), [(2,)]), ((300, 400), [(1,)])])
+
+    def test_windows_match_reloads(self):
+        # Every window is a slice of the configured window, the same as a backtest of the reloaded window
+        params = [(20, 5000.0, 0.0, 0.001, 1.0, -0.01)]
+        windows = [(0, 200), (200, 400), (-200, None)]
+        results = list(GridSearchExecutor(n_jobs=2, batch=True).run(params, windows=windows))
+        self.assertEqual(len(results), 3)
+
+        window_data = self.data.iloc[-1 - 600:-1].reset_index(drop=True)
+        for result in results:
+            start, end = result['window']
+            portfolio = run_engine(window_data.iloc[start:end], 'numpy', predict_len=20, fee=0.001,
+                                   min_expected_returns=1.0, stop_loss=-0.01)
+            self.assertEqual(result['returns'], portfolio.portfolio_returns)
+
+    def test_run(self):
+        splits = walk_forward.run(predict_len_list=[10, 20], min_expected_returns_list=[0.0, 1.0],
+                                  stop_loss_list=[-0.01], init_cash_list=[5000.0], init_crypto_list=[0.0],
+                                  fee_list=[0.001], scheme='rolling', n_splits=3, train_bars=200, test_bars=100,
+                                  n_jobs=1)
+        self.assertEqual(list(splits['test_start']), [300, 400, 500])
+        self.assertTrue(np.isfinite(splits['test_returns']).all())
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, 'BTCj', 'walk-forward', 'walk-forward-rolling.csv')))
+
+        # The 4 combinations on the 3 train windows, then a single one per test window, unless the full grid is asked for
+        windows_file = os.path.join(self.tmp_dir.name, 'BTCj', 'walk-forward', 'walk-forward-rolling-windows.csv')
+        test_rows = pd.read_csv(windows_file).query('window_end - window_start == 100')
+        self.assertEqual(len(pd.read_csv(windows_file)), 4 * 3 + 3)
+        self.assertEqual(list(test_rows['window_start']), [300, 400, 500])
+        full_splits = walk_forward.run(predict_len_list=[10, 20], min_expected_returns_list=[0.0, 1.0],
+                                       stop_loss_list=[-0.01], init_cash_list=[5000.0], init_crypto_list=[0.0],
+                                       fee_list=[0.001], scheme='rolling', n_splits=3, train_bars=200, test_bars=100,
+                                       full_test_grid=True, n_jobs=1)
+        self.assertEqual(len(pd.read_csv(windows_file)), 4 * 3 + 4 * 3)
+        self.assertTrue(full_splits.equals(splits))
+
+    def tearDown(self):
+        config['results_dir'] = self.results_dir
+        config['data'].clear()
+        config['data'].update(self.config_data)
+        cache._datasets.clear()
+        self.tmp_dir.cleanup()
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()